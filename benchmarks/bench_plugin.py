@@ -0,0 +1,309 @@
+"""server_status 插件负载模拟测试
+
+使用桩 PluginServerInterface、伪造的 minecraft_data_api 和本地的 HTTP 后端驱动插件，
+按设定的速率模拟玩家/假人的加入和离开，统计 CPU 时间、新建线程数、内存分配和上报延迟。
+
+用法:
+    python benchmarks/bench_plugin.py --players 100 --bots 300 --churn-rate 20 --duration 20
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在导入插件之前统计线程创建，MCDR的new_thread同样基于threading.Thread
+_thread_starts = [0]
+_original_thread_start = threading.Thread.start
+
+
+def _counting_start(self, *args, **kwargs):
+    _thread_starts[0] += 1
+    return _original_thread_start(self, *args, **kwargs)
+
+
+threading.Thread.start = _counting_start
+
+
+class FakeDataApi:
+    """minecraft_data_api的替身，返回当前模拟的在线玩家"""
+
+    def __init__(self):
+        self.online = []
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def get_server_player_list(self, *args, **kwargs):
+        self.calls += 1
+        with self.lock:
+            players = list(self.online)
+        return len(players), 1000, players
+
+
+class StubServer:
+    """PluginServerInterface的最小替身"""
+
+    def __init__(self, data_folder, config):
+        self.logger = logging.getLogger("ServerStatus")
+        self._data_folder = data_folder
+        self._config = config
+
+    def load_config_simple(self, file_name='config.json', default_config=None, **kwargs):
+        result = dict(default_config or {})
+        result.update(self._config)
+        return result
+
+    def get_data_folder(self):
+        os.makedirs(self._data_folder, exist_ok=True)
+        return self._data_folder
+
+    def register_command(self, *args, **kwargs):
+        pass
+
+    def register_help_message(self, *args, **kwargs):
+        pass
+
+    def register_event_listener(self, *args, **kwargs):
+        pass
+
+    def get_server_pid(self):
+        return os.getpid()
+
+    def is_server_startup(self):
+        return True
+
+    def is_server_running(self):
+        return True
+
+    def execute(self, command):
+        pass
+
+
+class BackendHandler(BaseHTTPRequestHandler):
+    """本地替身后端，按固定延迟返回成功"""
+
+    latency = 0.0
+    received = 0
+    received_bytes = 0
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        BackendHandler.received += 1
+        BackendHandler.received_bytes += length
+        if self.latency:
+            time.sleep(self.latency)
+        body = b'{"code":200,"data":null,"message":"success"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Accept-Encoding', 'gzip')
+        self.send_header('Accept-Post', 'application/json')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize_ms(samples):
+    return {
+        "count": len(samples),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 4) if samples else 0.0,
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 4),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 4),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 4)
+    }
+
+
+def measure_call(func, iterations):
+    """多次调用func，返回耗时统计和每次调用的平均内存分配"""
+    timings = []
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    allocated = sum(stat.size_diff for stat in stats if stat.size_diff > 0)
+    result = summarize_ms(timings)
+    result["alloc_bytes_per_call"] = round(allocated / iterations, 1)
+    result["peak_traced_bytes"] = peak
+    return result
+
+
+def churn(plugin, server, api, players, bots, rate, stop_event, online):
+    """按rate次/秒随机让玩家或假人加入、离开，online为当前在线的玩家集合"""
+    names = [f"Player{i}" for i in range(players)] + [f"假的bot{i}" for i in range(bots)]
+    interval = 1.0 / rate if rate > 0 else None
+    while not stop_event.is_set():
+        name = random.choice(names)
+        if name in online:
+            online.discard(name)
+            with api.lock:
+                api.online.remove(name)
+            plugin.on_player_left(server, name)
+        else:
+            online.add(name)
+            with api.lock:
+                api.online.append(name)
+            plugin.on_player_joined(server, name, None)
+        if interval is None:
+            return
+        stop_event.wait(interval)
+
+
+def run(args):
+    logging.basicConfig(level=logging.WARNING)
+    workdir = tempfile.mkdtemp(prefix="server_status_bench_")
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+
+    BackendHandler.latency = args.backend_latency / 1000
+    backend = ThreadingHTTPServer(('127.0.0.1', 0), BackendHandler)
+    threading.Thread(target=backend.serve_forever, name="Bench-Backend", daemon=True).start()
+    backend_url = f"http://127.0.0.1:{backend.server_address[1]}/api/server_status"
+
+    api = FakeDataApi()
+    sys.modules['minecraft_data_api'] = types.SimpleNamespace(get_server_player_list=api.get_server_player_list)
+    sys.path.insert(0, REPO_ROOT)
+
+    results = {}
+    try:
+        import_started = time.perf_counter()
+        import server_status as plugin
+        results["import_ms"] = round((time.perf_counter() - import_started) * 1000, 3)
+
+        server = StubServer(os.path.join(workdir, 'config', 'server_status'), {
+            "web_server_url": backend_url,
+            "report_interval": args.report_interval,
+            "session_recording": args.mysql,
+            "payload_encoding": args.encoding
+        })
+
+        threads_before = _thread_starts[0]
+        cpu_started = time.process_time()
+        wall_started = time.perf_counter()
+        plugin.on_load(server, None)
+        results["load_timings"] = dict(plugin.load_timings)
+
+        # 先让一部分玩家在线，作为稳态的名单规模
+        initial = [f"Player{i}" for i in range(args.players // 2)] + [f"假的bot{i}" for i in range(args.bots // 2)]
+        with api.lock:
+            api.online.extend(initial)
+        for name in initial:
+            plugin.on_player_joined(server, name, None)
+
+        results["build_status_data"] = measure_call(lambda: plugin.build_status_data(server), args.iterations)
+        results["get_filtered_player_list"] = measure_call(plugin.get_filtered_player_list, args.iterations)
+
+        # 在持续的加入/离开下统计上报循环的端到端延迟
+        report_latencies = []
+        original_send = plugin.send_status_report
+
+        def timed_send(srv, status_data):
+            started = time.perf_counter()
+            try:
+                return original_send(srv, status_data)
+            finally:
+                report_latencies.append(time.perf_counter() - started)
+
+        plugin.send_status_report = timed_send
+        stop_event = threading.Event()
+        churn_thread = threading.Thread(
+            target=churn,
+            args=(plugin, server, api, args.players, args.bots, args.churn_rate, stop_event, set(initial)),
+            name="Bench-Churn",
+            daemon=True
+        )
+        churn_thread.start()
+        stop_event.wait(args.duration)
+        stop_event.set()
+        churn_thread.join()
+        plugin.on_unload(server)
+
+        results["reporter_loop"] = summarize_ms(report_latencies)
+        results["cpu_time_s"] = round(time.process_time() - cpu_started, 3)
+        results["wall_time_s"] = round(time.perf_counter() - wall_started, 3)
+        results["threads_started"] = _thread_starts[0] - threads_before - 1  # 不计模拟玩家的线程
+        results["player_list_queries"] = api.calls
+        results["backend_requests"] = BackendHandler.received
+        results["backend_bytes"] = BackendHandler.received_bytes
+    finally:
+        backend.shutdown()
+        os.chdir(previous_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def print_report(results, args):
+    print(f"玩家 {args.players} / 假人 {args.bots} / 变化速率 {args.churn_rate}/s / 持续 {args.duration}s")
+    print(f"首次导入耗时(含mcdreforged): {results['import_ms']}ms, 插件记录的加载耗时: {results['load_timings']}")
+    for name in ("build_status_data", "get_filtered_player_list", "reporter_loop"):
+        stats = results[name]
+        line = (f"{name:<26} n={stats['count']:<6} mean={stats['mean_ms']:.4f}ms "
+                f"p50={stats['p50_ms']:.4f}ms p95={stats['p95_ms']:.4f}ms p99={stats['p99_ms']:.4f}ms")
+        if "alloc_bytes_per_call" in stats:
+            line += f" alloc={stats['alloc_bytes_per_call']}B/call"
+        print(line)
+    print(f"CPU时间: {results['cpu_time_s']}s / 墙钟时间: {results['wall_time_s']}s")
+    print(f"新建线程: {results['threads_started']}, /list 查询: {results['player_list_queries']}, "
+          f"后端请求: {results['backend_requests']} ({results['backend_bytes']} 字节)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="server_status 插件负载模拟测试")
+    parser.add_argument('--players', type=int, default=100, help="真实玩家名池大小")
+    parser.add_argument('--bots', type=int, default=200, help="假人名池大小")
+    parser.add_argument('--churn-rate', type=float, default=10, help="每秒加入/离开事件数")
+    parser.add_argument('--duration', type=float, default=15, help="上报循环的测试时长(秒)，插件启动后会先等待5秒")
+    parser.add_argument('--iterations', type=int, default=2000, help="单函数测试的调用次数")
+    parser.add_argument('--report-interval', type=int, default=1, help="插件的report_interval配置")
+    parser.add_argument('--backend-latency', type=float, default=0, help="替身后端的响应延迟(毫秒)")
+    parser.add_argument('--encoding', choices=('json', 'msgpack'), default='json', help="上报编码")
+    parser.add_argument('--mysql', action='store_true', help="启用会话写入(需要可用的MySQL)")
+    parser.add_argument('--json', action='store_true', help="以JSON格式输出结果")
+    parser.add_argument('--check-budget', action='store_true', help="加载耗时超过插件的load_time_budget_ms时返回非零退出码")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_report(results, args)
+
+    if args.check_budget:
+        import server_status as plugin
+        budget = plugin.DEFAULT_CONFIG["load_time_budget_ms"]
+        total = results["load_timings"]["import_ms"] + results["load_timings"]["load_ms"]
+        if total > budget:
+            print(f"加载耗时 {total:.1f}ms 超过预算 {budget}ms")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
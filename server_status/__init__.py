@@ -1,17 +1,26 @@
 from mcdreforged.api.all import *
 import time
-import psutil
-import requests
 import json
 import os
-import mysql.connector
-from mysql.connector import Error
 from threading import Lock
 
+# psutil、requests和mysql.connector在首次使用时才导入，插件加载和重载时不需要等待它们
+_import_started = time.perf_counter()
+
+from .http_client import ReporterHttpClient
+from .outbox import StatusOutbox
+from .delta import DeltaEncoder
+from .roster import PlayerRoster
+from .session_writer import SessionWriter
+from .metrics import ProcessSampler
+from .executor import CommandExecutor
+from .scheduler import ReportScheduler
+from .perf import PerfRegistry
 
 
 def init_server_startup_time():
     try:
+        import psutil
         process = psutil.Process(os.getpid())
         return process.create_time()
     except Exception as e:
@@ -31,10 +40,11 @@ MYSQL_CONFIG = {
 player_record_lock = Lock()
 
 def get_mysql_connection(server: PluginServerInterface):
+    import mysql.connector
     try:
         connection = mysql.connector.connect(**MYSQL_CONFIG)
         return connection
-    except Error as e:
+    except mysql.connector.Error as e:
         server.logger.error(f"连接MySQL数据库时出错: {e}")
         return None
     except Exception as e:
@@ -101,19 +111,55 @@ def load_server_startup_time_from_file():
 
 
 def get_server_startup_time():
+    # 首次使用时才读取/写入启动时间文件，on_load会在后台线程中提前完成这一步
     global server_startup_time
+    if server_startup_time is None:
+        with startup_time_lock:
+            if server_startup_time is None:
+                server_startup_time = load_server_startup_time_from_file()
     return server_startup_time
 
-server_startup_time = load_server_startup_time_from_file()
+server_startup_time = None
+
+startup_time_lock = Lock()
 
 startup_time = time.time()
 
+# 后端接受上报的HTTP状态码，放入异步接收队列时为202
+ACCEPTED_STATUS = (200, 202)
+
 DEFAULT_CONFIG = {
     "server_name": "Minecraft Server",
     "web_server_url": "http://localhost:5000/api/server_status",
     "server_id": "server_1",
     "report_interval": 60,
-    "bot_prefixes": ["假的bot", "假的Bot_"]  
+    "max_idle_interval": 150,
+    "max_backoff": 300,
+    "change_debounce": 2,
+    "bot_prefixes": ["假的bot", "假的Bot_"],
+    "http_timeout": 10,
+    "http_pool_size": 2,
+    "http_max_retries": 2,
+    "http_backoff_factor": 0.5,
+    "payload_encoding": "json",
+    "compress_threshold": 1024,
+    "outbox_max_bytes": 5242880,
+    "outbox_max_age": 86400,
+    "outbox_batch_size": 20,
+    "delta_reports": True,
+    "keyframe_interval": 10,
+    "roster_reconcile_interval": 300,
+    "session_recording": True,
+    "session_flush_size": 50,
+    "session_flush_interval": 5,
+    "daily_playtime_rollup": True,
+    "metrics_sample_interval": 5,
+    "metrics_history_size": 720,
+    "tps_command": "",
+    "tps_command_interval": 60,
+    "command_workers": 2,
+    "command_queue_size": 16,
+    "load_time_budget_ms": 100
 }
 
 config = None
@@ -122,13 +168,117 @@ reporting = False
 
 server_interface = None
 
+http_client = None
+
+outbox = None
+
+outbox_drain_lock = Lock()
+# 后端不支持批量上报接口(旧版本)时退回逐条重放
+outbox_batch_supported = True
+
+delta_encoder = None
+
+roster = None
+
+session_writer = None
+
+metrics_sampler = None
+
+command_executor = None
+
+report_scheduler = None
+
+load_timings = {}
+
+perf = PerfRegistry()
+
 def on_load(server: PluginServerInterface, prev_module):
-    global startup_time, config, DB_PATH, server_interface
+    global startup_time, config, DB_PATH, server_interface, http_client, outbox, delta_encoder, roster, reporting, session_writer, metrics_sampler, command_executor, report_scheduler, server_startup_time
+    load_started = time.perf_counter()
     server_interface = server  
     
     # 先初始化配置
     config = server.load_config_simple('config.json', default_config=DEFAULT_CONFIG)
     DB_PATH = config.get("database_path", "config/server_status/player_records.db")
+
+    # 所有上报共用一个HTTP客户端，复用长连接
+    http_client = ReporterHttpClient(
+        pool_size=config.get("http_pool_size", 2),
+        max_retries=config.get("http_max_retries", 2),
+        backoff_factor=config.get("http_backoff_factor", 0.5),
+        timeout=config.get("http_timeout", 10),
+        payload_encoding=config.get("payload_encoding", "json"),
+        compress_threshold=config.get("compress_threshold", 1024)
+    )
+
+    # 后端不可达时的上报积压队列
+    outbox = StatusOutbox(
+        os.path.join(server.get_data_folder(), 'outbox.jsonl'),
+        max_bytes=config.get("outbox_max_bytes", 5242880),
+        max_age=config.get("outbox_max_age", 86400)
+    )
+
+    # 状态上报的增量编码，插件重载后从关键帧重新开始
+    delta_encoder = DeltaEncoder(keyframe_interval=config.get("keyframe_interval", 10))
+
+    # 在线玩家名单由加入/离开事件维护，重载插件时沿用之前的名单
+    roster = PlayerRoster(config.get("bot_prefixes", ["假的bot"]))
+    prev_roster = getattr(prev_module, 'roster', None)
+    if prev_roster is not None:
+        roster.replace(prev_roster.names())
+
+    # 玩家会话在后台线程中批量写入MySQL
+    if config.get("session_recording", True):
+        session_writer = SessionWriter(
+            lambda: get_mysql_connection(server),
+            config["server_id"],
+            config["server_name"],
+            server.logger,
+            flush_size=config.get("session_flush_size", 50),
+            flush_interval=config.get("session_flush_interval", 5),
+            perf=perf,
+            daily_rollup=config.get("daily_playtime_rollup", True)
+        )
+        session_writer.start()
+
+    # 服务端进程的资源采样，上报时读取采样历史而不是现场调用psutil
+    tps_command = config.get("tps_command", "")
+    metrics_sampler = ProcessSampler(
+        server.get_server_pid,
+        interval=config.get("metrics_sample_interval", 5),
+        capacity=config.get("metrics_history_size", 720),
+        query_tps=(lambda: server.execute(tps_command) if server.is_server_startup() else None) if tps_command else None,
+        query_interval=config.get("tps_command_interval", 60)
+    )
+    metrics_sampler.start()
+
+    # 命令和一次性的后台任务使用固定大小的线程池，不再每次调用都新建线程
+    command_executor = CommandExecutor(
+        workers=config.get("command_workers", 2),
+        queue_size=config.get("command_queue_size", 16)
+    )
+    command_executor.start()
+
+    # 重载时沿用之前的服务器启动时间，首次加载时在后台读取启动时间文件
+    server_startup_time = getattr(prev_module, 'server_startup_time', None)
+    if server_startup_time is None:
+        command_executor.submit("startup_time", get_server_startup_time, lambda result, error: None)
+
+    # 上报间隔随后端状态和服务器活跃程度自动调整，名单变化时提前上报
+    report_scheduler = ReportScheduler(
+        interval=config["report_interval"],
+        max_idle_interval=config.get("max_idle_interval", 150),
+        max_backoff=config.get("max_backoff", 300),
+        change_debounce=config.get("change_debounce", 2)
+    )
+
+    # 队列深度在查看性能统计时才读取
+    perf.gauge("outbox_bytes", outbox.pending_bytes)
+    perf.gauge("command_queue", command_executor.queue_depth)
+    perf.gauge("command_rejected", lambda: command_executor.rejected)
+    if session_writer is not None:
+        perf.gauge("session_queue", session_writer.pending)
+        perf.gauge("session_dropped", lambda: session_writer.dropped)
     
     startup_time = time.time()
     server.logger.info('服务器状态插件已加载')
@@ -150,31 +300,95 @@ def on_load(server: PluginServerInterface, prev_module):
             .requires(lambda src: src.has_permission(2))
             .runs(lambda src: show_online_players(src))
         )
+        .then(
+            Literal('perf')
+            .requires(lambda src: src.has_permission(2))
+            .runs(lambda src: show_perf(src))
+        )
     )
     server.register_help_message('!!status', '查看服务器运行时间和在线玩家数量')
     server.register_help_message('!!status connect', '测试与后端服务器的连接')
     server.register_help_message('!!status bots', '查看在线的假人玩家列表')
     server.register_help_message('!!status players', '查看当前在线的真实玩家列表')
+    server.register_help_message('!!status perf', '查看插件的性能统计')
 
 
-    server.register_event_listener('PlayerJoined', on_player_joined)
-    server.register_event_listener('PlayerLeft', on_player_left)
-
-
+    reporting = True
     start_reporting(server)
+
+    reconcile_roster_loop(server)
     
 
     auto_connect_to_backend(server)
 
+    check_load_time(server, time.perf_counter() - load_started)
+
+
+def check_load_time(server: PluginServerInterface, load_seconds: float):
+    # 模块导入和on_load的总耗时超过预算时给出警告，防止重新引入耗时的导入或初始化
+    load_timings.update({
+        "import_ms": round(IMPORT_SECONDS * 1000, 3),
+        "load_ms": round(load_seconds * 1000, 3)
+    })
+    total_ms = load_timings["import_ms"] + load_timings["load_ms"]
+    budget_ms = config.get("load_time_budget_ms", 100)
+    if total_ms > budget_ms:
+        server.logger.warning(
+            f"插件加载耗时 {total_ms:.1f}ms，超过预算 {budget_ms}ms "
+            f"(导入 {load_timings['import_ms']:.1f}ms, on_load {load_timings['load_ms']:.1f}ms)"
+        )
+
+
+def on_player_joined(server: PluginServerInterface, player: str, info: Info):
+    if roster.add(player):
+        report_scheduler.notify_change()
+    if session_writer is not None:
+        session_writer.player_joined(player)
+
+
+def on_player_left(server: PluginServerInterface, player: str):
+    if roster.remove(player):
+        report_scheduler.notify_change()
+    if session_writer is not None:
+        session_writer.player_left(player)
+
+
+def on_info(server: PluginServerInterface, info: Info):
+    if metrics_sampler is not None and not info.is_user and info.content:
+        metrics_sampler.parse_console(info.content)
+
+
+def on_server_startup(server: PluginServerInterface):
+    # 服务器刚启动时不会有玩家在线，结束上次异常退出时遗留的会话
+    if session_writer is not None:
+        session_writer.close_open_sessions()
+    # 不能在MCDR的任务执行线程中等待/list的结果
+    command_executor.submit("reconcile_roster", lambda: reconcile_roster(server), lambda result, error: None)
+
+
+def on_server_stop(server: PluginServerInterface, return_code: int):
+    roster.clear()
+
 
 def on_unload(server: PluginServerInterface):
     global reporting
     reporting = False
+    if report_scheduler is not None:
+        report_scheduler.stop()
+    if http_client is not None:
+        http_client.close()
+    if session_writer is not None:
+        session_writer.stop()
+    if metrics_sampler is not None:
+        metrics_sampler.stop()
+    if command_executor is not None:
+        command_executor.stop()
     server.logger.info("服务器状态插件已卸载")
 
 
 @new_thread("ServerStatus-AutoConnect")
 def auto_connect_to_backend(server: PluginServerInterface):
+    import requests
     try:
         connect_data = {
             "server_id": config["server_id"],
@@ -182,10 +396,9 @@ def auto_connect_to_backend(server: PluginServerInterface):
             "action": "connect"
         }
         
-        response = requests.post(
+        response = http_client.post_json(
             config["web_server_url"],
-            json=connect_data,
-            timeout=10
+            connect_data
         )
         
         if response.status_code == 200:
@@ -207,184 +420,349 @@ def auto_connect_to_backend(server: PluginServerInterface):
 def send_full_status_update(server: PluginServerInterface):
     try:
         status_data = build_status_data(server)
-        response = requests.post(
-            config["web_server_url"],
-            json=status_data,
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            pass
-        else:
-            pass
+        send_status_report(server, status_data)
     except Exception as e:
         pass
 
 
-@new_thread("ServerStatus-Query") 
+def send_status_report(server: PluginServerInterface, status_data: dict):
+    # 后端不可达或返回5xx时写入积压队列，上报成功后在后台重放积压的数据
+    import requests
+    # 后端声明支持增量上报之前一律发送完整状态，避免旧版后端把增量当作完整状态保存
+    use_delta = config.get("delta_reports", True) and http_client.supports_delta
+    payload = delta_encoder.encode(status_data) if use_delta else status_data
+    try:
+        with perf.timer("http_report"):
+            response = http_client.post_json(
+                config["web_server_url"],
+                payload
+            )
+        if use_delta and response.status_code == 200 and get_response_code(response) == 409:
+            # 后端发现序号不连续，立即补发完整的关键帧
+            perf.increment("keyframe_resync")
+            delta_encoder.request_keyframe()
+            payload = delta_encoder.encode(status_data)
+            with perf.timer("http_report"):
+                response = http_client.post_json(
+                    config["web_server_url"],
+                    payload
+                )
+    except requests.exceptions.RequestException:
+        queue_status_report(server, status_data)
+        raise
+
+    code = get_response_code(response)
+    if response.status_code >= 500 or code >= 500:
+        # 后端内部错误时Result以HTTP 200返回，结果码在响应体中
+        perf.error("http_report", f"HTTP {response.status_code}, code {code}")
+        queue_status_report(server, status_data)
+    elif response.status_code in ACCEPTED_STATUS:
+        # 后端把上报放入接收队列后返回202，增量的序号已在入队时校验
+        if use_delta and code in ACCEPTED_STATUS:
+            delta_encoder.ack(payload, status_data)
+        if outbox.has_pending():
+            drain_outbox(server)
+    return response
+
+
+def get_response_code(response) -> int:
+    # 后端的Result总是以HTTP 200返回，真正的结果码在响应体的code字段中
+    try:
+        return int(response.json().get("code", response.status_code))
+    except (ValueError, TypeError, AttributeError):
+        return response.status_code
+
+
+def queue_status_report(server: PluginServerInterface, status_data: dict):
+    try:
+        outbox.append(status_data)
+    except OSError as e:
+        server.logger.warning(f"写入上报积压队列失败: {e}")
+
+
+@new_thread("ServerStatus-OutboxDrain")
+def drain_outbox(server: PluginServerInterface):
+    import requests
+    if not outbox_drain_lock.acquire(blocking=False):
+        return
+    replayed = 0
+    try:
+        batch_size = config.get("outbox_batch_size", 20)
+        while reporting:
+            entries = outbox.read_batch(batch_size)
+            if not entries:
+                break
+            sent = replay_batch(entries) if outbox_batch_supported else None
+            if sent is None:
+                sent = replay_one_by_one(entries)
+            replayed += sent
+            if sent < len(entries):
+                # 后端返回5xx，留到下次上报成功后再重放
+                return
+    except requests.exceptions.RequestException:
+        pass
+    except Exception as e:
+        server.logger.warning(f"重放积压的状态数据时出错: {e}")
+    finally:
+        outbox_drain_lock.release()
+        if replayed:
+            server.logger.info(f"已重放 {replayed} 条积压的状态数据")
+
+
+def batch_url() -> str:
+    return config["web_server_url"].rstrip('/') + '/batch'
+
+
+def replay_batch(entries):
+    # 一次请求提交整批积压数据，返回已提交的条数；后端不支持批量接口时返回None
+    global outbox_batch_supported
+    with perf.timer("http_outbox"):
+        response = http_client.post_json(batch_url(), [payload for _, payload in entries])
+    if response.status_code in (404, 405):
+        outbox_batch_supported = False
+        return None
+    if not batch_accepted(response):
+        # 5xx、请求被拒绝(400/413/415等)或无法识别的响应都保留积压数据，稍后重试
+        perf.error("http_outbox", f"HTTP {response.status_code}, code {get_response_code(response)}")
+        return 0
+    # 逐条结果中的4xx说明数据本身有问题，重放也不会成功，与成功的数据一起提交
+    outbox.commit(entries[-1][0])
+    return len(entries)
+
+
+def batch_accepted(response) -> bool:
+    # 只有带逐条结果的成功响应才说明整批数据已被后端处理
+    if response.status_code not in ACCEPTED_STATUS:
+        return False
+    try:
+        body = response.json()
+    except ValueError:
+        return False
+    if not isinstance(body, dict) or body.get("code") != 200:
+        return False
+    data = body.get("data")
+    return isinstance(data, dict) and isinstance(data.get("results"), list)
+
+
+def replay_one_by_one(entries) -> int:
+    sent = 0
+    for token, payload in entries:
+        with perf.timer("http_outbox"):
+            response = http_client.post_json(
+                config["web_server_url"],
+                payload
+            )
+        if response.status_code >= 500 or get_response_code(response) >= 500:
+            perf.error("http_outbox", f"HTTP {response.status_code}")
+            break
+        # 4xx说明数据本身有问题，重放也不会成功，直接丢弃
+        outbox.commit(token)
+        sent += 1
+    return sent
+
+
+def submit_command(src: CommandSource, key: str, task, reply):
+    # 命令在固定大小的线程池中执行，相同的命令同时只执行一次，结果回复给所有等待的玩家
+    def callback(result, error):
+        if error is not None:
+            src.reply(f"§7[§c失败§7] 执行命令时发生错误: {error}")
+        else:
+            reply(result)
+
+    if not command_executor.submit(key, task, callback):
+        src.reply("§7[§6ServerStatus§7] §c当前请求过多，请稍后再试")
+
+
+def reply_lines(src: CommandSource, lines):
+    for line in lines:
+        src.reply(line)
+
+
 def on_status_command(src: CommandSource):
-    src.reply(get_server_info(src.get_server()))
+    server = src.get_server()
+    submit_command(src, "status", lambda: get_server_info(server), src.reply)
 
 
-@new_thread("ServerStatus-Bots")
 def show_bots(src: CommandSource):
-    player_list = get_filtered_player_list()
-    bots = player_list["bots"]
+    submit_command(src, "bots", get_bots_lines, lambda lines: reply_lines(src, lines))
+
+
+def get_bots_lines() -> list:
+    bots = get_filtered_player_list()["bots"]
     
     if bots:
-        src.reply(f"§7======= §6假人玩家列表 §7=======")
-        for bot in bots:
-            src.reply(f"§7- §6{bot}")
-        src.reply(f"§7=========================")
-    else:
-        src.reply("§7当前没有在线的假人玩家")
+        return [f"§7======= §6假人玩家列表 §7======="] + [f"§7- §6{bot}" for bot in bots] + [f"§7========================="]
+    return ["§7当前没有在线的假人玩家"]
 
 
-@new_thread("ServerStatus-OnlinePlayers")
 def show_online_players(src: CommandSource):
-    online_players = get_online_players()
-    
-    bot_prefixes = config.get("bot_prefixes", ["假的bot"])
-    real_players = []
-    for player in online_players:
-        is_bot = False
-        for prefix in bot_prefixes:
-            if player.startswith(prefix):
-                is_bot = True
-                break
-        if not is_bot:
-            real_players.append(player)
+    submit_command(src, "players", get_online_players_lines, lambda lines: reply_lines(src, lines))
+
+
+def get_online_players_lines() -> list:
+    real_players = get_filtered_player_list()["real_players"]
     
     if real_players:
-        src.reply(f"§7======= §6在线真实玩家列表 §7=======")
-        for player in real_players:
-            src.reply(f"§7- §6{player}")
-        src.reply(f"§7=========================")
-    else:
-        src.reply("§7当前没有在线的真实玩家")
+        return [f"§7======= §6在线真实玩家列表 §7======="] + [f"§7- §6{player}" for player in real_players] + [f"§7========================="]
+    return ["§7当前没有在线的真实玩家"]
+
+
+def show_perf(src: CommandSource):
+    # 只读取内存中的统计，直接回复，线程池繁忙时也能查看
+    reply_lines(src, get_perf_lines())
+
+
+def get_perf_lines() -> list:
+    stats = perf.snapshot()
+    lines = [f"§7======= §6性能统计 §7=======",
+             f"§7统计开始于: §6{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(stats['since']))}"]
+    if not stats["timings"]:
+        lines.append("§7暂无耗时数据")
+    for name, timing in sorted(stats["timings"].items()):
+        lines.append(
+            f"§6{name}§7: 次数 {timing['count']} "
+            f"p50 {timing['p50'] * 1000:.1f}ms p95 {timing['p95'] * 1000:.1f}ms "
+            f"p99 {timing['p99'] * 1000:.1f}ms 最大 {timing['max'] * 1000:.1f}ms "
+            f"错误 {'§c' if timing['errors'] else ''}{timing['errors']}"
+        )
+        if timing["last_error"]:
+            lines.append(f"§7  最近错误: §c{timing['last_error']}")
+    values = dict(stats["gauges"], **stats["counters"])
+    if values:
+        lines.append("§7" + ", ".join(f"{name} §6{value}§7" for name, value in sorted(values.items())))
+    lines.append(f"§7=========================")
+    return lines
 
 
-@new_thread("ServerStatus-TestConnection")
 def test_connection(src: CommandSource):
     src.reply(f"§7[§6ServerStatus§7] 正在测试与后端服务器的连接...")
-    
+    submit_command(src, "test_connection", check_backend_connection, lambda lines: reply_lines(src, lines))
+
+
+def check_backend_connection() -> list:
+    import requests
     try:
         test_data = {
             "server_id": config["server_id"],
             "test_connection": True
         }
         
-        response = requests.post(
+        response = http_client.post_json(
             config["web_server_url"],
-            json=test_data,
-            timeout=10
+            test_data
         )
         
         if response.status_code == 200:
-            src.reply(f"§7[§a成功§7] 成功连接到后端服务器!")
-            src.reply(f"§7后端地址: §6{config['web_server_url']}")
-            src.reply(f"§7响应状态: §6{response.status_code}")
-        else:
-            src.reply(f"§7[§c失败§7] 后端服务器返回错误状态码: {response.status_code}")
+            return [
+                f"§7[§a成功§7] 成功连接到后端服务器!",
+                f"§7后端地址: §6{config['web_server_url']}",
+                f"§7响应状态: §6{response.status_code}"
+            ]
+        return [f"§7[§c失败§7] 后端服务器返回错误状态码: {response.status_code}"]
             
     except requests.exceptions.Timeout:
-        src.reply(f"§7[§c失败§7] 连接超时，请检查后端服务器地址是否正确且可访问")
-        src.reply(f"§7后端地址: §6{config['web_server_url']}")
+        return [
+            f"§7[§c失败§7] 连接超时，请检查后端服务器地址是否正确且可访问",
+            f"§7后端地址: §6{config['web_server_url']}"
+        ]
         
     except requests.exceptions.ConnectionError:
-        src.reply(f"§7[§c失败§7] 无法连接到后端服务器，请检查网络连接和服务器地址")
-        src.reply(f"§7后端地址: §6{config['web_server_url']}")
+        return [
+            f"§7[§c失败§7] 无法连接到后端服务器，请检查网络连接和服务器地址",
+            f"§7后端地址: §6{config['web_server_url']}"
+        ]
         
     except Exception as e:
-        src.reply(f"§7[§c失败§7] 测试连接时发生未知错误: {str(e)}")
+        return [f"§7[§c失败§7] 测试连接时发生未知错误: {str(e)}"]
 
 
 @new_thread("ServerStatus-Reporter")
 def start_reporting(server: PluginServerInterface):
+    import requests
     global reporting
     reporting = True
     
     time.sleep(5)
     
-    try:
-        status_data = build_status_data(server)
-        response = requests.post(
-            config["web_server_url"],
-            json=status_data,
-            timeout=10
-        )
-        
-        if response.status_code != 200:
-            pass
-    except Exception as e:
-        pass
-    
+    reported_version = None
     while reporting:
+        roster_version = roster.version
         try:
-            status_data = build_status_data(server)
-            
-            response = requests.post(
-                config["web_server_url"],
-                json=status_data,
-                timeout=10
-            )
+            with perf.timer("report_cycle"):
+                with perf.timer("report_build"):
+                    status_data = build_status_data(server)
+                
+                response = send_status_report(server, status_data)
             
-            if response.status_code != 200:
-                pass
+            # 后端内部错误时Result以HTTP 200返回，结果码在响应体中
+            if response.status_code >= 500 or get_response_code(response) >= 500:
+                report_scheduler.record_failure()
+            else:
+                report_scheduler.record_success(
+                    changed=roster_version != reported_version,
+                    idle=status_data["player_count"] == 0
+                )
+                reported_version = roster_version
                 
         except requests.exceptions.RequestException as e:
-            pass
+            report_scheduler.record_failure()
         except Exception as e:
-            pass
+            report_scheduler.record_failure()
+            # 每次连续失败只记录第一次，完整的错误次数见!!status perf
+            if report_scheduler.failures == 1:
+                server.logger.warning(f"上报服务器状态时出错: {e}")
             
-        for _ in range(config["report_interval"]):
-            if not reporting:
-                return
-            time.sleep(1)
+        if not report_scheduler.wait():
+            return
 
 
 def get_filtered_player_list():
+    return roster.snapshot()
+
+
+def reconcile_roster(server: PluginServerInterface) -> bool:
+    # 用/list的结果校准事件维护的名单，查询期间名单有变化时放弃本次校准
     import minecraft_data_api as api
     try:
-        amount, limit, players = api.get_server_player_list()
-        if players is None:
-            players = []
-            
-        real_players = []
-        bots = []
-        bot_prefixes = config.get("bot_prefixes", ["假的bot"])
-        
-        for player in players:
-            is_bot = False
-            for prefix in bot_prefixes:
-                if player.startswith(prefix):
-                    bots.append(player)
-                    is_bot = True
-                    break
-            if not is_bot:
-                real_players.append(player)
-                
-        return {
-            "real_players": real_players,
-            "bots": bots,
-            "real_amount": len(real_players),
-            "bots_amount": len(bots),
-            "total_amount": amount
-        }
+        version = roster.version
+        with perf.timer("player_list"):
+            result = api.get_server_player_list()
+        if result is None:
+            perf.error("player_list", "查询在线玩家超时")
+            return False
+        amount, limit, players = result
+        if roster.replace(players or [], expected_version=version):
+            report_scheduler.notify_change()
+            return True
+        return False
     except Exception as e:
-        return {
-            "real_players": ["获取失败"],
-            "bots": [],
-            "real_amount": 0,
-            "bots_amount": 0,
-            "total_amount": 0
-        }
+        server.logger.warning(f"校准在线玩家列表时出错: {e}")
+        return False
+
+
+@new_thread("ServerStatus-RosterSync")
+def reconcile_roster_loop(server: PluginServerInterface):
+    if server.is_server_startup():
+        reconcile_roster(server)
+    while reporting:
+        for _ in range(config.get("roster_reconcile_interval", 300)):
+            if not reporting:
+                return
+            time.sleep(1)
+        if server.is_server_startup():
+            reconcile_roster(server)
+
+
+def get_memory_usage() -> float:
+    # 优先使用采样到的服务端进程内存占比，还没有采样时退回整机内存使用率
+    latest = metrics_sampler.latest() if metrics_sampler is not None else None
+    if latest is not None and latest["memory_percent"] is not None:
+        return round(latest["memory_percent"], 1)
+    import psutil
+    return psutil.virtual_memory().percent
 
 
 def build_status_data(server: PluginServerInterface) -> dict:
-    def get_memory_used():
-        return psutil.virtual_memory().percent
-    
     def get_uptime():
         return int(time.time() - get_server_startup_time())
     
@@ -394,12 +772,14 @@ def build_status_data(server: PluginServerInterface) -> dict:
         "server_id": config["server_id"],
         "server_name": config["server_name"],
         "uptime": get_uptime(),
-        "memory_usage": get_memory_used(),
+        "memory_usage": get_memory_usage(),
+        "process": metrics_sampler.report_summary() if metrics_sampler is not None else None,
         "players": player_info["real_players"],
         "bots": player_info["bots"],
         "player_count": player_info["real_amount"],
         "bot_count": player_info["bots_amount"],
-        "last_update": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime())
+        "last_update": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime()),
+        "timestamp": time.time()
     }
     
     return status_data
@@ -407,9 +787,6 @@ def build_status_data(server: PluginServerInterface) -> dict:
 
 def get_server_info(server: PluginServerInterface) -> RTextList:
     
-    def get_menmory_used():
-        return f"{psutil.virtual_memory().percent}"
-    
     def get_uptime():
         uptime_seconds = int(time.time() - get_server_startup_time())
         hours = uptime_seconds // 3600
@@ -425,9 +802,12 @@ def get_server_info(server: PluginServerInterface) -> RTextList:
     return RTextList(
         f"§7============ §6服务器状态 §7============\n",
         f"§6服务器运行时间§7: {get_uptime()}\n",
-        f"§6内存使用率§7: {get_menmory_used()}%\n",
+        f"§6内存使用率§7: {get_memory_usage()}%\n",
         f"§6真实玩家列表§7: {real_players}\n",
         f"§6真实玩家数量§7: {real_player_count}\n",
         f"§6假人玩家数量§7: {bot_count} (使用 !!status bots 查看)\n",
         f"§7==================================="
     )
+
+
+IMPORT_SECONDS = time.perf_counter() - _import_started
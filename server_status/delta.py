@@ -0,0 +1,71 @@
+from threading import Lock
+
+# 以增减项方式编码的列表字段，其余字段只发送发生变化的值
+LIST_FIELDS = ("players", "bots")
+
+
+class DeltaEncoder:
+    """状态上报的增量编码器
+
+    每次上报分配递增的序号，相对后端最后确认的状态只发送变化的字段，
+    每隔keyframe_interval次或后端要求重新同步时发送完整的关键帧。
+    """
+
+    def __init__(self, keyframe_interval=10):
+        self._keyframe_interval = max(1, int(keyframe_interval))
+        self._lock = Lock()
+        self._seq = 0
+        self._acked_seq = None
+        self._acked_status = None
+        self._since_keyframe = 0
+        self._force_keyframe = True
+
+    def encode(self, status: dict) -> dict:
+        with self._lock:
+            self._seq += 1
+            if (self._acked_status is None or self._force_keyframe
+                    or self._since_keyframe >= self._keyframe_interval):
+                payload = dict(status)
+                payload.update({"type": "full", "seq": self._seq})
+                return payload
+
+            base = self._acked_status
+            payload = {
+                "type": "delta",
+                "seq": self._seq,
+                "base_seq": self._acked_seq,
+                "server_id": status["server_id"]
+            }
+            for field in LIST_FIELDS:
+                old_items = base.get(field) or []
+                new_items = status.get(field) or []
+                old_set = set(old_items)
+                new_set = set(new_items)
+                added = [item for item in new_items if item not in old_set]
+                removed = [item for item in old_items if item not in new_set]
+                if added:
+                    payload[f"{field}_added"] = added
+                if removed:
+                    payload[f"{field}_removed"] = removed
+            payload["changed"] = {
+                key: value for key, value in status.items()
+                if key not in LIST_FIELDS and base.get(key) != value
+            }
+            return payload
+
+    def ack(self, payload: dict, status: dict):
+        """后端接受了payload，把status作为后续增量的基准"""
+        with self._lock:
+            if self._acked_seq is not None and payload["seq"] <= self._acked_seq:
+                return
+            self._acked_seq = payload["seq"]
+            self._acked_status = status
+            if payload["type"] == "full":
+                self._since_keyframe = 0
+                self._force_keyframe = False
+            else:
+                self._since_keyframe += 1
+
+    def request_keyframe(self):
+        with self._lock:
+            self._force_keyframe = True
@@ -0,0 +1,81 @@
+import queue
+from threading import Lock, Thread
+
+
+class CommandExecutor:
+    """插件命令使用的固定大小线程池
+
+    任务进入有界队列，由固定数量的工作线程执行；队列满时拒绝提交。
+    相同key的任务在排队或执行期间再次提交时不会重复执行，而是与之前的任务共享结果。
+    """
+
+    def __init__(self, workers=2, queue_size=16, name="ServerStatus-Worker"):
+        self._workers = max(1, int(workers))
+        self._name = name
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._lock = Lock()
+        # 正在排队或执行的任务: key -> 回调列表
+        self._inflight = {}
+        self._threads = []
+        self.rejected = 0
+        self.coalesced = 0
+
+    def start(self):
+        if self._threads:
+            return
+        for index in range(self._workers):
+            thread = Thread(target=self._run, name=f"{self._name}-{index + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        for _ in self._threads:
+            try:
+                self._queue.put(None, timeout=1)
+            except queue.Full:
+                break
+        self._threads = []
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, key, task, callback) -> bool:
+        """提交任务，task的返回值或异常以callback(result, error)的形式交回
+
+        key为None时不合并；队列已满时返回False。
+        """
+        with self._lock:
+            if key is not None and key in self._inflight:
+                self._inflight[key].append(callback)
+                self.coalesced += 1
+                return True
+            callbacks = [callback]
+            try:
+                self._queue.put_nowait((key, task, callbacks))
+            except queue.Full:
+                self.rejected += 1
+                return False
+            if key is not None:
+                self._inflight[key] = callbacks
+            return True
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            key, task, callbacks = item
+            result, error = None, None
+            try:
+                result = task()
+            except Exception as e:
+                error = e
+            with self._lock:
+                if key is not None:
+                    self._inflight.pop(key, None)
+                callbacks = list(callbacks)
+            for callback in callbacks:
+                try:
+                    callback(result, error)
+                except Exception:
+                    pass
@@ -0,0 +1,139 @@
+import gzip
+import json
+from threading import Lock
+
+# requests和msgpack在首次发送时才导入，避免拖慢插件加载
+JSON_CONTENT_TYPE = 'application/json'
+DELTA_SUPPORT_HEADER = 'X-Status-Delta'
+MSGPACK_CONTENT_TYPE = 'application/msgpack'
+
+
+class ReporterHttpClient:
+    """插件共用的HTTP客户端
+
+    所有上报共享同一个Session，复用连接池中的长连接（HTTPS时同时复用TLS会话），
+    连接失败(请求尚未发出)时按指数退避重试；上报的POST收到5xx时不在这里重试，
+    由ReportScheduler按退避时间重新上报，避免在上报线程中叠加等待。
+    后端在响应头中声明支持gzip和MessagePack后，较大的上报会改用紧凑编码发送。
+    后端声明支持增量上报前，supports_delta为False。
+    """
+
+    RETRY_STATUS = (502, 503, 504)
+
+    def __init__(self, pool_size=2, max_retries=2, backoff_factor=0.5, timeout=10,
+                 payload_encoding='json', compress_threshold=1024):
+        self._pool_size = max(1, int(pool_size))
+        self._max_retries = max(0, int(max_retries))
+        self._backoff_factor = backoff_factor
+        self._timeout = timeout
+        self._payload_encoding = payload_encoding
+        self._compress_threshold = compress_threshold
+        self._lock = Lock()
+        self._session = None
+        # 由后端响应头得知的能力，未知时按普通JSON发送
+        self._backend_gzip = False
+        self._backend_msgpack = False
+        self._backend_delta = False
+
+    def _create_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=self._max_retries,
+            connect=self._max_retries,
+            read=0,
+            status=self._max_retries,
+            backoff_factor=self._backoff_factor,
+            status_forcelist=self.RETRY_STATUS,
+            # 按状态码重试只用于GET，POST上报收到5xx后交给调度器退避
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=False,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self._pool_size,
+            max_retries=retry,
+            pool_block=False
+        )
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({'Connection': 'keep-alive'})
+        return session
+
+    def _get_session(self):
+        with self._lock:
+            if self._session is None:
+                self._session = self._create_session()
+            return self._session
+
+    def post(self, url, **kwargs):
+        kwargs.setdefault('timeout', self._timeout)
+        return self._get_session().post(url, **kwargs)
+
+    def post_json(self, url, payload, **kwargs):
+        """发送上报数据，按后端支持的能力选择编码和压缩"""
+        body, headers = self._encode(payload, compact=True)
+        response = self.post(url, data=body, headers=headers, **kwargs)
+        self._learn(response)
+        if response.status_code == 415 and headers != {'Content-Type': JSON_CONTENT_TYPE}:
+            # 后端不再支持协商过的编码（例如降级部署），退回普通JSON重发
+            self._backend_gzip = False
+            self._backend_msgpack = False
+            body, headers = self._encode(payload, compact=False)
+            response = self.post(url, data=body, headers=headers, **kwargs)
+        return response
+
+    def _encode(self, payload, compact):
+        msgpack = load_msgpack() if compact and self._payload_encoding == 'msgpack' and self._backend_msgpack else None
+        if msgpack is not None:
+            body = msgpack.packb(payload, use_bin_type=True)
+            headers = {'Content-Type': MSGPACK_CONTENT_TYPE}
+        else:
+            body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            headers = {'Content-Type': JSON_CONTENT_TYPE}
+        if compact and self._backend_gzip and len(body) >= self._compress_threshold:
+            body = gzip.compress(body, compresslevel=6)
+            headers['Content-Encoding'] = 'gzip'
+        return body, headers
+
+    def _learn(self, response):
+        accept_encoding = response.headers.get('Accept-Encoding')
+        if accept_encoding is not None:
+            self._backend_gzip = 'gzip' in accept_encoding.lower()
+        accept_post = response.headers.get('Accept-Post')
+        if accept_post is not None:
+            self._backend_msgpack = MSGPACK_CONTENT_TYPE in accept_post.lower()
+            # 只有后端自身的响应带有Accept-Post，旧版后端不会声明增量上报
+            self._backend_delta = response.headers.get(DELTA_SUPPORT_HEADER) == '1'
+
+    @property
+    def supports_delta(self) -> bool:
+        return self._backend_delta
+
+    def close(self):
+        with self._lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+
+
+_msgpack = None
+_msgpack_checked = False
+
+
+def load_msgpack():
+    """msgpack是可选依赖，未安装时返回None"""
+    global _msgpack, _msgpack_checked
+    if not _msgpack_checked:
+        try:
+            import msgpack
+            _msgpack = msgpack
+        except ImportError:
+            _msgpack = None
+        _msgpack_checked = True
+    return _msgpack
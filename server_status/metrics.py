@@ -0,0 +1,186 @@
+import math
+import re
+import time
+from array import array
+from threading import Event, Lock, Thread
+
+NAN = float('nan')
+
+METRIC_COLUMNS = ("cpu_percent", "rss", "memory_percent", "threads", "fds", "tps", "mspt")
+
+# 控制台中TPS/MSPT的输出格式，分别对应Paper/Spigot的/tps、Forge的/forge tps和原版的/tick query
+TPS_PATTERN = re.compile(r"(?:TPS from last 1m, 5m, 15m|Mean TPS):\s*\*?([\d.]+)")
+MSPT_PATTERN = re.compile(r"(?:Mean tick time|Average time per tick):\s*([\d.]+)\s*ms")
+COLOR_CODE_PATTERN = re.compile(r"§.")
+
+
+class RingBuffer:
+    """定长环形缓冲区
+
+    每一列是一个预分配的array('d')，写入只覆盖旧值，不产生新的对象。缺失的值记为NaN。
+    """
+
+    def __init__(self, capacity, columns):
+        self._capacity = max(1, int(capacity))
+        self._columns = tuple(columns)
+        self._times = array('d', [0.0]) * self._capacity
+        self._data = [array('d', [NAN]) * self._capacity for _ in self._columns]
+        self._next = 0
+        self._count = 0
+        self._lock = Lock()
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp, values):
+        with self._lock:
+            index = self._next
+            self._times[index] = timestamp
+            for column, value in zip(self._data, values):
+                column[index] = NAN if value is None else value
+            self._next = (index + 1) % self._capacity
+            self._count = min(self._count + 1, self._capacity)
+
+    def latest(self):
+        """最近一次采样的值，没有采样时返回None"""
+        with self._lock:
+            if self._count == 0:
+                return None
+            index = (self._next - 1) % self._capacity
+            return {
+                name: (None if math.isnan(column[index]) else column[index])
+                for name, column in zip(self._columns, self._data)
+            }
+
+    def summary(self, since=0.0):
+        """统计时间晚于since的采样，返回每一列的min/avg/max，没有有效值的列为None"""
+        with self._lock:
+            start = (self._next - self._count) % self._capacity
+            indexes = [
+                (start + offset) % self._capacity for offset in range(self._count)
+                if self._times[(start + offset) % self._capacity] > since
+            ]
+            result = {"samples": len(indexes)}
+            for name, column in zip(self._columns, self._data):
+                values = [column[i] for i in indexes if not math.isnan(column[i])]
+                if values:
+                    result[name] = {
+                        "min": min(values),
+                        "avg": round(sum(values) / len(values), 3),
+                        "max": max(values)
+                    }
+                else:
+                    result[name] = None
+            return result
+
+
+class ProcessSampler:
+    """Minecraft服务端进程的资源采样线程
+
+    定时采样服务端进程的CPU、内存、线程数和文件描述符数，连同控制台解析出的TPS/MSPT
+    写入环形缓冲区，上报时只读取缓冲区而不再调用psutil。
+    """
+
+    def __init__(self, get_pid, interval=5, capacity=720, query_tps=None, query_interval=60):
+        self._get_pid = get_pid
+        self._interval = interval
+        self._query_tps = query_tps
+        self._query_interval = query_interval
+        self._last_query = 0.0
+        self.history = RingBuffer(capacity, METRIC_COLUMNS)
+        self._process = None
+        self._tps = None
+        self._mspt = None
+        self._stopping = Event()
+        self._thread = None
+        self._report_marker = 0.0
+
+    def parse_console(self, content: str):
+        """从控制台输出中解析TPS/MSPT，不匹配的行直接忽略"""
+        if 'TPS' not in content and 'tick' not in content:
+            return
+        content = COLOR_CODE_PATTERN.sub('', content)
+        match = TPS_PATTERN.search(content)
+        if match:
+            self._tps = float(match.group(1))
+        match = MSPT_PATTERN.search(content)
+        if match:
+            self._mspt = float(match.group(1))
+
+    def _resolve_process(self):
+        import psutil
+        if self._process is not None and self._process.is_running():
+            return self._process
+        restarted = self._process is not None
+        self._process = None
+        pid = self._get_pid()
+        if pid is None:
+            return None
+        process = psutil.Process(pid)
+        # 启动命令可能经过shell包装，优先选择其中的java子进程
+        if 'java' not in process.name().lower():
+            for child in process.children(recursive=True):
+                if 'java' in child.name().lower():
+                    process = child
+                    break
+        process.cpu_percent(None)
+        if restarted:
+            # 服务端已重启，之前解析到的TPS/MSPT不再有效
+            self._tps = None
+            self._mspt = None
+        self._process = process
+        return process
+
+    def sample(self):
+        # psutil在采样线程中首次使用时才导入
+        import psutil
+        try:
+            process = self._resolve_process()
+            if process is None:
+                return
+            with process.oneshot():
+                cpu_percent = process.cpu_percent(None)
+                rss = process.memory_info().rss
+                memory_percent = process.memory_percent()
+                threads = process.num_threads()
+                fds = process.num_fds() if hasattr(process, 'num_fds') else process.num_handles()
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            self._process = None
+            return
+        self.history.append(time.time(), (
+            cpu_percent, rss, memory_percent, threads, fds, self._tps, self._mspt
+        ))
+
+    def _run(self):
+        while not self._stopping.is_set():
+            # 定期执行查询TPS的命令，结果由parse_console从控制台输出中解析
+            if self._query_tps is not None and time.time() - self._last_query >= self._query_interval:
+                self._last_query = time.time()
+                try:
+                    self._query_tps()
+                except Exception:
+                    pass
+            self.sample()
+            self._stopping.wait(self._interval)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = Thread(target=self._run, name="ServerStatus-MetricsSampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def latest(self):
+        return self.history.latest()
+
+    def report_summary(self):
+        """自上次调用以来的采样统计"""
+        now = time.time()
+        summary = self.history.summary(self._report_marker)
+        self._report_marker = now
+        return summary
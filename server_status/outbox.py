@@ -0,0 +1,129 @@
+import json
+import os
+import time
+from threading import Lock
+
+
+class StatusOutbox:
+    """磁盘上的追加写上报队列
+
+    后端不可达时把状态数据逐行追加到JSON Lines文件，恢复后从记录的偏移量处按批重放。
+    文件超过max_bytes时压缩，丢弃最旧和超过max_age秒的记录。
+    """
+
+    def __init__(self, path, max_bytes=5 * 1024 * 1024, max_age=86400):
+        self._path = path
+        self._offset_path = path + '.offset'
+        self._max_bytes = max_bytes
+        self._max_age = max_age
+        self._lock = Lock()
+        # 每次压缩后递增，旧的偏移量随之失效
+        self._generation = 0
+        self._offset = self._load_offset()
+
+    def _load_offset(self):
+        try:
+            with open(self._offset_path, 'r') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _save_offset(self, offset):
+        temp_file = self._offset_path + '.tmp'
+        with open(temp_file, 'w') as f:
+            f.write(str(offset))
+        os.replace(temp_file, self._offset_path)
+        self._offset = offset
+
+    def _size(self):
+        try:
+            return os.path.getsize(self._path)
+        except OSError:
+            return 0
+
+    def append(self, payload):
+        line = json.dumps({"queued_at": time.time(), "payload": payload}, ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            os.makedirs(os.path.dirname(self._path) or '.', exist_ok=True)
+            with open(self._path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+            if self._size() > self._max_bytes:
+                self._compact_locked()
+
+    def has_pending(self):
+        with self._lock:
+            return self._size() > self._offset
+
+    def pending_bytes(self):
+        with self._lock:
+            return max(0, self._size() - self._offset)
+
+    def read_batch(self, limit):
+        """从当前偏移量读取最多limit条未过期的记录
+
+        返回[(提交令牌, payload), ...]，重放成功后把对应令牌传给commit()。
+        """
+        entries = []
+        expire_before = time.time() - self._max_age
+        with self._lock:
+            generation = self._generation
+            if self._size() <= self._offset:
+                return entries
+            with open(self._path, 'rb') as f:
+                f.seek(self._offset)
+                while len(entries) < limit:
+                    raw = f.readline()
+                    if not raw or not raw.endswith(b'\n'):
+                        break
+                    token = (generation, f.tell())
+                    try:
+                        record = json.loads(raw.decode('utf-8'))
+                    except ValueError:
+                        record = None
+                    if not record or record.get("queued_at", 0) < expire_before:
+                        # 损坏或过期的记录直接跳过，并随下一条记录一起提交
+                        if not entries:
+                            self._save_offset(token[1])
+                        continue
+                    entries.append((token, record.get("payload")))
+        return entries
+
+    def commit(self, token):
+        generation, offset = token
+        with self._lock:
+            if generation != self._generation or offset <= self._offset:
+                return
+            if offset >= self._size():
+                # 全部重放完成，清空队列文件
+                open(self._path, 'w').close()
+                self._generation += 1
+                self._save_offset(0)
+            else:
+                self._save_offset(offset)
+
+    def _compact_locked(self):
+        expire_before = time.time() - self._max_age
+        kept = []
+        kept_bytes = 0
+        budget = self._max_bytes // 2
+        with open(self._path, 'rb') as f:
+            f.seek(self._offset)
+            lines = f.readlines()
+        # 从最新的记录往前保留，直到占满一半的容量
+        for raw in reversed(lines):
+            if not raw.endswith(b'\n'):
+                continue
+            try:
+                queued_at = json.loads(raw.decode('utf-8')).get("queued_at", 0)
+            except ValueError:
+                continue
+            if queued_at < expire_before or kept_bytes + len(raw) > budget:
+                break
+            kept.append(raw)
+            kept_bytes += len(raw)
+        temp_file = self._path + '.tmp'
+        with open(temp_file, 'wb') as f:
+            f.writelines(reversed(kept))
+        os.replace(temp_file, self._path)
+        self._generation += 1
+        self._save_offset(0)
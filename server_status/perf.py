@@ -0,0 +1,130 @@
+import math
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+# 直方图的第一个桶上限(秒)和相邻桶的比例，共BUCKET_COUNT个桶，覆盖0.1ms到约两分钟
+BUCKET_BASE = 0.0001
+BUCKET_GROWTH = 1.25
+BUCKET_COUNT = 64
+
+
+class LatencyHistogram:
+    """按几何级数分桶的延迟直方图
+
+    记录只增加一个桶的计数，不保存原始样本，百分位数取所在桶的上限，相对误差不超过25%。
+    """
+
+    def __init__(self):
+        self._buckets = [0] * BUCKET_COUNT
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last_error = None
+
+    def record(self, seconds: float):
+        if seconds <= BUCKET_BASE:
+            index = 0
+        else:
+            index = min(BUCKET_COUNT - 1, int(math.ceil(math.log(seconds / BUCKET_BASE, BUCKET_GROWTH))))
+        self._buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction: float) -> float:
+        if self.count == 0:
+            return 0.0
+        target = max(1, int(math.ceil(fraction * self.count)))
+        seen = 0
+        for index, amount in enumerate(self._buckets):
+            seen += amount
+            if seen >= target:
+                if index == BUCKET_COUNT - 1:
+                    # 最后一个桶没有上限，取最大值而不是低估
+                    return self.max
+                return min(BUCKET_BASE * BUCKET_GROWTH ** index, self.max)
+        return self.max
+
+
+class PerfRegistry:
+    """插件热路径的计数器和延迟统计"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self.started = time.time()
+
+    def _histogram(self, name):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = LatencyHistogram()
+        return histogram
+
+    def record(self, name: str, seconds: float, error=None):
+        """记录一次耗时，error不为None时同时计为一次错误"""
+        with self._lock:
+            histogram = self._histogram(name)
+            histogram.record(seconds)
+            if error is not None:
+                histogram.errors += 1
+                histogram.last_error = str(error)
+
+    def error(self, name: str, error):
+        """记录一次没有耗时的错误，例如后端返回5xx"""
+        with self._lock:
+            histogram = self._histogram(name)
+            histogram.errors += 1
+            histogram.last_error = str(error)
+
+    @contextmanager
+    def timer(self, name: str):
+        """统计代码块的耗时，代码块抛出的异常计为错误后继续抛出"""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record(name, time.perf_counter() - started, e)
+            raise
+        self.record(name, time.perf_counter() - started)
+
+    def increment(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def gauge(self, name: str, read):
+        """注册一个在查看统计时才读取的量，例如队列深度"""
+        self._gauges[name] = read
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            timings = {
+                name: {
+                    "count": histogram.count,
+                    "errors": histogram.errors,
+                    "avg": histogram.total / histogram.count if histogram.count else 0.0,
+                    "p50": histogram.percentile(0.50),
+                    "p95": histogram.percentile(0.95),
+                    "p99": histogram.percentile(0.99),
+                    "max": histogram.max,
+                    "last_error": histogram.last_error
+                }
+                for name, histogram in self._histograms.items()
+            }
+            counters = dict(self._counters)
+        gauges = {}
+        for name, read in self._gauges.items():
+            try:
+                gauges[name] = read()
+            except Exception:
+                gauges[name] = None
+        return {
+            "since": self.started,
+            "timings": timings,
+            "counters": counters,
+            "gauges": gauges
+        }
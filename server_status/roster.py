@@ -0,0 +1,95 @@
+from threading import Lock
+
+
+class PlayerRoster:
+    """在线玩家名单
+
+    由玩家加入/离开事件实时维护，并定期与minecraft_data_api查询到的列表校准。
+    每次变化时重新生成只读快照，读取方直接拿到快照，不需要加锁或遍历。
+    """
+
+    def __init__(self, bot_prefixes):
+        self._bot_prefixes = tuple(bot_prefixes)
+        self._lock = Lock()
+        # 使用dict保持加入顺序
+        self._players = {}
+        self._version = 0
+        self._snapshot = self._build_snapshot()
+
+    @property
+    def version(self) -> int:
+        """名单每变化一次加一"""
+        return self._version
+
+    def is_bot(self, player: str) -> bool:
+        return player.startswith(self._bot_prefixes)
+
+    def _build_snapshot(self) -> dict:
+        real_players = []
+        bots = []
+        for player in self._players:
+            if self.is_bot(player):
+                bots.append(player)
+            else:
+                real_players.append(player)
+        return {
+            "real_players": real_players,
+            "bots": bots,
+            "real_amount": len(real_players),
+            "bots_amount": len(bots),
+            "total_amount": len(self._players)
+        }
+
+    def _changed(self):
+        self._version += 1
+        self._snapshot = self._build_snapshot()
+
+    def snapshot(self) -> dict:
+        """获取当前名单的快照，调用方不应修改返回的数据"""
+        return self._snapshot
+
+    def names(self) -> list:
+        with self._lock:
+            return list(self._players)
+
+    def add(self, player: str) -> bool:
+        with self._lock:
+            if player in self._players:
+                return False
+            self._players[player] = None
+            self._changed()
+            return True
+
+    def remove(self, player: str) -> bool:
+        with self._lock:
+            if player not in self._players:
+                return False
+            del self._players[player]
+            self._changed()
+            return True
+
+    def replace(self, players, expected_version=None) -> bool:
+        """用完整的玩家列表校准名单
+
+        expected_version不为None且名单在此期间已被事件修改时放弃校准，避免覆盖更新的事件。
+        返回名单是否发生了变化。
+        """
+        with self._lock:
+            if expected_version is not None and expected_version != self._version:
+                return False
+            player_set = set(players)
+            if player_set == self._players.keys():
+                return False
+            # 保留已在线玩家的顺序，新出现的玩家追加到末尾
+            new_players = {player: None for player in self._players if player in player_set}
+            for player in players:
+                new_players.setdefault(player, None)
+            self._players = new_players
+            self._changed()
+            return True
+
+    def clear(self):
+        with self._lock:
+            if self._players:
+                self._players = {}
+                self._changed()
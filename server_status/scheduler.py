@@ -0,0 +1,78 @@
+import random
+import time
+from threading import Condition
+
+
+class ReportScheduler:
+    """状态上报的自适应调度
+
+    - 后端连续失败时按指数退避（带随机抖动）重试，避免后端恢复时被集中请求；
+      退避从正常的上报间隔起步，失败期间的请求不会比正常时更频繁
+    - 服务器空闲且名单没有变化时逐步拉长上报间隔，最长不超过max_idle_interval
+    - 名单变化时在change_debounce秒后立即上报，合并短时间内的多次变化
+    """
+
+    def __init__(self, interval=60, max_idle_interval=150, min_backoff=5, max_backoff=300,
+                 change_debounce=2, idle_growth=1.5):
+        self._interval = interval
+        self._max_idle_interval = max(interval, max_idle_interval)
+        self._min_backoff = max(min_backoff, interval)
+        self._max_backoff = max(max_backoff, self._min_backoff)
+        self._change_debounce = change_debounce
+        self._idle_growth = idle_growth
+        self._cond = Condition()
+        self._failures = 0
+        self._idle_streak = 0
+        self._change_at = None
+        self._stopped = False
+
+    @property
+    def failures(self) -> int:
+        return self._failures
+
+    def notify_change(self):
+        with self._cond:
+            if self._change_at is None:
+                self._change_at = time.monotonic()
+                self._cond.notify_all()
+
+    def record_success(self, changed: bool, idle: bool):
+        with self._cond:
+            self._failures = 0
+            if changed or not idle:
+                self._idle_streak = 0
+            else:
+                self._idle_streak += 1
+
+    def record_failure(self):
+        with self._cond:
+            self._failures += 1
+
+    def next_delay(self) -> float:
+        with self._cond:
+            if self._failures:
+                # 第n次失败后在[min_backoff * 2^(n-1), min_backoff * 2^n]内随机，不超过max_backoff
+                backoff = min(self._max_backoff, self._min_backoff * 2 ** self._failures)
+                return random.uniform(max(self._min_backoff, backoff / 2), backoff)
+            return min(self._max_idle_interval, self._interval * self._idle_growth ** self._idle_streak)
+
+    def wait(self) -> bool:
+        """等待到下一次上报的时间，调度器已停止时返回False"""
+        deadline = time.monotonic() + self.next_delay()
+        with self._cond:
+            while not self._stopped:
+                now = time.monotonic()
+                wake_at = deadline
+                # 后端失败期间只按退避时间重试，不因名单变化提前上报
+                if self._change_at is not None and not self._failures:
+                    wake_at = min(deadline, self._change_at + self._change_debounce)
+                if now >= wake_at:
+                    self._change_at = None
+                    return True
+                self._cond.wait(wake_at - now)
+            return False
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
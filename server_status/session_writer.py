@@ -0,0 +1,319 @@
+import time
+from datetime import datetime, timedelta
+from threading import Condition, Thread
+
+# MySQL的表不存在错误(ER_NO_SUCH_TABLE)
+ER_NO_SUCH_TABLE = 1146
+
+
+class SessionWriter:
+    """玩家会话的批量异步写入器
+
+    加入/离开事件先进入内存队列，由后台线程在积累到flush_size条或等待flush_interval秒后
+    在一个事务中批量写入player_sessions和player_stats，不占用服务器线程。
+    写入失败后按flush_interval起步、最长max_retry_delay秒的指数间隔重试，数据库不可用时不会反复重连。
+    daily_rollup为True时，同时把结束的会话按自然日累加到player_daily_playtime。
+    """
+
+    def __init__(self, connect, server_id, server_name, logger,
+                 flush_size=50, flush_interval=5, max_pending=10000, perf=None, daily_rollup=True,
+                 max_retry_delay=60):
+        self._connect = connect
+        self._max_retry_delay = max_retry_delay
+        self._daily_rollup = daily_rollup
+        self._perf = perf
+        self._server_id = server_id
+        self._server_name = server_name
+        self._logger = logger
+        self._flush_size = max(1, int(flush_size))
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+        self._cond = Condition()
+        # 待写入的事件: (类型, 玩家名, 时间戳)，类型为join/leave/reset
+        self._events = []
+        self._running = False
+        self._thread = None
+        self._conn = None
+        self._failing = False
+        self.dropped = 0
+
+    def player_joined(self, player: str, timestamp: float = None):
+        self._enqueue("join", player, timestamp)
+
+    def player_left(self, player: str, timestamp: float = None):
+        self._enqueue("leave", player, timestamp)
+
+    def close_open_sessions(self, timestamp: float = None):
+        """结束本服务器在timestamp之前开始且未结束的会话，用于服务器启动时清理异常退出遗留的记录
+
+        无法得知这些会话的真实结束时间，因此按时长0结束，不计入玩家统计和每日时长。
+        """
+        self._enqueue("reset", None, timestamp)
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._events)
+
+    def _enqueue(self, kind, player, timestamp):
+        event = (kind, player, timestamp if timestamp is not None else time.time())
+        with self._cond:
+            if len(self._events) >= self._max_pending:
+                self._events.pop(0)
+                self.dropped += 1
+            self._events.append(event)
+            if len(self._events) >= self._flush_size:
+                self._cond.notify()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = Thread(target=self._run, name="ServerStatus-SessionWriter", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._close_connection()
+
+    def _run(self):
+        retry_delay = 0
+        while True:
+            with self._cond:
+                if retry_delay:
+                    # 上次写入失败，事件已放回队列，队列已满也要等到重试时间，只有停止才提前唤醒
+                    self._cond.wait_for(lambda: not self._running, timeout=retry_delay)
+                else:
+                    self._cond.wait_for(lambda: not self._running or len(self._events) >= self._flush_size,
+                                        timeout=self._flush_interval)
+                events, self._events = self._events, []
+                running = self._running
+            if events:
+                if self.flush(events):
+                    retry_delay = 0
+                else:
+                    retry_delay = min(self._max_retry_delay, max(self._flush_interval, retry_delay * 2))
+            if not running:
+                return
+
+    def _get_connection(self):
+        if self._conn is not None:
+            try:
+                if self._conn.is_connected():
+                    return self._conn
+            except Exception:
+                pass
+            self._close_connection()
+        self._conn = self._connect()
+        return self._conn
+
+    def _close_connection(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _requeue(self, events):
+        with self._cond:
+            self._events[:0] = events
+            overflow = len(self._events) - self._max_pending
+            if overflow > 0:
+                del self._events[:overflow]
+                self.dropped += overflow
+
+    def flush(self, events) -> bool:
+        """在一个事务中写入一批事件，失败时放回队列等待下次重试"""
+        started = time.perf_counter()
+        error = self._write(events)
+        if self._perf is not None:
+            self._perf.record("mysql_flush", time.perf_counter() - started, error)
+        return error is None
+
+    def _write(self, events):
+        """写入一批事件，成功时返回None，失败时返回错误"""
+        conn = self._get_connection()
+        if conn is None:
+            self._requeue(events)
+            return "无法连接数据库"
+        cursor = None
+        try:
+            conn.start_transaction()
+            cursor = conn.cursor()
+            for phase in split_phases(events):
+                self._write_phase(cursor, phase)
+            conn.commit()
+            if self._failing:
+                self._failing = False
+                self._logger.info("玩家会话记录已恢复写入")
+            return None
+        except Exception as e:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            self._close_connection()
+            self._requeue(events)
+            if not self._failing:
+                self._failing = True
+                self._logger.error(f"写入玩家会话记录时出错，将稍后重试: {e}")
+            return e
+        finally:
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+
+    def _write_phase(self, cursor, phase):
+        joins = [(player, ts) for kind, player, ts in phase if kind == "join"]
+        leaves = [(player, ts) for kind, player, ts in phase if kind == "leave"]
+        resets = [ts for kind, _, ts in phase if kind == "reset"]
+        if resets:
+            # 遗留会话的结束时间未知，以加入时间结束，避免把宕机期间算作游戏时长
+            cursor.execute('''
+                UPDATE player_sessions
+                SET leave_time = join_time, logout_date = login_date, play_duration = 0
+                WHERE server_id = %s AND leave_time IS NULL AND join_time <= %s
+            ''', (self._server_id, resets[-1]))
+        if joins:
+            self._insert_sessions(cursor, joins)
+        if leaves:
+            self._close_sessions(cursor, leaves)
+
+    def _insert_sessions(self, cursor, joins):
+        rows = ", ".join(["(%s, %s, %s, %s, %s)"] * len(joins))
+        params = []
+        for player, ts in joins:
+            params.extend((self._server_id, self._server_name, player, ts, datetime.fromtimestamp(ts)))
+        cursor.execute(f'''
+            INSERT INTO player_sessions (server_id, server_name, player_name, join_time, login_date)
+            VALUES {rows}
+        ''', params)
+
+    def _close_sessions(self, cursor, leaves):
+        # 一条UPDATE结束所有离开玩家的会话，MySQL按从左到右的顺序使用已更新的leave_time计算时长
+        leave_case = " ".join(["WHEN %s THEN %s"] * len(leaves))
+        placeholders = ", ".join(["%s"] * len(leaves))
+        params = []
+        for player, ts in leaves:
+            params.extend((player, ts))
+        for player, ts in leaves:
+            params.extend((player, datetime.fromtimestamp(ts)))
+        params.append(self._server_id)
+        params.extend(player for player, _ in leaves)
+        cursor.execute(f'''
+            UPDATE player_sessions
+            SET leave_time = CASE player_name {leave_case} END,
+                logout_date = CASE player_name {leave_case} END,
+                play_duration = leave_time - join_time
+            WHERE server_id = %s AND leave_time IS NULL AND player_name IN ({placeholders})
+        ''', params)
+
+        # 按刚结束的会话累加玩家统计
+        pairs = ", ".join(["(%s, %s)"] * len(leaves))
+        params = [self._server_name, self._server_id]
+        for player, ts in leaves:
+            params.extend((player, ts))
+        cursor.execute(f'''
+            INSERT INTO player_stats (server_id, server_name, player_name, total_play_time, total_sessions, last_play_time)
+            SELECT server_id, %s, player_name, SUM(play_duration), COUNT(*), MAX(logout_date)
+            FROM player_sessions
+            WHERE server_id = %s AND (player_name, leave_time) IN ({pairs})
+            GROUP BY server_id, player_name
+            ON DUPLICATE KEY UPDATE
+                server_name = VALUES(server_name),
+                total_play_time = total_play_time + VALUES(total_play_time),
+                total_sessions = total_sessions + VALUES(total_sessions),
+                last_play_time = VALUES(last_play_time)
+        ''', params)
+
+        if self._daily_rollup:
+            self._rollup_sessions(cursor, pairs, leaves)
+
+    def _rollup_sessions(self, cursor, pairs, leaves):
+        # 读取刚结束的会话及玩家统计的id，跨越午夜的会话按天拆分后累加到每日时长
+        params = [self._server_id]
+        for player, ts in leaves:
+            params.extend((player, ts))
+        cursor.execute(f'''
+            SELECT stats.id, sessions.join_time, sessions.leave_time
+            FROM player_sessions sessions
+            JOIN player_stats stats
+                ON stats.server_id = sessions.server_id AND stats.player_name = sessions.player_name
+            WHERE sessions.server_id = %s AND (sessions.player_name, sessions.leave_time) IN ({pairs})
+        ''', params)
+        totals = {}
+        for player_id, join_time, leave_time in cursor.fetchall():
+            for index, (day, seconds) in enumerate(split_by_day(join_time, leave_time)):
+                total = totals.setdefault((player_id, day), [0.0, 0])
+                total[0] += seconds
+                # 会话只计入开始的那一天
+                if index == 0:
+                    total[1] += 1
+        if not totals:
+            return
+        rows = ", ".join(["(%s, %s, %s, %s, %s)"] * len(totals))
+        params = []
+        for (player_id, day), (seconds, sessions) in totals.items():
+            params.extend((self._server_id, player_id, day, seconds, sessions))
+        try:
+            cursor.execute(f'''
+                INSERT INTO player_daily_playtime (server_id, player_id, day, seconds, sessions)
+                VALUES {rows}
+                ON DUPLICATE KEY UPDATE
+                    seconds = seconds + VALUES(seconds),
+                    sessions = sessions + VALUES(sessions)
+            ''', params)
+        except Exception as e:
+            if getattr(e, "errno", None) != ER_NO_SUCH_TABLE:
+                raise
+            # 后端还没有升级、没有创建每日时长表，语句失败不影响事务中已写入的会话，关闭汇总以免每批都失败
+            self._daily_rollup = False
+            self._logger.warning("数据库中没有player_daily_playtime表，已停用每日游戏时长汇总，请升级后端后重新加载插件")
+
+
+def split_by_day(start, end):
+    """把[start, end)按本地时间的自然日切分，返回[(日期, 秒数), ...]，时长为0的会话记在开始的那一天"""
+    if end <= start:
+        return [(datetime.fromtimestamp(start).date(), 0.0)]
+    segments = []
+    current = start
+    while current < end:
+        day = datetime.fromtimestamp(current).date()
+        next_midnight = datetime.combine(day + timedelta(days=1), datetime.min.time()).timestamp()
+        segment_end = min(end, next_midnight)
+        segments.append((day, segment_end - current))
+        current = segment_end
+    return segments
+
+
+def split_phases(events):
+    """把事件按顺序切分成若干阶段，每个阶段内同一玩家最多出现一次
+
+    同一阶段内的加入和离开可以分别合并成一条语句，而不会打乱同一玩家事件的先后顺序。
+    reset事件单独成为一个阶段。
+    """
+    phases = []
+    current = []
+    seen = set()
+    for event in events:
+        kind, player, _ = event
+        if kind == "reset" or player in seen:
+            if current:
+                phases.append(current)
+            current = []
+            seen = set()
+        if kind == "reset":
+            phases.append([event])
+            continue
+        current.append(event)
+        seen.add(player)
+    if current:
+        phases.append(current)
+    return phases
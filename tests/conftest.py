@@ -0,0 +1,8 @@
+import os
+import sys
+
+# 后端以web_server为工作目录运行，模块之间按顶层模块导入
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "web_server")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,102 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from analytics import concurrency_curve, concurrency_report, hour_of_week_heatmap, load_sessions
+
+# 2024-01-01 00:00 UTC是周一
+MONDAY = 1704067200
+HOUR = 3600
+
+
+def curve(joins, leaves):
+    times, counts = concurrency_curve(np.array(joins, dtype=float), np.array(leaves, dtype=float))
+    return times.tolist(), counts.tolist()
+
+
+def test_concurrency_curve_steps():
+    assert curve([0, 10, 20], [30, 15, 40]) == ([0, 10, 15, 20, 30, 40], [1, 2, 1, 2, 1, 0])
+
+
+def test_leave_before_join_at_same_time():
+    # 一个玩家离开的同时另一个加入，人数不应出现2的虚假峰值
+    assert curve([0, 10], [10, 20]) == ([0, 10, 20], [1, 1, 0])
+
+
+def test_empty_curve():
+    assert curve([], []) == ([], [])
+
+
+def test_concurrency_report_buckets():
+    joins = np.array([0.0, 30.0])
+    leaves = np.array([60.0, 90.0])
+    report = concurrency_report(joins, leaves, 0, 120, 60)
+    assert report["points"] == [
+        {"ts": 0.0, "avg": 1.5, "max": 2},
+        {"ts": 60.0, "avg": 0.5, "max": 1}
+    ]
+    assert report["peak"] == {"count": 2, "ts": 30.0}
+    assert report["sessions"] == 2
+
+
+def test_concurrency_report_partial_last_bucket():
+    report = concurrency_report(np.array([0.0]), np.array([100.0]), 0, 100, 60)
+    assert [point["ts"] for point in report["points"]] == [0.0, 60.0]
+    assert [point["avg"] for point in report["points"]] == [1.0, 1.0]
+
+
+def test_concurrency_report_without_sessions():
+    report = concurrency_report(np.empty(0), np.empty(0), 0, 120, 60)
+    assert report["peak"] == {"count": 0, "ts": None}
+    assert [point["max"] for point in report["points"]] == [0, 0]
+
+
+def test_heatmap_slots_monday_first():
+    # 周一01:00-02:30有一名玩家，02:00-03:00另一名
+    joins = np.array([MONDAY + HOUR, MONDAY + 2 * HOUR])
+    leaves = np.array([MONDAY + 2.5 * HOUR, MONDAY + 3 * HOUR])
+    average, peak = hour_of_week_heatmap(joins, leaves, MONDAY, MONDAY + 7 * 24 * HOUR, 0)
+    assert average.shape == peak.shape == (7, 24)
+    assert average[0, 1] == pytest.approx(1.0)
+    assert average[0, 2] == pytest.approx(1.5)
+    assert peak[0, :4].tolist() == [0, 1, 2, 0]
+    assert average.sum() == pytest.approx(2.5)
+
+
+def test_heatmap_averages_over_weeks():
+    # 两周里只有第一周的周三10点有人，平均为0.5
+    wednesday = MONDAY + 2 * 24 * HOUR + 10 * HOUR
+    average, peak = hour_of_week_heatmap(
+        np.array([wednesday]), np.array([wednesday + HOUR]), MONDAY, MONDAY + 14 * 24 * HOUR, 0
+    )
+    assert average[2, 10] == pytest.approx(0.5)
+    assert peak[2, 10] == 1
+
+
+def test_heatmap_uses_local_offset():
+    # UTC+8的周一00:00是UTC周日16:00
+    start = MONDAY - 8 * HOUR
+    average, _ = hour_of_week_heatmap(
+        np.array([start]), np.array([start + HOUR]), start, start + 7 * 24 * HOUR, 8 * HOUR
+    )
+    assert average[0, 0] == pytest.approx(1.0)
+    assert average.sum() == pytest.approx(1.0)
+
+
+class SessionCursor:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def execute(self, sql, params):
+        self.params = params
+
+    def fetchmany(self, size):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+
+def test_load_sessions_clips_to_range():
+    cursor = SessionCursor([(0, 50), (90, 200), (120, 120), (100, 100)])
+    joins, leaves = load_sessions(cursor, "survival", 40, 150, chunk_size=2)
+    assert joins.tolist() == [40.0, 90.0]
+    assert leaves.tolist() == [50.0, 150.0]
@@ -0,0 +1,159 @@
+import threading
+
+import mysql.connector
+import pytest
+
+import db_pool
+from db_pool import MySQLConnectionPool, PoolExhaustedError
+
+
+class FakeRawConnection:
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+        self.unread_result = False
+        self.in_transaction = False
+        self.rollbacks = 0
+        self.healthy = True
+
+    def ping(self, reconnect=False):
+        if not self.healthy:
+            raise mysql.connector.errors.InterfaceError("MySQL server has gone away")
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    created = []
+
+    def connect(**config):
+        raw = FakeRawConnection(len(created))
+        created.append(raw)
+        return raw
+
+    monkeypatch.setattr(db_pool.mysql.connector, "connect", connect)
+    return created
+
+
+def make_pool(**kwargs):
+    kwargs.setdefault("wait_timeout", 0.05)
+    return MySQLConnectionPool({"host": "localhost", "database": "test"}, **kwargs)
+
+
+def test_checkout_limited_to_pool_size(connections):
+    pool = make_pool(size=2)
+    first = pool.acquire()
+    second = pool.acquire()
+    with pytest.raises(PoolExhaustedError):
+        pool.acquire()
+    stats = pool.stats()
+    assert stats["timeouts"] == 1
+    assert stats["in_use"] == 2
+    assert len(connections) == 2
+    first.close()
+    second.close()
+
+
+def test_waiting_checkout_gets_released_connection(connections):
+    pool = make_pool(size=1, wait_timeout=5)
+    conn = pool.acquire()
+    timer = threading.Timer(0.05, conn.close)
+    timer.start()
+    with pool.acquire() as again:
+        assert again.number == 0
+    timer.join()
+    assert pool.stats()["waits"] == 1
+
+
+def test_close_returns_connection_for_reuse(connections):
+    pool = make_pool(size=2)
+    conn = pool.acquire()
+    conn.close()
+    conn.close()
+    assert pool.stats()["idle"] == 1
+    with pool.acquire() as again:
+        assert again.number == 0
+    assert len(connections) == 1
+    assert not connections[0].closed
+
+
+def test_discard_drops_connection(connections):
+    pool = make_pool(size=1)
+    conn = pool.acquire()
+    conn.discard()
+    conn.close()
+    assert connections[0].closed
+    assert pool.stats()["open"] == 0
+    with pool.acquire() as again:
+        assert again.number == 1
+
+
+def test_unread_result_connection_is_not_reused(connections):
+    pool = make_pool(size=1)
+    conn = pool.acquire()
+    connections[0].unread_result = True
+    conn.close()
+    assert connections[0].closed
+    assert pool.stats()["idle"] == 0
+
+
+def test_open_transaction_is_rolled_back(connections):
+    pool = make_pool(size=1)
+    conn = pool.acquire()
+    connections[0].in_transaction = True
+    conn.close()
+    assert connections[0].rollbacks == 1
+    assert not connections[0].closed
+    assert pool.stats()["idle"] == 1
+
+
+def test_broken_idle_connection_replaced(connections):
+    pool = make_pool(size=1, health_check_after=0)
+    pool.acquire().close()
+    connections[0].healthy = False
+    with pool.acquire() as conn:
+        assert conn.number == 1
+    assert connections[0].closed
+    stats = pool.stats()
+    assert stats["health_check_failures"] == 1
+    assert stats["open"] == 1
+
+
+def test_expired_connection_replaced(connections):
+    pool = make_pool(size=1, max_lifetime=0)
+    pool.acquire().close()
+    assert connections[0].closed
+    with pool.acquire() as conn:
+        assert conn.number == 1
+
+
+def test_failed_connect_releases_slot(connections, monkeypatch):
+    pool = make_pool(size=1)
+
+    def refuse(**config):
+        raise mysql.connector.errors.InterfaceError("Can't connect to MySQL server")
+
+    monkeypatch.setattr(db_pool.mysql.connector, "connect", refuse)
+    with pytest.raises(mysql.connector.errors.InterfaceError):
+        pool.acquire()
+    assert pool.stats()["open"] == 0
+    assert pool.stats()["in_use"] == 0
+
+
+def test_close_all_keeps_checked_out_connections(connections):
+    pool = make_pool(size=2)
+    idle = pool.acquire()
+    in_use = pool.acquire()
+    idle.close()
+    pool.close_all()
+    assert connections[0].closed
+    in_use.close()
+    stats = pool.stats()
+    assert stats["open"] == 1
+    assert stats["idle"] == 1
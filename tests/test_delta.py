@@ -0,0 +1,108 @@
+import pytest
+
+from server_status.delta import DeltaEncoder
+from status_delta import SequenceGapError, apply_status_delta
+
+
+def status(players=(), **fields):
+    data = {"server_id": "survival", "players": list(players), "bots": [], "player_count": len(players)}
+    data.update(fields)
+    return data
+
+
+def test_first_report_is_keyframe():
+    encoder = DeltaEncoder()
+    payload = encoder.encode(status(["Alex"]))
+    assert payload["type"] == "full"
+    assert payload["seq"] == 1
+    assert payload["players"] == ["Alex"]
+
+
+def test_delta_until_acked_keyframe():
+    encoder = DeltaEncoder()
+    first = encoder.encode(status(["Alex"]))
+    # 关键帧没有被确认之前不能发送增量
+    assert encoder.encode(status(["Alex"]))["type"] == "full"
+    encoder.ack(first, status(["Alex"]))
+    payload = encoder.encode(status(["Alex", "Steve"], memory_usage=512))
+    assert payload["type"] == "delta"
+    assert payload["base_seq"] == first["seq"]
+    assert payload["players_added"] == ["Steve"]
+    assert "players_removed" not in payload
+    assert payload["changed"] == {"player_count": 2, "memory_usage": 512}
+
+
+def test_keyframe_interval_and_request():
+    encoder = DeltaEncoder(keyframe_interval=2)
+    current = status(["Alex"])
+    encoder.ack(encoder.encode(current), current)
+    types = []
+    for _ in range(3):
+        payload = encoder.encode(current)
+        encoder.ack(payload, current)
+        types.append(payload["type"])
+    assert types == ["delta", "delta", "full"]
+
+    encoder.request_keyframe()
+    assert encoder.encode(current)["type"] == "full"
+
+
+def test_stale_ack_is_ignored():
+    encoder = DeltaEncoder()
+    old = encoder.encode(status(["Alex"]))
+    new = encoder.encode(status(["Steve"]))
+    encoder.ack(new, status(["Steve"]))
+    encoder.ack(old, status(["Alex"]))
+    payload = encoder.encode(status(["Steve"]))
+    assert payload["base_seq"] == new["seq"]
+    assert "players_added" not in payload
+
+
+def test_round_trip_through_backend():
+    encoder = DeltaEncoder()
+    reports = [
+        status(["Alex", "Steve"], memory_usage=100),
+        status(["Steve", "Herobrine"], memory_usage=120),
+        status([], memory_usage=90, uptime=60)
+    ]
+    stored = None
+    for report in reports:
+        payload = encoder.encode(report)
+        if payload["type"] == "full":
+            stored = dict(payload)
+        else:
+            stored = apply_status_delta(stored, payload)
+        encoder.ack(payload, report)
+        assert stored["players"] == report["players"]
+        assert stored["memory_usage"] == report["memory_usage"]
+        assert stored["seq"] == payload["seq"]
+
+
+def test_gap_raises_sequence_gap_error():
+    delta = {"type": "delta", "seq": 5, "base_seq": 4, "server_id": "survival", "changed": {}}
+    with pytest.raises(SequenceGapError):
+        apply_status_delta(None, delta)
+    with pytest.raises(SequenceGapError):
+        apply_status_delta(status(seq=3), delta)
+    with pytest.raises(SequenceGapError):
+        apply_status_delta(status(), delta)
+    assert apply_status_delta(status(seq=4), delta)["seq"] == 5
+
+
+def test_resync_after_gap():
+    # 后端返回409后插件请求关键帧，之后的增量以关键帧为基准
+    encoder = DeltaEncoder()
+    current = status(["Alex"])
+    encoder.ack(encoder.encode(current), current)
+    lost = encoder.encode(status(["Alex", "Steve"]))
+    stored = {"server_id": "survival", "seq": lost["base_seq"] - 1}
+    with pytest.raises(SequenceGapError):
+        apply_status_delta(stored, lost)
+
+    encoder.request_keyframe()
+    keyframe = encoder.encode(status(["Alex", "Steve"]))
+    assert keyframe["type"] == "full"
+    encoder.ack(keyframe, status(["Alex", "Steve"]))
+    delta = encoder.encode(status(["Steve"]))
+    result = apply_status_delta(dict(keyframe), delta)
+    assert result["players"] == ["Steve"]
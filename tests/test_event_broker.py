@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+
+from event_broker import EventBroker, TooManyClientsError
+
+
+def snapshot():
+    return {"servers": []}
+
+
+def test_client_limit_is_reserved_on_stream():
+    broker = EventBroker(max_clients=2)
+    first = broker.stream(None, snapshot)
+    broker.stream(None, snapshot)
+    # 名额在返回事件流时就已占用，不需要等到开始迭代
+    with pytest.raises(TooManyClientsError):
+        broker.stream(None, snapshot)
+    first.close()
+    assert broker.clients == 1
+    broker.stream(None, snapshot)
+
+
+def test_close_releases_once():
+    broker = EventBroker()
+    stream = broker.stream(None, snapshot)
+    stream.close()
+    stream.close()
+    assert broker.clients == 0
+
+
+def test_iteration_end_releases_slot():
+    broker = EventBroker(heartbeat=0.01)
+    stream = broker.stream(None, snapshot)
+    events = iter(stream)
+    assert next(events) == "retry: 3000\n\n"
+    assert "event: snapshot" in next(events)
+    events.close()
+    assert broker.clients == 0
+    stream.close()
+    assert broker.clients == 0
+
+
+def test_concurrent_connects_respect_limit():
+    broker = EventBroker(max_clients=5)
+    barrier = threading.Barrier(20)
+    accepted = []
+
+    def connect():
+        barrier.wait()
+        try:
+            accepted.append(broker.stream(None, snapshot))
+        except TooManyClientsError:
+            pass
+
+    threads = [threading.Thread(target=connect) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(accepted) == 5
+    assert broker.clients == 5
+
+
+def test_resume_sends_missed_events():
+    broker = EventBroker(heartbeat=0.01)
+    events = iter(broker.stream(None, snapshot))
+    next(events)
+    snapshot_text = next(events)
+    last_id = snapshot_text.split("\n")[0][len("id: "):]
+    broker.publish("status", {"server_id": "survival"})
+    broker.publish("roster", {"joined": ["Alex"]})
+
+    resumed = iter(broker.stream(last_id, snapshot))
+    next(resumed)
+    missed = next(resumed) + next(resumed)
+    assert "event: status" in missed
+    assert "event: roster" in missed
+    assert "snapshot" not in missed
+
+
+def test_unknown_event_id_gets_snapshot():
+    broker = EventBroker(history=2, heartbeat=0.01)
+    for i in range(5):
+        broker.publish("status", {"i": i})
+    for last_id in ("other-1", f"{broker._event_id(1)}"):
+        events = iter(broker.stream(last_id, snapshot))
+        next(events)
+        assert "event: snapshot" in next(events)
+
+
+def test_heartbeat_when_idle():
+    broker = EventBroker(heartbeat=0.01)
+    events = iter(broker.stream(None, snapshot))
+    next(events)
+    next(events)
+    assert next(events) == ": heartbeat\n\n"
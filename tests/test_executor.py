@@ -0,0 +1,111 @@
+import threading
+
+from server_status.executor import CommandExecutor
+
+
+class Results:
+    def __init__(self, expected):
+        self.items = []
+        self._lock = threading.Lock()
+        self._remaining = expected
+        self.done = threading.Event()
+
+    def __call__(self, result, error):
+        with self._lock:
+            self.items.append((result, error))
+            self._remaining -= 1
+            if self._remaining <= 0:
+                self.done.set()
+
+
+def test_same_key_runs_once_and_shares_result():
+    executor = CommandExecutor(workers=2, queue_size=4)
+    release = threading.Event()
+    calls = []
+
+    def task():
+        calls.append(1)
+        release.wait(5)
+        return "Alex, Steve"
+
+    results = Results(3)
+    executor.start()
+    try:
+        assert executor.submit("players", task, results)
+        assert executor.submit("players", task, results)
+        assert executor.submit("players", task, results)
+        release.set()
+        assert results.done.wait(5)
+    finally:
+        executor.stop()
+    assert calls == [1]
+    assert results.items == [("Alex, Steve", None)] * 3
+    assert executor.coalesced == 2
+
+
+def test_key_can_run_again_after_completion():
+    executor = CommandExecutor(workers=1)
+    executor.start()
+    try:
+        for expected in (1, 2):
+            results = Results(1)
+            assert executor.submit("status", lambda: expected, results)
+            assert results.done.wait(5)
+            assert results.items == [(expected, None)]
+    finally:
+        executor.stop()
+
+
+def test_error_passed_to_callback():
+    executor = CommandExecutor(workers=1)
+    results = Results(1)
+    error = RuntimeError("后端不可达")
+
+    def task():
+        raise error
+
+    executor.start()
+    try:
+        executor.submit(None, task, results)
+        assert results.done.wait(5)
+    finally:
+        executor.stop()
+    assert results.items == [(None, error)]
+
+
+def test_full_queue_rejects_without_registering_key():
+    # 不启动工作线程，任务一直留在队列中
+    executor = CommandExecutor(workers=1, queue_size=1)
+    assert executor.submit("status", lambda: None, Results(1))
+    assert not executor.submit("players", lambda: None, Results(1))
+    assert not executor.submit(None, lambda: None, Results(1))
+    assert executor.rejected == 2
+    assert executor.queue_depth() == 1
+    # 被拒绝的key没有登记，之后仍可正常提交而不是合并到不存在的任务上
+    executor.start()
+    results = Results(1)
+    try:
+        for _ in range(100):
+            if executor.submit("players", lambda: "ok", results):
+                break
+            threading.Event().wait(0.01)
+        assert results.done.wait(5)
+    finally:
+        executor.stop()
+    assert results.items == [("ok", None)]
+    assert executor.coalesced == 0
+
+
+def test_stop_ends_all_workers_after_queued_tasks():
+    executor = CommandExecutor(workers=3, queue_size=8)
+    results = Results(4)
+    executor.start()
+    threads = list(executor._threads)
+    for index in range(4):
+        executor.submit(None, lambda index=index: index, results)
+    executor.stop()
+    for thread in threads:
+        thread.join(5)
+        assert not thread.is_alive()
+    assert results.done.is_set()
+    assert sorted(result for result, _ in results.items) == [0, 1, 2, 3]
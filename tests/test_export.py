@@ -0,0 +1,91 @@
+from datetime import datetime
+
+from export import ExportStream, encode_rows, sessions_export_query, stats_export_query
+
+COLUMNS = ("id", "player_name", "login_date")
+ROWS = [(1, "Alex", datetime(2024, 5, 1, 8)), (2, "Steve, Jr.", None)]
+
+
+def test_encode_ndjson():
+    assert encode_rows(ROWS, COLUMNS, "ndjson") == (
+        '{"id":1,"player_name":"Alex","login_date":"2024-05-01T08:00:00"}\n'
+        '{"id":2,"player_name":"Steve, Jr.","login_date":null}\n'
+    )
+
+
+def test_encode_csv_quotes_values():
+    assert encode_rows(ROWS, COLUMNS, "csv") == '1,Alex,2024-05-01T08:00:00\n2,"Steve, Jr.",\n'
+
+
+def test_queries():
+    sql, params = sessions_export_query("survival", None, 10, 20)
+    assert "server_id = %s AND join_time >= %s AND join_time < %s" in sql
+    assert params == ["survival", 10, 20]
+    sql, params = stats_export_query()
+    assert "WHERE" not in sql and params == []
+
+
+class FakeCursor:
+    def __init__(self, conn, rows=()):
+        self._conn = conn
+        self._rows = list(rows)
+
+    def execute(self, sql, params=()):
+        if self._conn.unread:
+            raise RuntimeError("Unread result found")
+        self._conn.statements.append((sql, params))
+
+    def fetchmany(self, size):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        self._conn.unread = bool(self._rows)
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.statements = []
+        self.unread = True
+        self.state = "open"
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.state = "returned"
+
+    def discard(self):
+        self.state = "discarded"
+
+
+def make_stream(rows, fmt="ndjson"):
+    conn = FakeConnection()
+    released = []
+    stream = ExportStream(
+        conn, FakeCursor(conn, rows), COLUMNS, fmt,
+        release=lambda: released.append(1), chunk_size=1,
+        restore=("SET SESSION net_write_timeout = %s", (60,))
+    )
+    return conn, released, stream
+
+
+def test_finished_export_restores_session_before_returning():
+    conn, released, stream = make_stream(ROWS, "csv")
+    assert "".join(stream).splitlines()[0] == "id,player_name,login_date"
+    assert stream.rows == 2
+    assert conn.statements == [("SET SESSION net_write_timeout = %s", (60,))]
+    assert conn.state == "returned"
+    assert released == [1]
+
+
+def test_interrupted_export_discards_connection():
+    # 客户端中途断开时结果集没有读完，无法恢复会话变量，连接不能放回连接池
+    conn, released, stream = make_stream(ROWS)
+    next(iter(stream))
+    stream.close()
+    stream.close()
+    assert conn.statements == []
+    assert conn.state == "discarded"
+    assert released == [1]
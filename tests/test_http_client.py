@@ -0,0 +1,118 @@
+import gzip
+import json
+
+import pytest
+
+from server_status.http_client import JSON_CONTENT_TYPE, MSGPACK_CONTENT_TYPE, ReporterHttpClient
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+BACKEND_HEADERS = {
+    "Accept-Encoding": "gzip",
+    "Accept-Post": "application/json, application/msgpack",
+    "X-Status-Delta": "1"
+}
+
+
+class RecordingClient(ReporterHttpClient):
+    """不发出真实请求，按顺序返回预设的响应"""
+
+    def __init__(self, responses, **kwargs):
+        super().__init__(**kwargs)
+        self.responses = list(responses)
+        self.requests = []
+
+    def post(self, url, **kwargs):
+        self.requests.append(kwargs)
+        return self.responses.pop(0)
+
+
+def test_capabilities_unknown_until_learned():
+    client = RecordingClient([FakeResponse(headers=BACKEND_HEADERS)], compress_threshold=10)
+    assert not client.supports_delta
+    client.post_json("http://backend", {"players": ["Alex"] * 10})
+    first = client.requests[0]
+    # 第一次请求时还不知道后端的能力，按普通JSON发送
+    assert first["headers"] == {"Content-Type": JSON_CONTENT_TYPE}
+    assert json.loads(first["data"]) == {"players": ["Alex"] * 10}
+    assert client.supports_delta
+
+
+def test_learned_gzip_above_threshold():
+    client = RecordingClient([FakeResponse(headers=BACKEND_HEADERS)] * 3, compress_threshold=50)
+    client.post_json("http://backend", {})
+    client.post_json("http://backend", {"players": ["Alex"] * 20})
+    client.post_json("http://backend", {"a": 1})
+    large, small = client.requests[1], client.requests[2]
+    assert large["headers"]["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(large["data"])) == {"players": ["Alex"] * 20}
+    assert "Content-Encoding" not in small["headers"]
+
+
+def test_msgpack_only_when_configured_and_advertised():
+    msgpack = pytest.importorskip("msgpack")
+    client = RecordingClient([FakeResponse(headers=BACKEND_HEADERS)] * 2, payload_encoding="msgpack")
+    client.post_json("http://backend", {})
+    client.post_json("http://backend", {"a": 1})
+    assert client.requests[1]["headers"]["Content-Type"] == MSGPACK_CONTENT_TYPE
+    assert msgpack.unpackb(client.requests[1]["data"]) == {"a": 1}
+
+    json_client = RecordingClient([FakeResponse(headers=BACKEND_HEADERS)] * 2)
+    json_client.post_json("http://backend", {})
+    json_client.post_json("http://backend", {"a": 1})
+    assert json_client.requests[1]["headers"]["Content-Type"] == JSON_CONTENT_TYPE
+
+
+def test_backend_without_capability_headers():
+    old_backend = {"Accept-Encoding": "identity", "Accept-Post": "application/json"}
+    client = RecordingClient([FakeResponse(headers=BACKEND_HEADERS), FakeResponse(headers=old_backend)])
+    client.post_json("http://backend", {})
+    assert client.supports_delta
+    # 降级后的后端不再声明增量上报和gzip
+    client.post_json("http://backend", {})
+    assert not client.supports_delta
+    assert not client._backend_gzip
+
+
+def test_responses_from_proxies_do_not_change_capabilities():
+    client = RecordingClient([FakeResponse(headers=BACKEND_HEADERS), FakeResponse(502)])
+    client.post_json("http://backend", {})
+    client.post_json("http://backend", {})
+    assert client.supports_delta
+
+
+def test_unsupported_media_type_falls_back_to_json():
+    client = RecordingClient([
+        FakeResponse(headers=BACKEND_HEADERS),
+        FakeResponse(415, {"Accept-Post": "application/json"}),
+        FakeResponse(200)
+    ], compress_threshold=1)
+    client.post_json("http://backend", {})
+    response = client.post_json("http://backend", {"a": 1})
+    assert response.status_code == 200
+    retried = client.requests[2]
+    assert retried["headers"] == {"Content-Type": JSON_CONTENT_TYPE}
+    assert json.loads(retried["data"]) == {"a": 1}
+    assert not client._backend_gzip
+
+
+def test_plain_json_415_is_not_resent():
+    client = RecordingClient([FakeResponse(415)])
+    assert client.post_json("http://backend", {}).status_code == 415
+    assert len(client.requests) == 1
+
+
+def test_status_retries_do_not_apply_to_posts():
+    pytest.importorskip("requests")
+    client = ReporterHttpClient(max_retries=3)
+    retry = client._create_session().get_adapter("http://backend").max_retries
+    # 连接失败时请求还没有发出，可以重试；POST收到5xx交给调度器退避
+    assert retry.connect == 3
+    assert retry.read == 0
+    assert "POST" not in retry.allowed_methods
+    assert not retry.respect_retry_after_header
@@ -0,0 +1,123 @@
+import pytest
+
+from ingest_queue import IngestQueue, IngestQueueFullError
+from status_delta import SequenceGapError
+
+
+def make_queue(stored=None, max_pending=1000):
+    stored = stored or {}
+    return IngestQueue(lambda entries: None, stored.get, max_pending=max_pending)
+
+
+def full(timestamp, seq=None, **fields):
+    data = {"server_id": "survival", "timestamp": timestamp}
+    if seq is not None:
+        data.update({"type": "full", "seq": seq})
+    data.update(fields)
+    return data
+
+
+def delta(seq, base_seq, **changed):
+    return {"type": "delta", "server_id": "survival", "seq": seq, "base_seq": base_seq, "changed": changed}
+
+
+def taken(queue):
+    return [data for _, data in sorted(queue._take(), key=lambda entry: entry[0])]
+
+
+def test_newer_snapshot_replaces_pending():
+    queue = make_queue()
+    queue.submit("survival", full(10))
+    queue.submit("survival", full(20))
+    assert taken(queue) == [full(20)]
+    assert queue.stats()["coalesced"] == 1
+
+
+def test_older_snapshot_is_queued_behind_newer():
+    # 积压重放的旧状态不能替换还未应用的实时状态，由应用时的时间比较拒绝并记录为历史
+    queue = make_queue()
+    queue.submit("survival", full(20))
+    queue.submit("survival", full(10))
+    assert taken(queue) == [full(20), full(10)]
+    assert queue.stats()["coalesced"] == 0
+
+
+def test_snapshot_without_timestamp_replaces_pending():
+    queue = make_queue()
+    queue.submit("survival", full(20))
+    queue.submit("survival", {"server_id": "survival"})
+    assert taken(queue) == [{"server_id": "survival"}]
+
+
+def test_snapshot_older_than_pending_delta_is_appended():
+    queue = make_queue()
+    queue.submit("survival", full(10, seq=1))
+    queue.submit("survival", delta(2, 1, timestamp=30))
+    queue.submit("survival", full(20))
+    assert taken(queue) == [full(10, seq=1), delta(2, 1, timestamp=30), full(20)]
+
+
+def test_servers_are_coalesced_separately():
+    queue = make_queue()
+    queue.submit("survival", full(10))
+    queue.submit("creative", full(5, server_id="creative"))
+    queue.submit("survival", full(20))
+    assert taken(queue) == [full(5, server_id="creative"), full(20)]
+
+
+def test_deltas_are_kept_in_order():
+    queue = make_queue()
+    queue.submit("survival", full(10, seq=1))
+    queue.submit("survival", delta(2, 1))
+    queue.submit("survival", delta(3, 2))
+    assert [data["seq"] for data in taken(queue)] == [1, 2, 3]
+
+
+def test_delta_checked_against_accepted_seq():
+    queue = make_queue(stored={"survival": 4})
+    with pytest.raises(SequenceGapError):
+        queue.submit("survival", delta(6, 5))
+    queue.submit("survival", delta(5, 4))
+    # 入队后以最近接受的序号为准，而不是存储中的序号
+    queue.submit("survival", delta(6, 5))
+    with pytest.raises(SequenceGapError):
+        queue.submit("survival", delta(7, 5))
+
+
+def test_delta_without_stored_status_is_rejected():
+    queue = make_queue()
+    with pytest.raises(SequenceGapError):
+        queue.submit("survival", delta(2, 1))
+
+
+def test_forget_seq_falls_back_to_store():
+    stored = {"survival": 1}
+    queue = make_queue(stored=stored)
+    queue.submit("survival", delta(2, 1))
+    stored["survival"] = 1
+    queue.forget_seq("survival")
+    queue.submit("survival", delta(3, 1))
+
+
+def test_full_queue_rejects_but_allows_replacement():
+    queue = make_queue(max_pending=2)
+    queue.submit("survival", full(10))
+    queue.submit("creative", full(10, server_id="creative"))
+    with pytest.raises(IngestQueueFullError):
+        queue.submit("lobby", full(10, server_id="lobby"))
+    # 替换已排队的状态不会增加队列长度
+    queue.submit("survival", full(20))
+    with pytest.raises(IngestQueueFullError):
+        queue.submit("survival", full(5))
+    stats = queue.stats()
+    assert stats["pending"] == 2
+    assert stats["rejected"] == 2
+
+
+def test_worker_applies_entries_on_stop():
+    applied = []
+    queue = IngestQueue(applied.extend, lambda server_id: None)
+    queue.start()
+    queue.submit("survival", full(10))
+    queue.stop()
+    assert [data for _, data in applied] == [full(10)]
@@ -0,0 +1,196 @@
+import pytest
+
+import metric_history
+from metric_history import InvalidHistoryQueryError, MetricHistory, bucket_start, choose_resolution
+
+NOW = 1_700_000_000
+HOUR = 3600
+DAY = 24 * HOUR
+
+
+def test_bucket_start():
+    assert bucket_start(1234.5, 0) == 1234.5
+    assert bucket_start(1234.5, 300) == 1200
+    assert bucket_start(7199, 3600) == 3600
+
+
+@pytest.mark.parametrize("start, step, expected", [
+    (NOW - HOUR, 10, 0),
+    (NOW - HOUR, 299, 0),
+    (NOW - HOUR, 300, 300),
+    (NOW - HOUR, 1800, 300),
+    (NOW - HOUR, 7200, 3600),
+    # 原始点只保留一天，更早的范围改用5分钟聚合
+    (NOW - 2 * DAY, 10, 300),
+    # 5分钟聚合只保留30天
+    (NOW - 60 * DAY, 10, 3600),
+    (NOW - 400 * DAY, 10, 3600)
+])
+def test_choose_resolution(start, step, expected):
+    assert choose_resolution(start, step, now=NOW) == expected
+
+
+def test_aggregate_into_every_tier():
+    history = MetricHistory(lambda: None)
+    points = [
+        ("survival", "player_count", 3600.0, 2.0),
+        ("survival", "player_count", 3700.0, 6.0),
+        ("survival", "player_count", 4000.0, 4.0)
+    ]
+    rows = history._aggregate(points)
+    assert rows[(0, "survival", "player_count", 3700.0)] == [1, 6.0, 6.0, 6.0]
+    assert rows[(300, "survival", "player_count", 3600)] == [2, 8.0, 2.0, 6.0]
+    assert rows[(300, "survival", "player_count", 3900)] == [1, 4.0, 4.0, 4.0]
+    assert rows[(3600, "survival", "player_count", 3600)] == [3, 12.0, 2.0, 6.0]
+    assert len(rows) == 3 + 2 + 1
+
+
+def test_record_skips_non_numeric_values():
+    history = MetricHistory(lambda: None)
+    history.record("survival", {"timestamp": 10, "player_count": 3, "memory_usage": "n/a", "uptime": True})
+    assert history._buffer == [("survival", "player_count", 10.0, 3.0)]
+
+
+def test_record_drops_oldest_over_limit():
+    history = MetricHistory(lambda: None, max_buffer=2)
+    for i in range(3):
+        history.record("survival", {"timestamp": i, "player_count": i})
+    assert [point[2] for point in history._buffer] == [1.0, 2.0]
+    assert history.dropped == 1
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self._conn = conn
+        self._rows = []
+
+    def execute(self, sql, params=()):
+        sql = " ".join(sql.split())
+        if sql.startswith("SELECT"):
+            self._conn.log.append("SELECT")
+            keys = [tuple(params[i:i + 3]) for i in range(0, len(params), 3)]
+            self._rows = [key for key in keys if key in self._conn.raw]
+            return
+        self._conn.log.append("INSERT")
+        if self._conn.log.count("INSERT") > self._conn.fail_after:
+            raise RuntimeError("connection lost")
+        for i in range(0, len(params), 8):
+            if params[i] == 0:
+                self._conn.pending_raw.append(tuple(params[i + 1:i + 4]))
+            else:
+                self._conn.buckets.append(tuple(params[i:i + 5]))
+
+    def fetchall(self):
+        return self._rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, fail_after=float("inf")):
+        self.fail_after = fail_after
+        self.log = []
+        # 已写入的原始点(server_id, 指标, 时间戳)和本次事务中写入的点
+        self.raw = set()
+        self.pending_raw = []
+        self.buckets = []
+
+    def start_transaction(self):
+        self.log.append("START")
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.log.append("COMMIT")
+        self.raw.update(self.pending_raw)
+        self.pending_raw = []
+
+    def rollback(self):
+        self.log.append("ROLLBACK")
+        self.pending_raw = []
+
+    def close(self):
+        pass
+
+
+def test_flush_writes_chunks_in_one_transaction(monkeypatch):
+    monkeypatch.setattr(metric_history, "INSERT_CHUNK_SIZE", 2)
+    conn = FakeConnection()
+    history = MetricHistory(lambda: conn)
+    history.record("survival", {"timestamp": 0, "player_count": 1})
+    assert history.flush()
+    # 1个原始点+2个聚合桶，每块2行
+    assert conn.log == ["START", "SELECT", "INSERT", "INSERT", "COMMIT"]
+    assert history.stats()["buffered"] == 0
+
+
+def test_failed_flush_rolls_back_and_requeues(monkeypatch):
+    monkeypatch.setattr(metric_history, "INSERT_CHUNK_SIZE", 2)
+    conn = FakeConnection(fail_after=1)
+    history = MetricHistory(lambda: conn)
+    history.record("survival", {"timestamp": 0, "player_count": 1})
+    assert not history.flush()
+    assert conn.log == ["START", "SELECT", "INSERT", "INSERT", "ROLLBACK"]
+    assert history.stats()["buffered"] == 1
+
+
+def test_duplicate_points_are_counted_once():
+    conn = FakeConnection()
+    history = MetricHistory(lambda: conn)
+    status = {"timestamp": 100, "player_count": 3}
+    # 同一批中的重复状态
+    history.record("survival", status)
+    history.record("survival", dict(status))
+    assert history.flush()
+    assert conn.raw == {("survival", "player_count", 100.0)}
+    assert [bucket[4] for bucket in conn.buckets] == [1, 1]
+
+    # 之后从积压队列重放的同一状态
+    conn.buckets.clear()
+    history.record("survival", status)
+    history.record("survival", {"timestamp": 130, "player_count": 5})
+    assert history.flush()
+    assert conn.raw == {("survival", "player_count", 100.0), ("survival", "player_count", 130.0)}
+    assert [bucket[3:5] for bucket in conn.buckets] == [(0, 1), (0, 1)]
+
+
+class QueryCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.params = None
+
+    def execute(self, sql, params):
+        self.params = params
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_query_rounds_step_to_resolution(monkeypatch):
+    monkeypatch.setattr(metric_history.time, "time", lambda: NOW)
+    cursor = QueryCursor([(NOW - HOUR, 4, 10.0, 1.0, 4.0)])
+    history = MetricHistory(lambda: None)
+    resolution, step, points = history.query(cursor, "survival", "player_count", NOW - 2 * DAY, NOW, 400)
+    assert resolution == 300
+    assert step == 600
+    assert cursor.params == (600, 600, 300, "survival", "player_count", NOW - 2 * DAY, NOW)
+    assert points == [{"ts": float(NOW - HOUR), "avg": 2.5, "min": 1.0, "max": 4.0, "count": 4}]
+
+
+def test_query_caps_number_of_points(monkeypatch):
+    monkeypatch.setattr(metric_history.time, "time", lambda: NOW)
+    history = MetricHistory(lambda: None)
+    _, step, _ = history.query(QueryCursor([]), "survival", "uptime", NOW - HOUR, NOW, 1, max_points=100)
+    assert step == HOUR / 100
+
+
+@pytest.mark.parametrize("metric, start, end, step", [
+    ("tps", 0, 10, 1),
+    ("uptime", 10, 10, 1),
+    ("uptime", 0, 10, 0)
+])
+def test_query_rejects_invalid_arguments(metric, start, end, step):
+    with pytest.raises(InvalidHistoryQueryError):
+        MetricHistory(lambda: None).query(QueryCursor([]), "survival", metric, start, end, step)
@@ -0,0 +1,65 @@
+import pytest
+
+from server_status import metrics
+from server_status.metrics import METRIC_COLUMNS, ProcessSampler, RingBuffer
+
+
+def test_ring_buffer_overwrites_oldest():
+    buffer = RingBuffer(3, ("tps",))
+    for timestamp in range(1, 6):
+        buffer.append(timestamp, (float(timestamp),))
+    assert len(buffer) == 3
+    assert buffer.latest() == {"tps": 5.0}
+    assert buffer.summary() == {"samples": 3, "tps": {"min": 3.0, "avg": 4.0, "max": 5.0}}
+
+
+def test_ring_buffer_missing_values():
+    buffer = RingBuffer(4, ("tps", "mspt"))
+    assert buffer.latest() is None
+    buffer.append(1, (20.0, None))
+    buffer.append(2, (18.0, None))
+    assert buffer.latest() == {"tps": 18.0, "mspt": None}
+    assert buffer.summary() == {"samples": 2, "tps": {"min": 18.0, "avg": 19.0, "max": 20.0}, "mspt": None}
+
+
+def test_summary_since():
+    buffer = RingBuffer(10, ("tps",))
+    for timestamp, tps in [(1, 20.0), (2, 10.0), (3, 15.0), (4, 17.0)]:
+        buffer.append(timestamp, (tps,))
+    assert buffer.summary(since=2) == {"samples": 2, "tps": {"min": 15.0, "avg": 16.0, "max": 17.0}}
+    assert buffer.summary(since=4) == {"samples": 0, "tps": None}
+
+
+def test_report_summary_covers_samples_since_last_report(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(metrics.time, "time", lambda: now[0])
+    sampler = ProcessSampler(lambda: None, capacity=10)
+
+    def sample(timestamp, tps):
+        values = [None] * len(METRIC_COLUMNS)
+        values[METRIC_COLUMNS.index("tps")] = tps
+        sampler.history.append(timestamp, values)
+
+    sample(90, 20.0)
+    sample(95, 18.0)
+    assert sampler.report_summary()["tps"] == {"min": 18.0, "avg": 19.0, "max": 20.0}
+
+    now[0] = 110.0
+    sample(105, 12.0)
+    summary = sampler.report_summary()
+    assert summary["samples"] == 1
+    assert summary["tps"] == {"min": 12.0, "avg": 12.0, "max": 12.0}
+    assert sampler.report_summary() == dict({"samples": 0}, **{name: None for name in METRIC_COLUMNS})
+
+
+@pytest.mark.parametrize("line, tps, mspt", [
+    ("§6TPS from last 1m, 5m, 15m: §a*20.0, §a19.8, §a19.9", 20.0, None),
+    ("Overall: Mean tick time: 12.345 ms. Mean TPS: 19.5", 19.5, 12.345),
+    ("Average time per tick: 3.2ms", None, 3.2),
+    ("<Alex> how is the TPS?", None, None)
+])
+def test_parse_console(line, tps, mspt):
+    sampler = ProcessSampler(lambda: None)
+    sampler.parse_console(line)
+    assert sampler._tps == tps
+    assert sampler._mspt == mspt
@@ -0,0 +1,188 @@
+import json
+
+from server_status.outbox import StatusOutbox
+
+
+def make_outbox(tmp_path, **kwargs):
+    return StatusOutbox(str(tmp_path / "outbox.jsonl"), **kwargs)
+
+
+def payloads(entries):
+    return [payload for _, payload in entries]
+
+
+def test_read_and_commit_in_batches(tmp_path):
+    outbox = make_outbox(tmp_path)
+    for i in range(5):
+        outbox.append({"seq": i})
+    assert outbox.has_pending()
+
+    first = outbox.read_batch(2)
+    assert payloads(first) == [{"seq": 0}, {"seq": 1}]
+    # 未提交时再次读取得到相同的记录
+    assert payloads(outbox.read_batch(2)) == [{"seq": 0}, {"seq": 1}]
+
+    outbox.commit(first[-1][0])
+    rest = outbox.read_batch(10)
+    assert payloads(rest) == [{"seq": 2}, {"seq": 3}, {"seq": 4}]
+    outbox.commit(rest[-1][0])
+    assert not outbox.has_pending()
+    assert outbox.pending_bytes() == 0
+
+
+def test_offset_survives_restart(tmp_path):
+    outbox = make_outbox(tmp_path)
+    for i in range(3):
+        outbox.append({"seq": i})
+    outbox.commit(outbox.read_batch(1)[-1][0])
+
+    reopened = make_outbox(tmp_path)
+    assert payloads(reopened.read_batch(10)) == [{"seq": 1}, {"seq": 2}]
+
+
+def test_commit_is_monotonic(tmp_path):
+    outbox = make_outbox(tmp_path)
+    for i in range(3):
+        outbox.append({"seq": i})
+    entries = outbox.read_batch(3)
+    outbox.commit(entries[1][0])
+    outbox.commit(entries[0][0])
+    assert payloads(outbox.read_batch(3)) == [{"seq": 2}]
+
+
+def test_expired_and_corrupt_records_are_skipped(tmp_path):
+    outbox = make_outbox(tmp_path, max_age=60)
+    path = tmp_path / "outbox.jsonl"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"queued_at": 0, "payload": {"seq": "old"}}) + "\n")
+        f.write("not json\n")
+    outbox.append({"seq": "new"})
+    assert payloads(outbox.read_batch(10)) == [{"seq": "new"}]
+
+
+def test_partial_line_is_not_read(tmp_path):
+    outbox = make_outbox(tmp_path)
+    outbox.append({"seq": 0})
+    with open(tmp_path / "outbox.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"queued_at": 1')
+    assert payloads(outbox.read_batch(10)) == [{"seq": 0}]
+
+
+def test_compaction_keeps_newest_records(tmp_path):
+    outbox = make_outbox(tmp_path, max_bytes=2000)
+    for i in range(100):
+        outbox.append({"seq": i, "padding": "x" * 20})
+    assert (tmp_path / "outbox.jsonl").stat().st_size <= 2000
+    kept = [payload["seq"] for payload in payloads(outbox.read_batch(1000))]
+    assert kept
+    assert kept[-1] == 99
+    assert kept == list(range(kept[0], 100))
+
+
+def test_compaction_invalidates_old_tokens(tmp_path):
+    outbox = make_outbox(tmp_path, max_bytes=2000)
+    for i in range(5):
+        outbox.append({"seq": i, "padding": "x" * 20})
+    stale = outbox.read_batch(2)
+    for i in range(5, 100):
+        outbox.append({"seq": i, "padding": "x" * 20})
+
+    # 压缩后的文件从头开始，旧令牌的偏移量已经失效，不能提交
+    before = payloads(outbox.read_batch(1000))
+    outbox.commit(stale[-1][0])
+    assert payloads(outbox.read_batch(1000)) == before
+
+
+def test_draining_everything_resets_the_file(tmp_path):
+    outbox = make_outbox(tmp_path)
+    outbox.append({"seq": 0})
+    entries = outbox.read_batch(10)
+    outbox.commit(entries[-1][0])
+    assert (tmp_path / "outbox.jsonl").stat().st_size == 0
+
+    # 清空后同样会换代，清空前读到的令牌失效
+    outbox.append({"seq": 1})
+    outbox.commit(entries[-1][0])
+    assert payloads(outbox.read_batch(10)) == [{"seq": 1}]
+
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self._body = body
+        self.headers = {}
+
+    def json(self):
+        if self._body is None:
+            raise ValueError("no json")
+        return self._body
+
+
+class FakeHttpClient:
+    supports_delta = False
+
+    def __init__(self, response):
+        self.response = response
+        self.sent = []
+
+    def post_json(self, url, payload, **kwargs):
+        self.sent.append((url, payload))
+        return self.response
+
+
+class FakeServer:
+    class logger:
+        @staticmethod
+        def warning(message):
+            pass
+
+
+def use_plugin(monkeypatch, tmp_path, response):
+    import server_status as plugin
+    outbox = make_outbox(tmp_path)
+    monkeypatch.setattr(plugin, "config", {"web_server_url": "http://backend/api/server_status", "delta_reports": False})
+    monkeypatch.setattr(plugin, "http_client", FakeHttpClient(response))
+    monkeypatch.setattr(plugin, "outbox", outbox)
+    monkeypatch.setattr(plugin, "outbox_batch_supported", True)
+    return plugin, outbox
+
+
+def test_report_spooled_when_body_reports_server_error(monkeypatch, tmp_path):
+    # 后端内部错误时以HTTP 200返回，结果码500在响应体中
+    plugin, outbox = use_plugin(monkeypatch, tmp_path, FakeResponse(200, {"code": 500, "message": "error"}))
+    plugin.send_status_report(FakeServer, {"server_id": "survival"})
+    assert payloads(outbox.read_batch(10)) == [{"server_id": "survival"}]
+
+
+def test_replay_batch_commits_confirmed_batch(monkeypatch, tmp_path):
+    body = {"code": 200, "data": {"applied": 2, "results": [{"code": 200}, {"code": 200}]}}
+    plugin, outbox = use_plugin(monkeypatch, tmp_path, FakeResponse(200, body))
+    outbox.append({"seq": 0})
+    outbox.append({"seq": 1})
+    assert plugin.replay_batch(outbox.read_batch(10)) == 2
+    assert not outbox.has_pending()
+
+
+def test_replay_batch_keeps_rejected_batch(monkeypatch, tmp_path):
+    responses = [
+        FakeResponse(413, {"code": 413, "message": "too many"}),
+        FakeResponse(415, None),
+        FakeResponse(200, {"code": 400, "message": "bad request"}),
+        FakeResponse(200, {"code": 500, "message": "error"}),
+        FakeResponse(200, {"code": 200, "data": {}}),
+        FakeResponse(503, None)
+    ]
+    for response in responses:
+        plugin, outbox = use_plugin(monkeypatch, tmp_path, response)
+        outbox.append({"seq": 0})
+        entries = outbox.read_batch(10)
+        assert plugin.replay_batch(entries) == 0
+        assert payloads(outbox.read_batch(10)) == payloads(entries)
+
+
+def test_replay_batch_falls_back_when_unsupported(monkeypatch, tmp_path):
+    plugin, outbox = use_plugin(monkeypatch, tmp_path, FakeResponse(404, None))
+    outbox.append({"seq": 0})
+    assert plugin.replay_batch(outbox.read_batch(10)) is None
+    assert plugin.outbox_batch_supported is False
+    assert outbox.has_pending()
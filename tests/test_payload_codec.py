@@ -0,0 +1,68 @@
+import gzip
+import json
+
+import pytest
+from flask import Flask, request
+
+import payload_codec
+from payload_codec import UnsupportedPayloadError, decode_batch_payload, decode_request_payload
+
+app = Flask(__name__)
+
+
+def decode(decoder, body, content_type='application/json', encoding=None):
+    headers = {'Content-Type': content_type}
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    with app.test_request_context('/', method='POST', data=body, headers=headers):
+        return decoder(request)
+
+
+def test_plain_json():
+    assert decode(decode_request_payload, b'{"server_id": "survival"}') == {"server_id": "survival"}
+    assert decode(decode_request_payload, b'not json') is None
+    assert decode(decode_request_payload, b'') is None
+
+
+def test_gzip_json():
+    body = gzip.compress(json.dumps({"players": ["Alex"]}).encode())
+    assert decode(decode_request_payload, body, encoding='gzip') == {"players": ["Alex"]}
+
+
+def test_truncated_gzip_is_rejected():
+    # 截断处恰好是合法的JSON时也不能当作完整的数据
+    body = gzip.compress(b'{"a": 1}' + b' ' * 100)
+    with pytest.raises(UnsupportedPayloadError):
+        decode(decode_request_payload, body[:-8], encoding='gzip')
+    with pytest.raises(UnsupportedPayloadError):
+        decode(decode_request_payload, body[:len(body) // 2], encoding='gzip')
+
+
+def test_corrupt_gzip_is_rejected():
+    with pytest.raises(UnsupportedPayloadError):
+        decode(decode_request_payload, b'\x1f\x8bnot gzip', encoding='gzip')
+
+
+def test_decompression_limit(monkeypatch):
+    monkeypatch.setattr(payload_codec, "MAX_DECOMPRESSED_SIZE", 1024)
+    body = gzip.compress(b'[' + b'0,' * 2000 + b'0]')
+    with pytest.raises(UnsupportedPayloadError):
+        decode(decode_request_payload, body, encoding='gzip')
+
+
+def test_unsupported_encoding():
+    with pytest.raises(UnsupportedPayloadError):
+        decode(decode_request_payload, b'{}', encoding='br')
+
+
+def test_msgpack():
+    msgpack = pytest.importorskip("msgpack")
+    body = msgpack.packb({"server_id": "survival", "players": []}, use_bin_type=True)
+    assert decode(decode_request_payload, body, 'application/msgpack') == {"server_id": "survival", "players": []}
+
+
+def test_batch_array_and_ndjson():
+    assert decode(decode_batch_payload, b'[{"a": 1}, {"a": 2}]') == [{"a": 1}, {"a": 2}]
+    assert decode(decode_batch_payload, b'{"a": 1}') is None
+    ndjson = b'{"a": 1}\n\nbroken\n{"a": 2}\n'
+    assert decode(decode_batch_payload, ndjson, 'application/x-ndjson') == [{"a": 1}, None, {"a": 2}]
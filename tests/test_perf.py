@@ -0,0 +1,80 @@
+import math
+import random
+
+import pytest
+
+from server_status.perf import BUCKET_BASE, BUCKET_GROWTH, LatencyHistogram, PerfRegistry
+
+
+def exact_percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[max(1, int(math.ceil(fraction * len(ordered)))) - 1]
+
+
+@pytest.mark.parametrize("fraction", [0.5, 0.95, 0.99])
+def test_percentile_within_bucket_error(fraction):
+    rng = random.Random(7)
+    samples = [rng.lognormvariate(math.log(0.02), 1.0) for _ in range(5000)]
+    histogram = LatencyHistogram()
+    for seconds in samples:
+        histogram.record(seconds)
+    exact = exact_percentile(samples, fraction)
+    estimate = histogram.percentile(fraction)
+    # 取所在桶的上限，只会高估，且不超过一个桶的比例
+    assert exact <= estimate <= exact * BUCKET_GROWTH
+
+
+def test_percentile_on_bucket_boundaries():
+    histogram = LatencyHistogram()
+    boundaries = [BUCKET_BASE * BUCKET_GROWTH ** index for index in range(1, 40)]
+    for seconds in boundaries:
+        histogram.record(seconds)
+    for fraction in (0.25, 0.5, 0.75):
+        exact = exact_percentile(boundaries, fraction)
+        assert exact <= histogram.percentile(fraction) <= exact * BUCKET_GROWTH
+
+
+def test_percentile_capped_by_max():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(0.5) == 0.0
+    histogram.record(BUCKET_BASE / 10)
+    assert histogram.percentile(0.99) == BUCKET_BASE / 10
+    # 超出最后一个桶的样本按最大值计
+    histogram.record(3600)
+    assert histogram.percentile(1.0) == 3600
+
+
+def test_errors_counted_separately_from_timings():
+    perf = PerfRegistry()
+    perf.record("report", 0.01)
+    perf.record("report", 0.02, error=ConnectionError("后端不可达"))
+    perf.error("report", "HTTP 503")
+    report = perf.snapshot()["timings"]["report"]
+    assert report["count"] == 2
+    assert report["errors"] == 2
+    assert report["last_error"] == "HTTP 503"
+    assert report["avg"] == pytest.approx(0.015)
+
+
+def test_timer_records_exceptions():
+    perf = PerfRegistry()
+    with perf.timer("mysql"):
+        pass
+    with pytest.raises(ValueError):
+        with perf.timer("mysql"):
+            raise ValueError("查询失败")
+    mysql = perf.snapshot()["timings"]["mysql"]
+    assert mysql["count"] == 2
+    assert mysql["errors"] == 1
+    assert mysql["last_error"] == "查询失败"
+
+
+def test_counters_and_gauges():
+    perf = PerfRegistry()
+    perf.increment("reports")
+    perf.increment("reports", 2)
+    perf.gauge("outbox", lambda: 5)
+    perf.gauge("broken", lambda: 1 / 0)
+    snapshot = perf.snapshot()
+    assert snapshot["counters"] == {"reports": 3}
+    assert snapshot["gauges"] == {"outbox": 5, "broken": None}
@@ -0,0 +1,97 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from player_query import (
+    InvalidPlayerQueryError, build_player_page_query, decode_cursor, encode_cursor, escape_like, keyset_condition
+)
+
+
+def test_cursor_round_trip():
+    row = {"total_play_time": 3600.5, "player_name": "Steve", "id": 42}
+    cursor = encode_cursor("play_time", "desc", row)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, "play_time", "desc") == [3600.5, "Steve", 42]
+
+
+def test_last_played_cursor_restores_datetime():
+    row = {"last_play_time": datetime(2024, 5, 1, 12, 30, 15), "player_name": "玩家", "id": 7}
+    cursor = encode_cursor("last_played", "asc", row)
+    assert decode_cursor(cursor, "last_played", "asc") == [datetime(2024, 5, 1, 12, 30, 15), "玩家", 7]
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "", "W10", encode_cursor("play_time", "desc", {
+    "total_play_time": 1, "player_name": "a", "id": 1
+})[:-3]])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidPlayerQueryError):
+        decode_cursor(cursor, "play_time", "desc")
+
+
+def test_cursor_from_other_ordering_is_rejected():
+    cursor = encode_cursor("play_time", "desc", {"total_play_time": 1, "player_name": "a", "id": 1})
+    with pytest.raises(InvalidPlayerQueryError):
+        decode_cursor(cursor, "play_time", "asc")
+    with pytest.raises(InvalidPlayerQueryError):
+        decode_cursor(cursor, "last_played", "desc")
+
+
+def test_keyset_condition_expands_row_comparison():
+    sql, params = keyset_condition(("a", "b", "id"), [1, "x", 9], "desc")
+    assert sql == "((a < %s) OR (a = %s AND b < %s) OR (a = %s AND b = %s AND id < %s))"
+    assert params == [1, 1, "x", 1, "x", 9]
+    assert keyset_condition(("a",), [1], "asc")[0] == "((a > %s))"
+
+
+def test_escape_like():
+    assert escape_like("bot_%\\") == "bot\\_\\%\\\\"
+
+
+def test_invalid_sort_and_order():
+    with pytest.raises(InvalidPlayerQueryError):
+        build_player_page_query(sort="name")
+    with pytest.raises(InvalidPlayerQueryError):
+        build_player_page_query(order="sideways")
+
+
+@pytest.fixture
+def players_db():
+    db = sqlite3.connect(":memory:")
+    db.row_factory = sqlite3.Row
+    db.execute('''
+        CREATE TABLE player_stats (
+            id INTEGER PRIMARY KEY, player_name TEXT, server_id TEXT, server_name TEXT,
+            total_play_time REAL, total_sessions INTEGER, last_play_time TEXT
+        )
+    ''')
+    # 大量相同的游戏时长和玩家名，检验游标在并列时不会跳过或重复
+    rows = [
+        (i, f"player{i % 7}", "survival" if i % 2 else "creative", "S", float(i % 5 * 100), 1, None)
+        for i in range(1, 101)
+    ]
+    db.executemany("INSERT INTO player_stats VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    yield db
+    db.close()
+
+
+def fetch_page(db, **kwargs):
+    sql, params = build_player_page_query(**kwargs)
+    return [dict(row) for row in db.execute(sql.replace("%s", "?"), params).fetchall()]
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+@pytest.mark.parametrize("server_id", [None, "survival"])
+def test_paging_visits_every_row_once(players_db, order, server_id):
+    expected = fetch_page(players_db, order=order, server_id=server_id, limit=1000)
+    seen = []
+    cursor = None
+    while True:
+        rows = fetch_page(players_db, order=order, server_id=server_id, cursor=cursor, limit=9)
+        page, has_more = rows[:9], len(rows) > 9
+        seen.extend(page)
+        if not has_more:
+            break
+        cursor = encode_cursor("play_time", order, page[-1])
+    assert [row["id"] for row in seen] == [row["id"] for row in expected]
+    assert len(seen) == (100 if server_id is None else 50)
@@ -0,0 +1,151 @@
+import os
+import time
+from datetime import date, datetime
+
+import pytest
+
+import playtime_rollup
+from playtime_rollup import backfill_daily_playtime
+from server_status.session_writer import split_by_day as plugin_split_by_day
+
+# 插件和后端各有一份实现，两者必须一致
+IMPLEMENTATIONS = [plugin_split_by_day, playtime_rollup.split_by_day]
+
+
+@pytest.fixture
+def timezone():
+    """临时切换本地时区"""
+    original = os.environ.get("TZ")
+
+    def use(name):
+        os.environ["TZ"] = name
+        time.tzset()
+
+    yield use
+    if original is None:
+        os.environ.pop("TZ", None)
+    else:
+        os.environ["TZ"] = original
+    time.tzset()
+
+
+def local(*args):
+    return datetime(*args).timestamp()
+
+
+@pytest.mark.parametrize("split_by_day", IMPLEMENTATIONS)
+def test_split_within_one_day(timezone, split_by_day):
+    timezone("UTC")
+    assert split_by_day(local(2024, 5, 1, 10), local(2024, 5, 1, 12)) == [(date(2024, 5, 1), 7200.0)]
+
+
+@pytest.mark.parametrize("split_by_day", IMPLEMENTATIONS)
+def test_split_across_midnight(timezone, split_by_day):
+    timezone("Asia/Shanghai")
+    segments = split_by_day(local(2024, 5, 1, 23, 30), local(2024, 5, 3, 0, 15))
+    assert segments == [
+        (date(2024, 5, 1), 1800.0),
+        (date(2024, 5, 2), 86400.0),
+        (date(2024, 5, 3), 900.0)
+    ]
+
+
+@pytest.mark.parametrize("split_by_day", IMPLEMENTATIONS)
+def test_session_ending_at_midnight(timezone, split_by_day):
+    timezone("UTC")
+    assert split_by_day(local(2024, 5, 1, 23), local(2024, 5, 2)) == [(date(2024, 5, 1), 3600.0)]
+
+
+@pytest.mark.parametrize("split_by_day", IMPLEMENTATIONS)
+def test_zero_length_session_counts_on_start_day(timezone, split_by_day):
+    timezone("UTC")
+    start = local(2024, 5, 1, 8)
+    assert split_by_day(start, start) == [(date(2024, 5, 1), 0.0)]
+    assert split_by_day(start, start - 10) == [(date(2024, 5, 1), 0.0)]
+
+
+@pytest.mark.parametrize("split_by_day", IMPLEMENTATIONS)
+def test_dst_days_have_real_lengths(timezone, split_by_day):
+    timezone("Europe/Berlin")
+    # 2024-03-31切换到夏令时只有23小时，2024-10-27切换回冬令时有25小时
+    spring = split_by_day(local(2024, 3, 30, 12), local(2024, 4, 1, 12))
+    assert spring == [(date(2024, 3, 30), 12 * 3600.0), (date(2024, 3, 31), 23 * 3600.0), (date(2024, 4, 1), 12 * 3600.0)]
+    autumn = split_by_day(local(2024, 10, 27), local(2024, 10, 28))
+    assert autumn == [(date(2024, 10, 27), 25 * 3600.0)]
+
+
+@pytest.mark.parametrize("split_by_day", IMPLEMENTATIONS)
+def test_segments_add_up_to_session_length(timezone, split_by_day):
+    timezone("America/New_York")
+    start, end = local(2024, 3, 9, 18, 5), local(2024, 3, 12, 3, 40)
+    assert sum(seconds for _, seconds in split_by_day(start, end)) == pytest.approx(end - start)
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self._conn = conn
+        self._rows = []
+
+    def execute(self, sql, params=()):
+        sql = " ".join(sql.split())
+        self._conn.log.append(sql.split()[0])
+        if sql.startswith("SELECT 1"):
+            self._rows = [(1,)] if self._conn.has_rows else []
+        elif sql.startswith("SELECT"):
+            self._rows = list(self._conn.sessions)
+        elif sql.startswith("INSERT") and self._conn.fail_insert:
+            raise RuntimeError("connection lost")
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchmany(self, size):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, sessions, has_rows=False, fail_insert=False):
+        self.sessions = sessions
+        self.has_rows = has_rows
+        self.fail_insert = fail_insert
+        self.log = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def start_transaction(self):
+        self.log.append("START")
+
+    def commit(self):
+        self.log.append("COMMIT")
+
+    def rollback(self):
+        self.log.append("ROLLBACK")
+
+
+def test_backfill_skips_filled_table():
+    conn = FakeConnection([], has_rows=True)
+    assert backfill_daily_playtime(conn) == 0
+    assert conn.log == ["SELECT"]
+
+
+def test_backfill_writes_in_one_transaction(timezone, monkeypatch):
+    timezone("UTC")
+    monkeypatch.setattr(playtime_rollup, "BACKFILL_INSERT_SIZE", 1)
+    sessions = [("survival", 1, local(2024, 5, 1, 23), local(2024, 5, 2, 1)), ("survival", 2, local(2024, 5, 1, 8), local(2024, 5, 1, 9))]
+    conn = FakeConnection(sessions)
+    assert backfill_daily_playtime(conn) == 3
+    assert conn.log == ["SELECT", "SELECT", "START", "INSERT", "INSERT", "INSERT", "COMMIT"]
+
+
+def test_backfill_rolls_back_on_error(timezone):
+    timezone("UTC")
+    conn = FakeConnection([("survival", 1, local(2024, 5, 1, 8), local(2024, 5, 1, 9))], fail_insert=True)
+    with pytest.raises(RuntimeError):
+        backfill_daily_playtime(conn)
+    assert conn.log[-2:] == ["INSERT", "ROLLBACK"]
+    assert "COMMIT" not in conn.log
@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LAZY_MODULES = ("requests", "psutil", "mysql.connector", "msgpack")
+
+
+def test_plugin_import_does_not_load_optional_dependencies():
+    pytest.importorskip("mcdreforged")
+    # MCDR自身会导入psutil，先加载MCDR再把这些模块设为不可导入，插件在导入时用到任何一个都会失败
+    script = textwrap.dedent(f"""
+        import sys
+        import mcdreforged.api.all
+        for name in {LAZY_MODULES!r}:
+            sys.modules.pop(name, None)
+            sys.modules[name] = None
+        import server_status
+        loaded = [name for name in {LAZY_MODULES!r} if sys.modules.get(name) is not None]
+        print(",".join(loaded))
+    """)
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=ROOT,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ""
+
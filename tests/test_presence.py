@@ -0,0 +1,144 @@
+import sqlite3
+
+import presence
+from presence import PresenceIndex
+
+
+class SqliteCursor:
+    """把MySQL语法的语句转换后在sqlite上执行"""
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._cursor = connection.db.cursor()
+
+    @staticmethod
+    def _translate(sql):
+        return sql.replace("%s", "?").replace("INSERT IGNORE", "INSERT OR IGNORE")
+
+    def execute(self, sql, params=()):
+        if self._connection.fail_on and self._connection.fail_on in sql:
+            raise sqlite3.OperationalError("Lost connection to MySQL server during query")
+        self._cursor.execute(self._translate(sql), params)
+
+    def executemany(self, sql, rows):
+        if self._connection.fail_on and self._connection.fail_on in sql:
+            raise sqlite3.OperationalError("Lost connection to MySQL server during query")
+        self._cursor.executemany(self._translate(sql), rows)
+
+    def close(self):
+        self._cursor.close()
+
+
+class SqliteConnection:
+    def __init__(self, db):
+        self.db = db
+        self.fail_on = None
+
+    def cursor(self):
+        return SqliteCursor(self)
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        pass
+
+
+def make_db():
+    db = sqlite3.connect(":memory:", check_same_thread=False)
+    db.execute(
+        "CREATE TABLE online_players (server_id TEXT NOT NULL, player_name TEXT NOT NULL, "
+        "since REAL NOT NULL, PRIMARY KEY (server_id, player_name))"
+    )
+    return db
+
+
+def stored(db):
+    return sorted(db.execute("SELECT server_id, player_name FROM online_players").fetchall())
+
+
+def test_status_labels(monkeypatch):
+    monkeypatch.setattr(presence.time, "time", lambda: 1000.0)
+    index = PresenceIndex(lambda: None, timeout=180)
+    index.update("survival", ["Alex", "Steve"], 990.0)
+    index.update("creative", ["Steve"], 700.0)
+    assert index.status_label("survival", "Alex") == "在线"
+    assert index.status_label("creative", "Alex") == "离线"
+    # creative已超时，视为离线
+    assert index.status_label("creative", "Steve") == "离线"
+    assert index.status_label_anywhere("Steve") == "在线"
+    assert index.status_label_anywhere("Notch") == "离线"
+
+    index.update("survival", ["Alex"], 995.0)
+    assert index.status_label_anywhere("Steve") == "离线"
+    assert index.online_pairs() == [("survival", "Alex")]
+
+
+def test_update_reports_changes_once():
+    changes = []
+    index = PresenceIndex(lambda: None, on_change=changes.append)
+    assert index.update("survival", ["Alex", "Steve"]) == ({"Alex", "Steve"}, set())
+    assert index.update("survival", ["Steve", "Alex"]) == (set(), set())
+    assert index.update("survival", ["Steve"]) == (set(), {"Alex"})
+    assert changes == ["survival", "survival"]
+
+
+def test_sync_writes_only_changes():
+    db = make_db()
+    index = PresenceIndex(lambda: SqliteConnection(db))
+    db.execute("INSERT INTO online_players VALUES ('survival', 'Herobrine', 0)")
+    index.update("survival", ["Alex", "Steve"])
+    index.update("creative", ["Notch"])
+    assert index.sync()
+    # 第一次同步整体重写，清除表中残留的玩家
+    assert stored(db) == [("creative", "Notch"), ("survival", "Alex"), ("survival", "Steve")]
+
+    index.update("survival", ["Steve", "Jeb"])
+    assert index.sync()
+    assert stored(db) == [("creative", "Notch"), ("survival", "Jeb"), ("survival", "Steve")]
+    # 没有变化时不连接数据库
+    index._connect = lambda: 1 / 0
+    assert index.sync()
+
+
+def test_sync_removes_timed_out_servers(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(presence.time, "time", lambda: now[0])
+    db = make_db()
+    index = PresenceIndex(lambda: SqliteConnection(db), timeout=180)
+    index.update("survival", ["Alex"], 1000.0)
+    index.update("creative", ["Steve"], 1000.0)
+    assert index.sync()
+    now[0] = 1150.0
+    index.update("survival", ["Alex"], 1150.0)
+    now[0] = 1200.0
+    assert index.sync()
+    assert stored(db) == [("survival", "Alex")]
+    assert index.online_players("creative") == frozenset()
+
+
+def test_failed_sync_rewrites_server_next_time():
+    db = make_db()
+    connection = SqliteConnection(db)
+    index = PresenceIndex(lambda: connection)
+    index.update("survival", ["Alex"])
+    assert index.sync()
+
+    connection.fail_on = "INSERT"
+    index.update("survival", ["Alex", "Steve"])
+    assert not index.sync()
+    connection.fail_on = None
+    # 重试时整体重写，不依赖失败前表中的内容
+    db.execute("INSERT INTO online_players VALUES ('survival', 'Herobrine', 0)")
+    assert index.sync()
+    assert stored(db) == [("survival", "Alex"), ("survival", "Steve")]
+
+
+def test_sync_without_connection_keeps_changes():
+    db = make_db()
+    connections = [None, SqliteConnection(db)]
+    index = PresenceIndex(lambda: connections.pop(0))
+    index.update("survival", ["Alex"])
+    assert not index.sync()
+    assert index.sync()
+    assert stored(db) == [("survival", "Alex")]
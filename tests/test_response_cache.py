@@ -0,0 +1,165 @@
+import pytest
+from flask import Flask, jsonify
+
+from response_cache import ResponseCache
+
+
+@pytest.fixture
+def cache():
+    return ResponseCache(max_entries=2)
+
+
+@pytest.fixture
+def client(cache):
+    app = Flask(__name__)
+    calls = {"servers": 0, "players": 0, "error": 0}
+
+    @app.route('/servers')
+    @cache.cached(60, tags=('servers',))
+    def servers():
+        calls["servers"] += 1
+        return jsonify({"code": 200, "data": {"version": calls["servers"]}})
+
+    @app.route('/players')
+    @cache.cached(60, tags=('presence',))
+    def players():
+        calls["players"] += 1
+        return jsonify({"code": 200, "data": {"version": calls["players"]}})
+
+    @app.route('/error')
+    @cache.cached(60)
+    def error():
+        calls["error"] += 1
+        return jsonify({"code": 500, "message": "error"})
+
+    test_client = app.test_client()
+    test_client.calls = calls
+    return test_client
+
+
+def test_repeated_request_is_served_from_cache(client, cache):
+    first = client.get('/servers')
+    second = client.get('/servers')
+    assert client.calls["servers"] == 1
+    assert first.get_json() == second.get_json()
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1}
+
+
+def test_strong_etag_and_not_modified(client):
+    first = client.get('/servers')
+    etag, weak = first.get_etag()
+    assert etag and not weak
+    assert first.headers['ETag'] == f'"{etag}"'
+    assert first.headers['Cache-Control'] == 'no-cache'
+
+    revalidated = client.get('/servers', headers={'If-None-Match': f'"{etag}"'})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+    assert revalidated.get_etag() == (etag, False)
+
+    changed = client.get('/servers', headers={'If-None-Match': '"other"'})
+    assert changed.status_code == 200
+
+
+def test_query_string_is_part_of_key(client):
+    client.get('/servers?a=1&b=2')
+    client.get('/servers?b=2&a=1')
+    client.get('/servers?a=2')
+    assert client.calls["servers"] == 2
+
+
+def test_invalidate_by_tag(client, cache):
+    etag = client.get('/servers').get_etag()[0]
+    client.get('/players')
+    cache.invalidate('servers')
+
+    refreshed = client.get('/servers', headers={'If-None-Match': f'"{etag}"'})
+    assert refreshed.status_code == 200
+    assert refreshed.get_json()["data"]["version"] == 2
+    client.get('/players')
+    assert client.calls["players"] == 1
+
+
+def test_error_results_are_not_cached(client):
+    client.get('/error')
+    client.get('/error')
+    assert client.calls["error"] == 2
+
+
+def test_least_recently_used_entry_is_evicted(client, cache):
+    client.get('/servers?page=1')
+    client.get('/servers?page=2')
+    client.get('/servers?page=1')
+    client.get('/servers?page=3')
+    assert cache.stats()["entries"] == 2
+    client.get('/servers?page=1')
+    client.get('/servers?page=2')
+    assert client.calls["servers"] == 4
+
+
+def test_response_computed_across_invalidation_is_not_stored(cache):
+    # 计算期间发生失效时，结果可能基于旧数据，不能写入缓存
+    app = Flask(__name__)
+    calls = []
+
+    @app.route('/servers')
+    @cache.cached(60, tags=('servers',))
+    def servers():
+        calls.append(1)
+        if len(calls) == 1:
+            cache.invalidate('servers')
+        return jsonify({"code": 200, "data": len(calls)})
+
+    client = app.test_client()
+    client.get('/servers')
+    client.get('/servers')
+    assert len(calls) == 2
+
+
+def test_entries_expire(client, cache, monkeypatch):
+    import response_cache
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "monotonic", lambda: now[0])
+    client.get('/servers')
+    now[0] += 59
+    client.get('/servers')
+    now[0] += 2
+    client.get('/servers')
+    assert client.calls["servers"] == 2
+
+
+def test_other_tag_invalidation_does_not_block_store(cache):
+    # 每次上报都会使servers失效，不能因此让依赖presence的慢查询永远无法缓存
+    app = Flask(__name__)
+    calls = []
+
+    @app.route('/leaderboard')
+    @cache.cached(60, tags=('presence',))
+    def leaderboard():
+        calls.append(1)
+        cache.invalidate('servers')
+        return jsonify({"code": 200, "data": len(calls)})
+
+    client = app.test_client()
+    client.get('/leaderboard')
+    client.get('/leaderboard')
+    assert len(calls) == 1
+
+
+def test_clear_during_computation_blocks_store(cache):
+    app = Flask(__name__)
+    calls = []
+
+    @app.route('/history')
+    @cache.cached(60)
+    def history():
+        calls.append(1)
+        if len(calls) == 1:
+            cache.clear()
+        return jsonify({"code": 200, "data": len(calls)})
+
+    client = app.test_client()
+    client.get('/history')
+    client.get('/history')
+    client.get('/history')
+    assert len(calls) == 2
@@ -0,0 +1,63 @@
+from server_status.roster import PlayerRoster
+
+
+def make_roster():
+    return PlayerRoster(["假的bot", "假的Bot_"])
+
+
+def test_version_changes_only_on_change():
+    roster = make_roster()
+    assert roster.version == 0
+    assert roster.add("Alex")
+    assert not roster.add("Alex")
+    assert roster.version == 1
+    assert roster.remove("Alex")
+    assert not roster.remove("Alex")
+    assert roster.version == 2
+    roster.clear()
+    assert roster.version == 2
+
+
+def test_snapshot_splits_bots():
+    roster = make_roster()
+    for player in ["Alex", "假的bot1", "Steve", "假的Bot_miner"]:
+        roster.add(player)
+    assert roster.snapshot() == {
+        "real_players": ["Alex", "Steve"],
+        "bots": ["假的bot1", "假的Bot_miner"],
+        "real_amount": 2,
+        "bots_amount": 2,
+        "total_amount": 4
+    }
+
+
+def test_snapshot_is_not_mutated_by_later_changes():
+    roster = make_roster()
+    roster.add("Alex")
+    before = roster.snapshot()
+    roster.add("Steve")
+    assert before["real_players"] == ["Alex"]
+    assert roster.snapshot()["real_players"] == ["Alex", "Steve"]
+
+
+def test_replace_keeps_existing_order():
+    roster = make_roster()
+    for player in ["Alex", "Steve", "Notch"]:
+        roster.add(player)
+    assert roster.replace(["Herobrine", "Notch", "Alex"])
+    assert roster.names() == ["Alex", "Notch", "Herobrine"]
+    version = roster.version
+    assert not roster.replace(["Notch", "Herobrine", "Alex"])
+    assert roster.version == version
+
+
+def test_replace_gives_up_when_events_arrived_during_query():
+    roster = make_roster()
+    roster.add("Alex")
+    # 查询开始时记下版本，查询期间Steve加入
+    version = roster.version
+    roster.add("Steve")
+    assert not roster.replace(["Alex"], expected_version=version)
+    assert roster.names() == ["Alex", "Steve"]
+    assert roster.replace(["Alex"], expected_version=roster.version)
+    assert roster.names() == ["Alex"]
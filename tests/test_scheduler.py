@@ -0,0 +1,91 @@
+import threading
+import time
+
+import pytest
+
+from server_status import scheduler
+from server_status.scheduler import ReportScheduler
+
+
+@pytest.fixture
+def bounds(monkeypatch):
+    """让随机抖动返回区间本身，便于断言"""
+    monkeypatch.setattr(scheduler.random, "uniform", lambda low, high: (low, high))
+
+
+def test_healthy_delay_is_interval():
+    assert ReportScheduler(interval=60).next_delay() == 60
+
+
+def test_backoff_starts_at_interval(bounds):
+    schedule = ReportScheduler(interval=60, max_backoff=300)
+    delays = []
+    for _ in range(5):
+        schedule.record_failure()
+        delays.append(schedule.next_delay())
+    # 失败期间的请求不会比正常上报更频繁
+    assert delays == [(60, 120), (120, 240), (150, 300), (150, 300), (150, 300)]
+
+
+def test_backoff_never_below_interval(bounds):
+    schedule = ReportScheduler(interval=60, min_backoff=5, max_backoff=30)
+    schedule.record_failure()
+    assert schedule.next_delay() == (60, 60)
+
+
+def test_jittered_backoff_stays_in_range():
+    schedule = ReportScheduler(interval=10, max_backoff=100)
+    schedule.record_failure()
+    schedule.record_failure()
+    for _ in range(100):
+        assert 20 <= schedule.next_delay() <= 40
+
+
+def test_success_resets_backoff():
+    schedule = ReportScheduler(interval=60)
+    schedule.record_failure()
+    schedule.record_success(changed=False, idle=False)
+    assert schedule.failures == 0
+    assert schedule.next_delay() == 60
+
+
+def test_idle_streak_grows_interval_up_to_limit():
+    schedule = ReportScheduler(interval=60, max_idle_interval=150, idle_growth=1.5)
+    delays = []
+    for _ in range(4):
+        schedule.record_success(changed=False, idle=True)
+        delays.append(schedule.next_delay())
+    assert delays == [90, 135, 150, 150]
+
+    # 名单变化或有玩家在线时恢复正常间隔
+    schedule.record_success(changed=True, idle=True)
+    assert schedule.next_delay() == 60
+    schedule.record_success(changed=False, idle=True)
+    schedule.record_success(changed=False, idle=False)
+    assert schedule.next_delay() == 60
+
+
+def test_change_triggers_report_after_debounce():
+    schedule = ReportScheduler(interval=60, change_debounce=0.05)
+    started = time.monotonic()
+    schedule.notify_change()
+    schedule.notify_change()
+    assert schedule.wait()
+    assert 0.04 <= time.monotonic() - started < 1
+
+
+def test_change_does_not_shorten_backoff():
+    schedule = ReportScheduler(interval=0.3, min_backoff=0, max_backoff=0.3, change_debounce=0.01)
+    schedule.record_failure()
+    schedule.notify_change()
+    started = time.monotonic()
+    assert schedule.wait()
+    assert time.monotonic() - started >= 0.3
+
+
+def test_stop_interrupts_wait():
+    schedule = ReportScheduler(interval=60)
+    threading.Timer(0.05, schedule.stop).start()
+    started = time.monotonic()
+    assert not schedule.wait()
+    assert time.monotonic() - started < 1
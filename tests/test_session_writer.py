@@ -0,0 +1,129 @@
+import logging
+import time
+
+from server_status.session_writer import SessionWriter, split_phases
+
+
+def test_split_phases_keeps_one_event_per_player():
+    events = [
+        ("join", "Alex", 1), ("join", "Steve", 2), ("leave", "Alex", 3),
+        ("leave", "Steve", 4), ("join", "Alex", 5)
+    ]
+    assert split_phases(events) == [
+        [("join", "Alex", 1), ("join", "Steve", 2)],
+        [("leave", "Alex", 3), ("leave", "Steve", 4)],
+        [("join", "Alex", 5)]
+    ]
+
+
+def test_split_phases_isolates_reset():
+    events = [("join", "Alex", 1), ("reset", None, 2), ("join", "Steve", 3)]
+    assert split_phases(events) == [
+        [("join", "Alex", 1)],
+        [("reset", None, 2)],
+        [("join", "Steve", 3)]
+    ]
+
+
+def test_split_phases_preserves_order():
+    events = [("join", f"p{i % 3}", i) for i in range(10)]
+    phases = split_phases(events)
+    assert [event for phase in phases for event in phase] == events
+    for phase in phases:
+        players = [player for _, player, _ in phase]
+        assert len(players) == len(set(players))
+
+
+class FakeCursor:
+    def __init__(self, statements):
+        self.statements = statements
+
+    def execute(self, sql, params=()):
+        self.statements.append((" ".join(sql.split()), tuple(params)))
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.statements = []
+        self.committed = False
+
+    def start_transaction(self):
+        pass
+
+    def cursor(self):
+        return FakeCursor(self.statements)
+
+    def commit(self):
+        self.committed = True
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+def test_reset_closes_orphaned_sessions_with_zero_duration():
+    conn = FakeConnection()
+    writer = SessionWriter(lambda: conn, "survival", "Survival", logging.getLogger(__name__))
+    assert writer.flush([("reset", None, 1000.0)])
+    assert conn.committed
+    (sql, params), = conn.statements
+    # 遗留会话以加入时间结束，宕机期间不计入游戏时长，也不写入统计和每日时长
+    assert "leave_time = join_time" in sql
+    assert "play_duration = 0" in sql
+    assert "player_stats" not in sql
+    assert params == ("survival", 1000.0)
+
+
+def test_failed_flush_waits_before_retrying():
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        return None
+
+    writer = SessionWriter(connect, "survival", "Survival", logging.getLogger(__name__),
+                           flush_size=2, flush_interval=0.05, max_retry_delay=0.2)
+    writer.player_joined("Alex", 1.0)
+    writer.player_joined("Steve", 2.0)
+    writer.start()
+    time.sleep(0.5)
+    writer.stop()
+    # 0.05、0.1、0.2、0.2秒后重试，加上停止时的最后一次写入
+    assert 2 <= len(attempts) <= 8
+    assert writer.pending() == 2
+
+
+class MissingTableError(Exception):
+    errno = 1146
+
+
+class RollupCursor(FakeCursor):
+    def execute(self, sql, params=()):
+        if "player_daily_playtime" in sql:
+            raise MissingTableError("Table 'server_status.player_daily_playtime' doesn't exist")
+        super().execute(sql, params)
+
+    def fetchall(self):
+        return [(1, 1000.0, 1600.0)]
+
+
+def test_missing_rollup_table_does_not_block_sessions():
+    conn = FakeConnection()
+    conn.cursor = lambda: RollupCursor(conn.statements)
+    writer = SessionWriter(lambda: conn, "survival", "Survival", logging.getLogger(__name__))
+    assert writer.flush([("join", "Alex", 1000.0), ("leave", "Alex", 1600.0)])
+    assert conn.committed
+    assert writer.pending() == 0
+
+    # 之后的批次不再尝试写入每日时长
+    conn.statements.clear()
+    assert writer.flush([("join", "Alex", 2000.0), ("leave", "Alex", 2600.0)])
+    assert not any("player_daily_playtime" in sql for sql, _ in conn.statements)
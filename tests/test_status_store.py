@@ -0,0 +1,125 @@
+import json
+import threading
+
+from status_store import StatusStore
+
+
+class JsonFile:
+    """与后端的数据文件相同，用JSON保存快照"""
+
+    def __init__(self, path):
+        self.path = path
+        self.saves = 0
+
+    def load(self):
+        if not self.path.exists():
+            return {}
+        return json.loads(self.path.read_text(encoding="utf-8"))
+
+    def save(self, data):
+        self.saves += 1
+        self.path.write_text(json.dumps(data), encoding="utf-8")
+        return True
+
+
+def test_concurrent_updates_are_not_lost():
+    store = StatusStore(lambda: {}, lambda data: True, stripes=4, dirty_threshold=10 ** 9)
+    servers = ["survival", "creative", "lobby"]
+
+    def increment(status):
+        status = dict(status or {"count": 0})
+        status["count"] += 1
+        return status
+
+    def worker():
+        for _ in range(500):
+            for server_id in servers:
+                store.update(server_id, increment)
+            store.update_many({server_id: increment for server_id in servers})
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store.snapshot() == {server_id: {"count": 8000} for server_id in servers}
+
+
+def test_update_returning_none_keeps_status():
+    saved = []
+    store = StatusStore(lambda: {}, lambda data: saved.append(data) or True)
+    store.put("survival", {"player_count": 1})
+    store.flush()
+    assert store.update("survival", lambda status: None) is None
+    assert store.update_many({"survival": lambda status: None}) == {"survival": None}
+    assert store.get("survival") == {"player_count": 1}
+    # 没有修改时不写回
+    assert store.flush()
+    assert len(saved) == 1
+
+
+def test_get_returns_copy():
+    store = StatusStore(lambda: {}, lambda data: True)
+    store.put("survival", {"player_count": 1})
+    store.get("survival")["player_count"] = 5
+    assert store.get("survival") == {"player_count": 1}
+    assert store.get("creative") is None
+
+
+def test_snapshot_round_trip(tmp_path):
+    data_file = JsonFile(tmp_path / "server_data.json")
+    store = StatusStore(data_file.load, data_file.save)
+    store.put("survival", {"player_count": 2, "players": ["Alex", "Steve"]})
+    store.put("creative", {"player_count": 0, "players": []})
+    assert store.flush()
+
+    restored = StatusStore(data_file.load, data_file.save)
+    assert restored.load() == 2
+    assert restored.snapshot() == store.snapshot()
+
+
+def test_load_skips_malformed_entries():
+    store = StatusStore(lambda: {"survival": {"player_count": 1}, "broken": [1, 2]}, lambda data: True)
+    assert store.load() == 1
+    assert store.snapshot() == {"survival": {"player_count": 1}}
+
+
+def test_failed_save_is_retried():
+    results = [False, True]
+    saved = []
+
+    def saver(data):
+        saved.append(data)
+        return results.pop(0)
+
+    store = StatusStore(lambda: {}, saver)
+    store.put("survival", {"player_count": 1})
+    assert not store.flush()
+    # 写回失败后修改仍标记为未保存
+    assert store.flush()
+    assert len(saved) == 2
+
+
+def test_dirty_threshold_wakes_writer(tmp_path):
+    data_file = JsonFile(tmp_path / "server_data.json")
+    store = StatusStore(data_file.load, data_file.save, snapshot_interval=60, dirty_threshold=3)
+    store.start()
+    try:
+        for count in range(3):
+            store.put("survival", {"player_count": count})
+        for _ in range(100):
+            if data_file.saves:
+                break
+            threading.Event().wait(0.02)
+        assert data_file.load() == {"survival": {"player_count": 2}}
+    finally:
+        store.stop()
+
+
+def test_stop_flushes_pending_changes(tmp_path):
+    data_file = JsonFile(tmp_path / "server_data.json")
+    store = StatusStore(data_file.load, data_file.save, snapshot_interval=60, dirty_threshold=100)
+    store.start()
+    store.put("survival", {"player_count": 3})
+    store.stop()
+    assert data_file.load() == {"survival": {"player_count": 3}}
@@ -0,0 +1,153 @@
+import time
+
+from db_pool import iter_chunks
+from player_query import escape_like
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 每次从游标读取的会话数
+SESSION_FETCH_SIZE = 10000
+
+HOURS_PER_WEEK = 7 * 24
+
+
+class AnalyticsUnavailableError(Exception):
+    """后端未安装numpy"""
+
+
+class InvalidAnalyticsQueryError(ValueError):
+    """分析查询参数无效"""
+
+
+def require_numpy():
+    if np is None:
+        raise AnalyticsUnavailableError("后端未安装numpy，无法进行统计分析")
+
+
+def session_overlap_query(server_id, start, end, exclude_prefixes=()):
+    """查询与[start, end)有重叠的会话，未结束的会话以end作为离开时间，返回(sql, params)"""
+    conditions = ["server_id = %s", "join_time < %s", "(leave_time IS NULL OR leave_time > %s)"]
+    params = [end, server_id, end, start]
+    for prefix in exclude_prefixes:
+        conditions.append("player_name NOT LIKE %s")
+        params.append(escape_like(prefix) + '%')
+    sql = f'''
+        SELECT join_time, COALESCE(leave_time, %s)
+        FROM player_sessions
+        WHERE {" AND ".join(conditions)}
+    '''
+    return sql, params
+
+
+def load_sessions(cursor, server_id, start, end, exclude_prefixes=(), chunk_size=SESSION_FETCH_SIZE):
+    """把会话的加入/离开时间逐批读入两个float64数组，裁剪到[start, end)并去掉长度为0的会话
+
+    cursor应为非缓冲游标，结果集不会一次性读入内存。
+    """
+    require_numpy()
+    cursor.execute(*session_overlap_query(server_id, start, end, exclude_prefixes))
+    chunks = [np.asarray(rows, dtype=np.float64).reshape(-1, 2) for rows in iter_chunks(cursor, chunk_size)]
+    if not chunks:
+        return np.empty(0), np.empty(0)
+    sessions = np.concatenate(chunks)
+    joins = np.maximum(sessions[:, 0], start)
+    leaves = np.minimum(sessions[:, 1], end)
+    keep = leaves > joins
+    return joins[keep], leaves[keep]
+
+
+def concurrency_curve(joins, leaves):
+    """扫描线计算同时在线人数的阶梯函数
+
+    返回(times, counts)：从times[i]起到times[i+1]之前的在线人数为counts[i]。
+    同一时刻的离开先于加入处理，避免人数在交接时出现虚假的峰值。
+    """
+    require_numpy()
+    times = np.concatenate((joins, leaves))
+    deltas = np.concatenate((np.ones(len(joins), dtype=np.int64), -np.ones(len(leaves), dtype=np.int64)))
+    order = np.lexsort((deltas, times))
+    times = times[order]
+    counts = np.cumsum(deltas[order])
+    if len(times) == 0:
+        return times, counts
+    # 同一时刻的多个事件只保留处理完之后的人数
+    last = np.append(np.flatnonzero(np.diff(times) != 0), len(times) - 1)
+    return times[last], counts[last]
+
+
+def _value_at(times, counts, points):
+    """阶梯函数在各时间点的取值"""
+    index = np.searchsorted(times, points, side='right') - 1
+    return np.where(index >= 0, counts[np.maximum(index, 0)], 0)
+
+
+def _area_at(times, counts, points):
+    """阶梯函数从起点到各时间点的积分(玩家·秒)，times不能为空"""
+    area = np.concatenate(([0.0], np.cumsum(counts[:-1] * np.diff(times))))
+    index = np.searchsorted(times, points, side='right') - 1
+    clipped = np.maximum(index, 0)
+    return np.where(index >= 0, area[clipped] + counts[clipped] * (points - times[clipped]), 0.0)
+
+
+def bucket_concurrency(times, counts, grid):
+    """按grid划分的区间计算平均在线人数和区间内的最高在线人数"""
+    if len(times) == 0:
+        empty = np.zeros(len(grid) - 1)
+        return empty, empty.astype(np.int64)
+    averages = np.diff(_area_at(times, counts, grid)) / np.diff(grid)
+    peaks = _value_at(times, counts, grid[:-1]).astype(np.int64)
+    bucket = np.searchsorted(grid, times, side='right') - 1
+    inside = (bucket >= 0) & (bucket < len(grid) - 1)
+    np.maximum.at(peaks, bucket[inside], counts[inside])
+    return averages, peaks
+
+
+def concurrency_report(joins, leaves, start, end, step):
+    """[start, end)内按step分组的在线人数曲线和整个区间的峰值"""
+    times, counts = concurrency_curve(joins, leaves)
+    grid = np.append(np.arange(start, end, step, dtype=np.float64), end)
+    averages, peaks = bucket_concurrency(times, counts, grid)
+    if len(counts):
+        peak_index = int(np.argmax(counts))
+        peak = {"count": int(counts[peak_index]), "ts": float(times[peak_index])}
+    else:
+        peak = {"count": 0, "ts": None}
+    return {
+        "points": [
+            {"ts": float(ts), "avg": round(float(avg), 3), "max": int(high)}
+            for ts, avg, high in zip(grid[:-1], averages, peaks)
+        ],
+        "peak": peak,
+        "sessions": int(len(joins))
+    }
+
+
+def local_utc_offset(timestamp=None):
+    """服务器本地时区在timestamp时相对UTC的偏移秒数"""
+    return time.localtime(timestamp).tm_gmtoff
+
+
+def hour_of_week_heatmap(joins, leaves, start, end, utc_offset):
+    """每周各小时(周一0点起)的平均在线人数和最高在线人数，返回两个7x24数组
+
+    按本地整点切分[start, end)，每个整点区间的玩家·秒除以该时段在范围内出现的总时长即为平均在线人数。
+    """
+    times, counts = concurrency_curve(joins, leaves)
+    first_hour = np.floor((start + utc_offset) / 3600) * 3600 - utc_offset
+    grid = np.arange(first_hour, end, 3600, dtype=np.float64)
+    grid = np.clip(np.append(grid, end), start, end)
+    averages, peaks = bucket_concurrency(times, counts, grid)
+    durations = np.diff(grid)
+
+    # 1970-01-01是周四，按周一为一周的第一天计算
+    local_hours = np.floor((grid[:-1] + utc_offset) / 3600).astype(np.int64)
+    slots = ((local_hours // 24 + 3) % 7) * 24 + local_hours % 24
+    player_seconds = np.bincount(slots, weights=averages * durations, minlength=HOURS_PER_WEEK)
+    covered = np.bincount(slots, weights=durations, minlength=HOURS_PER_WEEK)
+    average = np.divide(player_seconds, covered, out=np.zeros(HOURS_PER_WEEK), where=covered > 0)
+    peak = np.zeros(HOURS_PER_WEEK, dtype=np.int64)
+    np.maximum.at(peak, slots, peaks)
+    return average.reshape(7, 24), peak.reshape(7, 24)
@@ -1,12 +1,30 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, Response, request, jsonify, render_template, send_from_directory, stream_with_context
 from datetime import datetime, timedelta
 from flask_cors import CORS
 import json
 import os
+import time
 import logging
+import threading
 import mysql.connector
 from mysql.connector import Error
-
+from status_store import StatusStore
+from db_pool import MySQLConnectionPool, PoolExhaustedError
+from status_delta import apply_status_delta, SequenceGapError
+from payload_codec import decode_request_payload, decode_batch_payload, accepted_content_types, UnsupportedPayloadError
+from presence import PresenceIndex
+from player_query import build_player_page_query, encode_cursor, InvalidPlayerQueryError
+from response_cache import ResponseCache
+from playtime_rollup import backfill_daily_playtime, period_leaderboard_query
+from event_broker import EventBroker, TooManyClientsError
+from ingest_queue import IngestQueue, IngestQueueFullError
+from metric_history import MetricHistory, InvalidHistoryQueryError
+import analytics
+from analytics import AnalyticsUnavailableError, InvalidAnalyticsQueryError
+from export import (
+    ExportStream, InvalidExportQueryError, EXPORT_FORMATS, SESSION_EXPORT_COLUMNS, STATS_EXPORT_COLUMNS,
+    sessions_export_query, stats_export_query
+)
 
 
 # 配置日志
@@ -32,15 +50,76 @@ MYSQL_CONFIG = {
     'password': 'SCTserver',
     'charset': 'utf8mb4',
     'autocommit': True,
-    'raise_on_warnings': False
+    'raise_on_warnings': False,
+    'connection_timeout': 10  # 10秒连接超时
+}
+
+# MySQL连接池配置
+MYSQL_POOL_CONFIG = {
+    'size': 8,                 # 最多同时打开的连接数
+    'max_lifetime': 1800,      # 单个连接最长存活时间（秒）
+    'wait_timeout': 5,         # 连接全部借出时的最长等待时间（秒）
+    'health_check_after': 5    # 连接空闲超过该时间（秒）后借出前先检查可用性
 }
 
 logger.info(f"后端工作目录: {os.getcwd()}")
 
+# 直接运行app.py时是否启用调试模式（含代码修改后自动重载）
+APP_DEBUG = True
+
 # 设置服务器超时时间（秒），应该比report_interval稍大一些
 # 如果report_interval是120秒，我们可以设置超时时间为180秒（3分钟）
 SERVER_TIMEOUT = 180  # 3分钟
 
+# 内存状态存储配置：分段锁数量、快照写回间隔（秒）和触发提前写回的脏写次数
+STATUS_STORE_STRIPES = 16
+STATUS_SNAPSHOT_INTERVAL = 30
+STATUS_SNAPSHOT_DIRTY_THRESHOLD = 20
+
+# 批量上报接口每次请求最多接收的状态条数
+STATUS_BATCH_MAX_ITEMS = 1000
+
+# 异步接收队列中待应用的状态数上限，已满时返回503让插件稍后重试
+INGEST_QUEUE_MAX_PENDING = 1000
+
+# 指标历史查询：未指定step时返回的点数，以及单次查询最多返回的点数
+HISTORY_DEFAULT_POINTS = 288
+HISTORY_MAX_POINTS = 1000
+
+# 在线人数分析：曲线默认覆盖的秒数和最多返回的点数，热力图默认和最长覆盖的天数
+CONCURRENCY_DEFAULT_SPAN = 86400
+CONCURRENCY_MAX_POINTS = 1000
+HEATMAP_DEFAULT_DAYS = 28
+HEATMAP_MAX_DAYS = 366
+
+# 数据导出：同时进行的导出数上限(每个导出占用一个数据库连接)，以及导出连接等待客户端读取的超时（秒）
+EXPORT_MAX_CONCURRENT = 2
+EXPORT_NET_WRITE_TIMEOUT = 600
+
+# 玩家列表分页：默认每页条数和每页条数上限
+PLAYER_PAGE_DEFAULT = 50
+PLAYER_PAGE_MAX = 200
+
+# 读接口的响应缓存有效期（秒），服务器状态和在线状态变化时会提前失效
+RESPONSE_CACHE_TTL = {
+    'servers': 5,
+    'players': 30,
+    'leaderboard': 60,
+    'leaderboard_period': 300,
+    'dashboard': 30,
+    'history': 30,
+    'analytics': 300
+}
+RESPONSE_CACHE_MAX_ENTRIES = 256
+
+# 面板事件流：补发用的历史事件数、心跳间隔（秒）和最大同时连接数
+SSE_HISTORY_SIZE = 512
+SSE_HEARTBEAT_INTERVAL = 15
+SSE_MAX_CLIENTS = 64
+
+# 假人玩家名前缀，exclude_bots过滤时使用，应与插件配置中的bot_prefixes一致
+BOT_NAME_PREFIXES = ('假的bot', '假的Bot_', '假人', 'Bot', 'bot')
+
 logger.info(f"基础目录: {BASE_DIR}")
 logger.info(f"数据文件路径: {DATA_FILE}")
 
@@ -50,63 +129,67 @@ def is_valid_server_id(server_id):
     invalid_ids = ['timestamp', 'status', 'error', 'path', 'message', 'info']
     return server_id and isinstance(server_id, str) and server_id not in invalid_ids and len(server_id) < 50
 
-def sanitize_server_data(data):
-    """清理和验证服务器数据，确保数据格式正确"""
-    sanitized = {}
+# 数值字段的校验规则: (字段名, 直接接受的类型, 转换函数)，无法转换时取0
+STATUS_NUMBER_FIELDS = (
+    ('memory_usage', (int, float), float),
+    ('uptime', (int, float), float),
+    ('player_count', int, int)
+)
+
+def coerce_number(value, accepted, convert):
+    """按规则把字段值转换为数字"""
+    if isinstance(value, accepted):
+        return value
+    try:
+        return convert(value) if value is not None else 0
+    except (ValueError, TypeError):
+        return 0
+
+def sanitize_server_batch(items):
+    """按字段逐列清理和验证一批服务器数据，每条结果与sanitize_server_data相同"""
+    sanitized = [{} for _ in items]
     
     # 确保必要的字段存在并具有正确的类型
-    server_id = data.get('server_id', 'unknown')
-    if not is_valid_server_id(server_id):
-        server_id = 'unknown'
-    sanitized['server_id'] = server_id
-    
-    # 内存使用率 - 确保是数字
-    memory_usage = data.get('memory_usage')
-    if isinstance(memory_usage, (int, float)):
-        sanitized['memory_usage'] = memory_usage
-    else:
-        try:
-            sanitized['memory_usage'] = float(memory_usage) if memory_usage is not None else 0
-        except (ValueError, TypeError):
-            sanitized['memory_usage'] = 0
+    for data, cleaned in zip(items, sanitized):
+        server_id = data.get('server_id', 'unknown')
+        cleaned['server_id'] = server_id if is_valid_server_id(server_id) else 'unknown'
     
-    # 运行时间 - 确保是数字
-    uptime = data.get('uptime')
-    if isinstance(uptime, (int, float)):
-        sanitized['uptime'] = uptime
-    else:
-        try:
-            sanitized['uptime'] = float(uptime) if uptime is not None else 0
-        except (ValueError, TypeError):
-            sanitized['uptime'] = 0
-    
-    # 玩家数量 - 确保是整数
-    player_count = data.get('player_count')
-    if isinstance(player_count, int):
-        sanitized['player_count'] = player_count
-    else:
-        try:
-            sanitized['player_count'] = int(player_count) if player_count is not None else 0
-        except (ValueError, TypeError):
-            sanitized['player_count'] = 0
+    # 内存使用率、运行时间和玩家数量 - 确保是数字
+    for field, accepted, convert in STATUS_NUMBER_FIELDS:
+        for data, cleaned in zip(items, sanitized):
+            cleaned[field] = coerce_number(data.get(field), accepted, convert)
     
     # 玩家列表 - 确保是字符串列表
-    players = data.get('players')
-    if isinstance(players, list):
-        sanitized['players'] = [str(player) for player in players if player is not None]
-    else:
-        sanitized['players'] = []
+    for data, cleaned in zip(items, sanitized):
+        players = data.get('players')
+        cleaned['players'] = [str(player) for player in players if player is not None] if isinstance(players, list) else []
     
     # 最后更新时间
-    sanitized['last_update'] = data.get('last_update', datetime.now().isoformat())
+    now = datetime.now().isoformat()
+    for data, cleaned in zip(items, sanitized):
+        cleaned['last_update'] = data.get('last_update', now)
     
     # 复制其他字段
-    for key, value in data.items():
-        if key not in sanitized:
-            sanitized[key] = value
-            
+    for data, cleaned in zip(items, sanitized):
+        for key, value in data.items():
+            if key not in cleaned:
+                cleaned[key] = value
+    
     return sanitized
 
+def sanitize_server_data(data):
+    """清理和验证服务器数据，确保数据格式正确"""
+    return sanitize_server_batch([data])[0]
+
+def newer_status(current, incoming):
+    """incoming的采样时间不早于current时返回incoming，否则返回None"""
+    if current is not None:
+        current_ts = current.get('timestamp')
+        incoming_ts = incoming.get('timestamp')
+        if isinstance(current_ts, (int, float)) and isinstance(incoming_ts, (int, float)) and incoming_ts < current_ts:
+            return None
+    return incoming
+
 class Result:
     """响应结果类"""
     
@@ -120,6 +203,11 @@ class Result:
         """创建成功的响应结果"""
         return cls(code=200, data=data, message="success")
     
+    @classmethod
+    def accepted(cls, data=None):
+        """创建已接受、稍后处理的响应结果"""
+        return cls(code=202, data=data, message="accepted")
+    
     @classmethod
     def error(cls, message="error", code=500):
         """创建错误的响应结果"""
@@ -137,6 +225,17 @@ class Result:
         """将结果转换为Flask响应"""
         return jsonify(self.to_dict())
 
+def ensure_index(cursor, table, name, columns):
+    """索引不存在时创建索引，MySQL不支持CREATE INDEX IF NOT EXISTS"""
+    cursor.execute('''
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+    ''', (table, name))
+    if cursor.fetchone() is None:
+        logger.info(f"为 {table} 创建索引 {name}")
+        cursor.execute(f"ALTER TABLE {table} ADD INDEX {name} ({', '.join(columns)})")
+
 def create_player_tables():
     """创建玩家相关的数据库表"""
     try:
@@ -183,8 +282,57 @@ def create_player_tables():
             )
         ''')
         
+        # 玩家列表按游戏时长和最后游戏时间分页的索引，InnoDB二级索引隐含主键id
+        ensure_index(cursor, 'player_stats', 'idx_play_time', ('total_play_time', 'player_name'))
+        ensure_index(cursor, 'player_stats', 'idx_server_play_time', ('server_id', 'total_play_time', 'player_name'))
+        ensure_index(cursor, 'player_stats', 'idx_last_played', ('last_play_time', 'player_name'))
+        ensure_index(cursor, 'player_stats', 'idx_server_last_played', ('server_id', 'last_play_time', 'player_name'))
+        
+        # 创建 online_players 表，由在线玩家索引同步，只保存当前在线的玩家
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS online_players (
+                server_id VARCHAR(255) NOT NULL,
+                player_name VARCHAR(255) NOT NULL,
+                since DOUBLE NOT NULL,
+                PRIMARY KEY (server_id, player_name),
+                INDEX idx_player (player_name)
+            )
+        ''')
+        
+        # 创建 player_daily_playtime 表，插件在会话结束时按自然日累加，周榜和月榜从这里读取
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS player_daily_playtime (
+                server_id VARCHAR(255) NOT NULL,
+                player_id INT NOT NULL,
+                day DATE NOT NULL,
+                seconds DOUBLE NOT NULL DEFAULT 0,
+                sessions INT NOT NULL DEFAULT 0,
+                PRIMARY KEY (server_id, player_id, day),
+                INDEX idx_day_player (day, player_id)
+            )
+        ''')
+        
+        # 创建 server_metric_points 表，保存服务器指标的原始点(resolution=0)和5分钟/1小时聚合
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS server_metric_points (
+                resolution INT NOT NULL,
+                server_id VARCHAR(255) NOT NULL,
+                metric VARCHAR(32) NOT NULL,
+                ts DOUBLE NOT NULL,
+                count INT NOT NULL,
+                sum DOUBLE NOT NULL,
+                min DOUBLE NOT NULL,
+                max DOUBLE NOT NULL,
+                PRIMARY KEY (resolution, server_id, metric, ts),
+                INDEX idx_resolution_ts (resolution, ts)
+            )
+        ''')
+        
         conn.commit()
         cursor.close()
+        
+        # 首次创建时用历史会话回填每日游戏时长
+        backfill_daily_playtime(conn)
         conn.close()
         
         logger.info("玩家相关数据表创建成功")
@@ -194,18 +342,25 @@ def create_player_tables():
         logger.exception(e)
         return False
 
+mysql_pool = MySQLConnectionPool(MYSQL_CONFIG, **MYSQL_POOL_CONFIG)
+
+response_cache = ResponseCache(max_entries=RESPONSE_CACHE_MAX_ENTRIES)
+
+export_slots = threading.BoundedSemaphore(EXPORT_MAX_CONCURRENT)
+
+event_broker = EventBroker(
+    history=SSE_HISTORY_SIZE,
+    heartbeat=SSE_HEARTBEAT_INTERVAL,
+    max_clients=SSE_MAX_CLIENTS
+)
+
 def get_mysql_connection():
-    """获取MySQL数据库连接"""
+    """从连接池借出MySQL数据库连接，调用close()时归还连接池"""
     try:
-        logger.info(f"尝试连接MySQL数据库: {MYSQL_CONFIG['host']}:{MYSQL_CONFIG['database']}")
-        # 添加连接超时设置
-        connection_config = MYSQL_CONFIG.copy()
-        connection_config['connection_timeout'] = 10  # 10秒连接超时
-        connection_config['autocommit'] = True
-        
-        connection = mysql.connector.connect(**connection_config)
-        logger.info("MySQL数据库连接成功")
-        return connection
+        return mysql_pool.acquire()
+    except PoolExhaustedError as e:
+        logger.error(f"MySQL连接池已耗尽: {e}")
+        return None
     except mysql.connector.Error as e:
         logger.error(f"MySQL数据库连接错误: {e}")
         logger.error(f"错误代码: {e.errno}")
@@ -271,14 +426,11 @@ def load_server_data():
 
 def save_server_data(data):
     """保存服务器数据"""
-    logger.info(f"尝试保存数据到: {DATA_FILE}")
-    logger.info(f"保存的数据: {data}")
-    logger.info(f"保存的数据类型: {type(data)}")
+    logger.info(f"尝试保存数据到: {DATA_FILE}，包含 {len(data)} 个服务器")
     
     try:
         # 验证数据是否可序列化
-        json.dumps(data, ensure_ascii=False)
-        logger.info("数据验证通过，可以序列化为JSON")
+        content = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
     except TypeError as e:
         logger.error(f"数据不可序列化为JSON: {e}")
         return False
@@ -286,27 +438,19 @@ def save_server_data(data):
     try:
         # 确保目录存在
         data_dir = os.path.dirname(DATA_FILE) if os.path.dirname(DATA_FILE) else '.'
-        logger.info(f"数据目录: {data_dir}")
         os.makedirs(data_dir, exist_ok=True)
-        logger.info("目录检查完成")
         
         # 检查目录是否可写
         if not os.access(data_dir, os.W_OK):
             logger.error(f"数据目录不可写: {data_dir}")
             return False
         
-        # 创建临时文件路径
+        # 先写入临时文件并落盘
         temp_file = DATA_FILE + '.tmp'
-        logger.info(f"使用临时文件: {temp_file}")
-        
-        # 先写入临时文件
         with open(temp_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        
-        # 检查临时文件是否创建成功
-        if not os.path.exists(temp_file):
-            logger.error("临时文件创建失败")
-            return False
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
             
         # 原子性地替换原文件
         os.replace(temp_file, DATA_FILE)
@@ -326,14 +470,142 @@ def save_server_data(data):
         logger.exception(e)  # 打印完整异常堆栈
         return False
 
+# 服务器状态常驻内存，由后台线程定期写回数据文件
+status_store = StatusStore(
+    load_server_data,
+    save_server_data,
+    stripes=STATUS_STORE_STRIPES,
+    snapshot_interval=STATUS_SNAPSHOT_INTERVAL,
+    dirty_threshold=STATUS_SNAPSHOT_DIRTY_THRESHOLD
+)
+status_store.load()
+
+# 接收的状态中的指标由后台线程写入server_metric_points表
+metric_history = MetricHistory(get_mysql_connection)
+
+def status_players(status):
+    """状态中的全部在线玩家，包括假人"""
+    players = []
+    for field in ('players', 'bots'):
+        items = status.get(field)
+        if isinstance(items, list):
+            players.extend(str(item) for item in items if item is not None)
+    return players
+
+def status_timestamp(status):
+    """状态的接收时间戳，无法解析时返回0"""
+    try:
+        return datetime.fromisoformat(status.get('last_update', '').replace('Z', '+00:00')).timestamp()
+    except (ValueError, AttributeError):
+        return 0.0
+
+# 在线玩家索引在接收上报时更新，玩家列表查询直接在内存中判断在线状态
+presence = PresenceIndex(
+    get_mysql_connection,
+    timeout=SERVER_TIMEOUT,
+    on_change=lambda server_id: response_cache.invalidate('presence')
+)
+presence.seed({
+    server_id: (status_players(status), status_timestamp(status))
+    for server_id, status in status_store.snapshot().items()
+    if isinstance(status, dict)
+})
+
+def label_online_status(rows):
+    """根据在线玩家索引填充查询结果的current_status，没有server_id的汇总行按任一服务器在线计算"""
+    for row in rows:
+        if row.get('server_id'):
+            row['current_status'] = presence.status_label(row['server_id'], row['player_name'])
+        else:
+            row['current_status'] = presence.status_label_anywhere(row['player_name'])
+    return rows
+
+def on_status_applied(server_id, status):
+    """新状态生效后更新在线玩家索引、使缓存失效并推送给面板
+
+    在线玩家变化时索引会使玩家相关的缓存失效，同时推送roster事件。
+    """
+    added, removed = presence.update(server_id, status_players(status))
+    response_cache.invalidate('servers')
+    if added or removed:
+        event_broker.publish('roster', {
+            "server_id": server_id,
+            "added": sorted(added),
+            "removed": sorted(removed)
+        })
+    event_broker.publish('status', {
+        "server_id": server_id,
+        "server": server_view(status, datetime.now())
+    })
+
+def parse_flag(value):
+    return str(value).lower() in ('1', 'true', 'yes')
+
+def fetch_player_page(cursor, args):
+    """按请求参数查询一页玩家统计，返回(本页数据, 下一页游标)，没有下一页时游标为None
+
+    支持的参数: sort(play_time/last_played)、order(desc/asc)、cursor、limit、
+    server_id、online、exclude_bots、prefix
+    """
+    sort = args.get('sort', 'play_time')
+    order = args.get('order', 'desc').lower()
+    try:
+        limit = int(args.get('limit', PLAYER_PAGE_DEFAULT))
+    except ValueError:
+        raise InvalidPlayerQueryError("limit必须是整数")
+    limit = max(1, min(limit, PLAYER_PAGE_MAX))
+    server_id = args.get('server_id') or None
+
+    online_pairs = None
+    if parse_flag(args.get('online', 'false')):
+        online_pairs = presence.online_pairs(server_id)
+        if not online_pairs:
+            return [], None
+
+    sql, params = build_player_page_query(
+        sort=sort,
+        order=order,
+        cursor=args.get('cursor'),
+        limit=limit,
+        server_id=server_id,
+        online_pairs=online_pairs,
+        exclude_prefixes=BOT_NAME_PREFIXES if parse_flag(args.get('exclude_bots', 'false')) else (),
+        name_prefix=args.get('prefix')
+    )
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort, order, rows[-1])
+    for row in rows:
+        row.pop('id', None)
+    return label_online_status(rows), next_cursor
+
+def player_page_response(rows, next_cursor):
+    """返回一页玩家数据，下一页的游标放在X-Next-Cursor响应头中"""
+    response = Result.success(rows).to_response()
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    response.headers['Access-Control-Expose-Headers'] = 'X-Next-Cursor'
+    return response
+
 @app.route('/api/server_status', methods=['POST', 'OPTIONS'])
 def receive_server_status():
-    """接收服务器状态数据"""
+    """接收服务器状态数据
+
+    校验server_id和增量序号后放入接收队列，返回202；状态由写入线程稍后应用。
+    """
     try:
-        data = request.json
-        logger.info(f"收到数据: {data}")
-        
-        if not data:
+        try:
+            data = decode_request_payload(request)
+        except UnsupportedPayloadError as e:
+            logger.error(f"无法解析上报数据: {e}")
+            response = Result.error(str(e), 415).to_response()
+            response.status_code = 415
+            return response
+        
+        if not data or not isinstance(data, dict):
             logger.error("无效的JSON数据")
             return Result.error("无效的JSON数据", 400).to_response()
             
@@ -343,32 +615,169 @@ def receive_server_status():
             logger.error(f"无效的server_id: {server_id}")
             return Result.error(f"无效的server_id: {server_id}", 400).to_response()
         
-        # 加载现有数据
-        server_data = load_server_data()
-        logger.info(f"当前服务器数据: {server_data}")
-        
-        # 清理和验证数据
-        cleaned_data = sanitize_server_data(data)
-        
-        # 更新数据
-        cleaned_data['last_update'] = datetime.now().isoformat()
-        server_data[server_id] = cleaned_data
-        logger.info(f"更新后的数据: {server_data}")
-        
-        # 保存数据
-        save_result = save_server_data(server_data)
-        if save_result:
-            logger.info(f"收到服务器 {server_id} 的状态更新并成功保存")
+        # 连接测试和上线通知不携带状态，不覆盖已有的状态数据
+        if data.get('test_connection') or data.get('action') == 'connect':
+            logger.info(f"服务器 {server_id} 连接后端: {data.get('action', 'test_connection')}")
             return Result.success().to_response()
-        else:
-            logger.error(f"收到服务器 {server_id} 的状态更新但保存失败")
-            return Result.error("数据保存失败", 500).to_response()
+        
+        try:
+            ingest_queue.submit(server_id, data)
+        except SequenceGapError as e:
+            logger.warning(f"服务器 {server_id} 的增量上报无法应用，要求重新同步: {e}")
+            return Result.error("需要完整同步", 409).to_response()
+        except IngestQueueFullError as e:
+            logger.warning(f"拒绝服务器 {server_id} 的状态上报: {e}")
+            response = Result.error("状态接收队列已满，请稍后重试", 503).to_response()
+            response.status_code = 503
+            response.headers['Retry-After'] = '5'
+            return response
+        
+        logger.debug(f"收到服务器 {server_id} 的状态上报 (type={data.get('type', 'full')}, seq={data.get('seq')})")
+        response = Result.accepted().to_response()
+        response.status_code = 202
+        return response
         
     except Exception as e:
         logger.error(f"处理状态更新时出错: {e}")
         logger.exception(e)  # 打印完整异常堆栈
         return Result.error("服务器内部错误", 500).to_response()
 
+def batch_sort_key(entry):
+    """同一服务器的状态按采样时间排序，没有时间戳的排在最后并保持请求中的顺序"""
+    index, data = entry
+    timestamp = data.get('timestamp')
+    if isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+        return 0, timestamp, index
+    return 1, 0, index
+
+def make_batch_fold(entries, results):
+    """生成在存储锁内依次应用同一服务器多条状态的函数，逐条结果写入results"""
+    def fold(current):
+        status = current
+        for index, data in entries:
+            server_id = data['server_id']
+            if data.get('type') == 'delta':
+                try:
+                    new_status = sanitize_server_data(apply_status_delta(status, data))
+                except SequenceGapError as e:
+                    results[index] = {"server_id": server_id, "code": 409, "applied": False, "message": str(e)}
+                    continue
+                metric_history.record(server_id, new_status)
+            else:
+                # 比当前状态旧的积压数据仍是有效的历史采样
+                metric_history.record(server_id, data)
+                new_status = newer_status(status, data)
+                if new_status is None:
+                    # 比当前状态旧的积压数据不覆盖实时状态
+                    results[index] = {"server_id": server_id, "code": 200, "applied": False}
+                    continue
+            new_status['last_update'] = datetime.now().isoformat()
+            status = new_status
+            results[index] = {"server_id": server_id, "code": 200, "applied": True}
+        return status if status is not current else None
+    return fold
+
+def apply_status_items(entries, by_timestamp=True):
+    """应用一批已通过基本校验的状态，entries为[(序号, 状态), ...]，返回序号 -> 结果
+
+    完整状态先逐列清理，增量在应用到当前状态后再清理。by_timestamp为True时同一服务器的状态按采样时间排序，
+    否则按序号(接收顺序)应用。所有服务器在一次存储更新中完成。
+    """
+    entries = list(entries)
+    full = [(position, data) for position, (_, data) in enumerate(entries) if data.get('type') != 'delta']
+    for (position, _), cleaned in zip(full, sanitize_server_batch([data for _, data in full])):
+        cleaned.pop('type', None)
+        entries[position] = (entries[position][0], cleaned)
+
+    by_server = {}
+    for index, data in entries:
+        by_server.setdefault(data['server_id'], []).append((index, data))
+    results = {}
+    funcs = {
+        server_id: make_batch_fold(sorted(items, key=batch_sort_key if by_timestamp else None), results)
+        for server_id, items in by_server.items()
+    }
+    for server_id, status in status_store.update_many(funcs).items():
+        if status is not None:
+            on_status_applied(server_id, status)
+    return results
+
+def apply_ingested(entries):
+    """写入线程应用接收队列中合并后的状态"""
+    results = apply_status_items(entries, by_timestamp=False)
+    for result in results.values():
+        if result["code"] == 409:
+            # 入队时的序号判断与存储中的状态不一致，下一次增量将返回409要求重新同步
+            ingest_queue.forget_seq(result["server_id"])
+    logger.debug(f"应用了 {len(entries)} 条排队的状态数据")
+
+def stored_seq(server_id):
+    status = status_store.get(server_id)
+    return status.get('seq') if status is not None else None
+
+# 单条上报只做轻量校验后入队，由写入线程合并同一服务器的状态后应用
+ingest_queue = IngestQueue(apply_ingested, stored_seq, max_pending=INGEST_QUEUE_MAX_PENDING)
+
+@app.route('/api/server_status/batch', methods=['POST', 'OPTIONS'])
+def receive_server_status_batch():
+    """批量接收多个服务器、多个时间点的状态数据
+
+    请求体为状态数组(JSON/MessagePack)或每行一条的NDJSON。完整状态先按字段逐列清理，
+    同一服务器的状态按采样时间顺序应用，所有服务器在一次存储更新中完成。
+    返回与请求顺序一一对应的逐条结果。
+    """
+    try:
+        try:
+            items = decode_batch_payload(request)
+        except UnsupportedPayloadError as e:
+            logger.error(f"无法解析批量上报数据: {e}")
+            response = Result.error(str(e), 415).to_response()
+            response.status_code = 415
+            return response
+        if items is None:
+            logger.error("无效的批量上报数据")
+            return Result.error("请求体必须是状态数组或NDJSON", 400).to_response()
+        if len(items) > STATUS_BATCH_MAX_ITEMS:
+            response = Result.error(f"每次最多上报 {STATUS_BATCH_MAX_ITEMS} 条状态", 413).to_response()
+            response.status_code = 413
+            return response
+
+        results = [None] * len(items)
+        snapshots = []
+        for index, data in enumerate(items):
+            if not isinstance(data, dict) or not data:
+                results[index] = {"server_id": None, "code": 400, "applied": False, "message": "无效的状态数据"}
+                continue
+            server_id = data.get('server_id')
+            if not is_valid_server_id(server_id):
+                results[index] = {"server_id": None, "code": 400, "applied": False, "message": f"无效的server_id: {server_id}"}
+                continue
+            if data.get('test_connection') or data.get('action') == 'connect':
+                results[index] = {"server_id": server_id, "code": 200, "applied": False}
+                continue
+            snapshots.append((index, data))
+
+        for index, result in apply_status_items(snapshots).items():
+            results[index] = result
+        server_count = len({data['server_id'] for _, data in snapshots})
+
+        applied = sum(1 for result in results if result["applied"])
+        logger.info(f"批量接收 {len(items)} 条状态数据 ({server_count} 个服务器)，应用 {applied} 条")
+        return Result.success({"applied": applied, "results": results}).to_response()
+    except Exception as e:
+        logger.error(f"处理批量状态更新时出错: {e}")
+        logger.exception(e)
+        return Result.error("服务器内部错误", 500).to_response()
+
+@app.after_request
+def advertise_payload_support(response):
+    """在上报接口的响应头中声明支持的压缩、编码方式和增量上报，插件据此选择紧凑的上报格式"""
+    if request.path.startswith('/api/server_status'):
+        response.headers['Accept-Encoding'] = 'gzip'
+        response.headers['Accept-Post'] = ', '.join(accepted_content_types())
+        response.headers['X-Status-Delta'] = '1'
+    return response
+
 @app.route('/')
 def dashboard():
     """服务器状态面板"""
@@ -404,8 +813,37 @@ def handle_options():
         response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
         return response
 
+def server_view(data, current_time):
+    """清理单个服务器的状态，并根据最后更新时间判断服务器是否在线"""
+    cleaned = sanitize_server_data(data)
+    last_update_str = cleaned.get('last_update')
+    if last_update_str:
+        try:
+            last_update = datetime.fromisoformat(last_update_str.replace('Z', '+00:00'))
+            # 如果距离上次更新超过SERVER_TIMEOUT秒，则认为服务器离线
+            if current_time - last_update > timedelta(seconds=SERVER_TIMEOUT):
+                cleaned['status'] = 'offline'
+            else:
+                cleaned['status'] = 'online'
+        except ValueError:
+            # 如果日期格式不正确，假设服务器离线
+            cleaned['status'] = 'offline'
+    else:
+        cleaned['status'] = 'offline'
+    return cleaned
+
+def servers_view():
+    """所有服务器的状态，过滤掉无效的服务器ID"""
+    current_time = datetime.now()
+    return {
+        server_id: server_view(data, current_time)
+        for server_id, data in status_store.snapshot().items()
+        if is_valid_server_id(server_id)
+    }
+
 # 确保所有API路由都支持OPTIONS方法
 @app.route('/api/servers', methods=['GET', 'OPTIONS'])
+@response_cache.cached(RESPONSE_CACHE_TTL['servers'], tags=('servers',))
 def api_servers():
 
     """API接口获取所有服务器状态"""
@@ -417,33 +855,7 @@ def api_servers():
         logger.info(f"请求路径: {request.path}")
         logger.info(f"完整URL: {request.url}")
         
-        server_data = load_server_data()
-        logger.info(f"从文件加载的原始服务器数据: {server_data}")
-        
-        # 对返回的数据也进行清理，确保格式正确
-        cleaned_data = {}
-        current_time = datetime.now()
-        
-        for server_id, data in server_data.items():
-            # 过滤掉无效的服务器ID
-            if is_valid_server_id(server_id):
-                cleaned_data[server_id] = sanitize_server_data(data)
-                
-                # 检查服务器是否在线
-                last_update_str = cleaned_data[server_id].get('last_update')
-                if last_update_str:
-                    try:
-                        last_update = datetime.fromisoformat(last_update_str.replace('Z', '+00:00'))
-                        # 如果距离上次更新超过SERVER_TIMEOUT秒，则认为服务器离线
-                        if current_time - last_update > timedelta(seconds=SERVER_TIMEOUT):
-                            cleaned_data[server_id]['status'] = 'offline'
-                        else:
-                            cleaned_data[server_id]['status'] = 'online'
-                    except ValueError:
-                        # 如果日期格式不正确，假设服务器离线
-                        cleaned_data[server_id]['status'] = 'offline'
-                else:
-                    cleaned_data[server_id]['status'] = 'offline'
+        cleaned_data = servers_view()
         
         logger.info(f"处理后的服务器数据: {cleaned_data}")
         response = Result.success(cleaned_data).to_response()
@@ -459,12 +871,62 @@ def api_servers():
         response.headers['Access-Control-Allow-Origin'] = '*'
         return response
 
+def fetch_player_summaries(cursor):
+    """用一条分组查询汇总每个服务器的玩家统计，返回server_id -> 汇总"""
+    cursor.execute('''
+        SELECT
+            server_id,
+            COUNT(*) as tracked_players,
+            COALESCE(SUM(total_play_time), 0) as total_play_time,
+            COALESCE(SUM(total_sessions), 0) as total_sessions,
+            MAX(last_play_time) as last_play_time
+        FROM player_stats
+        GROUP BY server_id
+    ''')
+    summaries = {}
+    for row in cursor.fetchall():
+        server_id = row.pop('server_id')
+        row['total_play_time'] = float(row['total_play_time'])
+        row['total_sessions'] = int(row['total_sessions'])
+        row['total_play_time_formatted'] = format_duration(row['total_play_time'])
+        summaries[server_id] = row
+    return summaries
+
+@app.route('/api/dashboard', methods=['GET', 'OPTIONS'])
+@response_cache.cached(RESPONSE_CACHE_TTL['dashboard'], tags=('servers', 'presence'))
+def api_dashboard():
+    """面板首页一次请求所需的全部数据
+
+    servers与/api/servers的data相同，player_summaries为每个服务器的玩家统计汇总。
+    数据库不可用时player_summaries为null，服务器状态照常返回。
+    """
+    try:
+        servers = servers_view()
+        summaries = None
+        conn = get_mysql_connection()
+        if conn is None:
+            logger.error("无法连接到MySQL数据库，面板数据不含玩家统计")
+        else:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                summaries = fetch_player_summaries(cursor)
+            finally:
+                cursor.close()
+                conn.close()
+        if summaries is not None:
+            summaries = {server_id: summaries.get(server_id) for server_id in servers}
+        return Result.success({"servers": servers, "player_summaries": summaries}).to_response()
+    except Exception as e:
+        logger.error(f"获取面板数据时出错: {e}")
+        logger.exception(e)
+        return Result.error("服务器内部错误", 500).to_response()
+
 # 添加获取玩家列表的API端点
 @app.route('/api/players')
 def api_players():
-    """API接口获取所有玩家列表"""
+    """API接口分页获取玩家列表，参数见fetch_player_page"""
     try:
-        logger.info("API玩家列表请求")
+        logger.info(f"API玩家列表请求: {dict(request.args)}")
         
         # 连接数据库并获取玩家统计数据
         conn = get_mysql_connection()
@@ -473,65 +935,17 @@ def api_players():
             return Result.error("无法连接到数据库", 500).to_response()
             
         cursor = conn.cursor(dictionary=True)
+        try:
+            players_data, next_cursor = fetch_player_page(cursor, request.args)
+        finally:
+            # 关闭数据库连接
+            cursor.close()
+            conn.close()
         
-        # 如果提供了server_id参数，则只返回该服务器的玩家数据
-        server_id = request.args.get('server_id')
-        
-        if server_id:
-            logger.info(f"查询特定服务器玩家数据: {server_id}")
-            cursor.execute('''
-                SELECT
-                    player_name,
-                    server_id,
-                    server_name,
-                    total_play_time,
-                    total_sessions,
-                    last_play_time,
-                    CASE
-                        WHEN EXISTS (
-                            SELECT 1 FROM player_sessions
-                            WHERE player_sessions.server_id = player_stats.server_id
-                            AND player_sessions.player_name = player_stats.player_name
-                            AND logout_time IS NULL
-                        ) THEN '在线'
-                        ELSE '离线'
-                    END as current_status
-                FROM player_stats
-                WHERE server_id = %s
-                ORDER BY total_play_time DESC
-            ''', (server_id,))
-        else:
-            # 返回所有服务器的玩家数据，按玩家名和服务器分组
-            logger.info("查询所有服务器玩家数据")
-            cursor.execute('''
-                SELECT
-                    player_name,
-                    server_id,
-                    server_name,
-                    total_play_time,
-                    total_sessions,
-                    last_play_time,
-                    CASE
-                        WHEN EXISTS (
-                            SELECT 1 FROM player_sessions
-                            WHERE player_sessions.server_id = player_stats.server_id
-                            AND player_sessions.player_name = player_stats.player_name
-                            AND logout_time IS NULL
-                        ) THEN '在线'
-                        ELSE '离线'
-                    END as current_status
-                FROM player_stats
-                ORDER BY total_play_time DESC
-            ''')
-        
-        players_data = cursor.fetchall()
-        logger.info(f"查询到的玩家数据: {players_data}")
-        
-        # 关闭数据库连接
-        cursor.close()
-        conn.close()
-        
-        return Result.success(players_data).to_response()
+        logger.info(f"返回 {len(players_data)} 条玩家数据")
+        return player_page_response(players_data, next_cursor)
+    except InvalidPlayerQueryError as e:
+        return Result.error(str(e), 400).to_response()
     except Exception as e:
         logger.error(f"获取玩家列表时出错: {e}")
         logger.exception(e)
@@ -655,22 +1069,13 @@ def api_server_players(server_id):
                 server_name,
                 total_play_time,
                 total_sessions,
-                last_play_time,
-                CASE
-                    WHEN EXISTS (
-                        SELECT 1 FROM player_sessions
-                        WHERE player_sessions.server_id = player_stats.server_id
-                        AND player_sessions.player_name = player_stats.player_name
-                        AND logout_time IS NULL
-                    ) THEN '在线'
-                    ELSE '离线'
-                END as current_status
+                last_play_time
             FROM player_stats
             WHERE server_id = %s
             ORDER BY total_play_time DESC
         ''', (server_id,))
         
-        players_data = cursor.fetchall()
+        players_data = label_online_status(cursor.fetchall())
         
         # 关闭数据库连接
         cursor.close()
@@ -683,6 +1088,251 @@ def api_server_players(server_id):
         logger.exception(e)
         return Result.error("服务器内部错误", 500).to_response()
 
+def parse_history_time(value, default):
+    """解析Unix时间戳或ISO格式的时间"""
+    if value is None or value == '':
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        raise InvalidHistoryQueryError(f"无效的时间: {value}")
+
+@app.route('/api/servers/<server_id>/history')
+@response_cache.cached(RESPONSE_CACHE_TTL['history'])
+def api_server_history(server_id):
+    """API接口获取服务器指标的历史
+
+    参数: metric(memory_usage/player_count/uptime)、from和to(Unix时间戳或ISO时间，默认最近24小时)、
+    step(分组秒数，默认把时间范围分为HISTORY_DEFAULT_POINTS组)。按step选择最省的存储层级。
+    """
+    try:
+        if not is_valid_server_id(server_id):
+            return Result.error(f"无效的server_id: {server_id}", 400).to_response()
+        end = parse_history_time(request.args.get('to'), time.time())
+        start = parse_history_time(request.args.get('from'), end - 86400)
+        try:
+            step = float(request.args.get('step') or (end - start) / HISTORY_DEFAULT_POINTS)
+        except ValueError:
+            raise InvalidHistoryQueryError("step必须是数字")
+        metric = request.args.get('metric', 'memory_usage')
+        
+        conn = get_mysql_connection()
+        if conn is None:
+            logger.error("无法连接到MySQL数据库")
+            return Result.error("无法连接到数据库", 500).to_response()
+        cursor = conn.cursor()
+        try:
+            resolution, step, points = metric_history.query(
+                cursor, server_id, metric, start, end, step, max_points=HISTORY_MAX_POINTS
+            )
+        finally:
+            cursor.close()
+            conn.close()
+        
+        return Result.success({
+            "server_id": server_id,
+            "metric": metric,
+            "from": start,
+            "to": end,
+            "step": step,
+            "resolution": resolution,
+            "points": points
+        }).to_response()
+    except InvalidHistoryQueryError as e:
+        return Result.error(str(e), 400).to_response()
+    except Exception as e:
+        logger.error(f"获取服务器 {server_id} 指标历史时出错: {e}")
+        logger.exception(e)
+        return Result.error("服务器内部错误", 500).to_response()
+
+def load_server_sessions(server_id, start, end, exclude_bots):
+    """用非缓冲游标把服务器在[start, end)内的会话读入numpy数组"""
+    conn = get_mysql_connection()
+    if conn is None:
+        logger.error("无法连接到MySQL数据库")
+        return None
+    cursor = conn.cursor()
+    try:
+        return analytics.load_sessions(
+            cursor, server_id, start, end,
+            exclude_prefixes=BOT_NAME_PREFIXES if exclude_bots else ()
+        )
+    finally:
+        cursor.close()
+        conn.close()
+
+@app.route('/api/servers/<server_id>/concurrency')
+@response_cache.cached(RESPONSE_CACHE_TTL['analytics'])
+def api_server_concurrency(server_id):
+    """API接口获取服务器的同时在线人数曲线
+
+    参数: from和to(Unix时间戳或ISO时间，默认最近24小时)、step(分组秒数)、exclude_bots。
+    每组返回平均和最高在线人数，并给出整个区间的峰值。
+    """
+    try:
+        analytics.require_numpy()
+        if not is_valid_server_id(server_id):
+            return Result.error(f"无效的server_id: {server_id}", 400).to_response()
+        end = parse_history_time(request.args.get('to'), time.time())
+        start = parse_history_time(request.args.get('from'), end - CONCURRENCY_DEFAULT_SPAN)
+        if end <= start:
+            raise InvalidAnalyticsQueryError("to必须大于from")
+        try:
+            step = float(request.args.get('step') or (end - start) / HISTORY_DEFAULT_POINTS)
+        except ValueError:
+            raise InvalidAnalyticsQueryError("step必须是数字")
+        if step <= 0:
+            raise InvalidAnalyticsQueryError("step必须大于0")
+        step = max(step, (end - start) / CONCURRENCY_MAX_POINTS)
+        
+        sessions = load_server_sessions(server_id, start, end, parse_flag(request.args.get('exclude_bots', 'false')))
+        if sessions is None:
+            return Result.error("无法连接到数据库", 500).to_response()
+        report = analytics.concurrency_report(*sessions, start, end, step)
+        report.update({"server_id": server_id, "from": start, "to": end, "step": step})
+        return Result.success(report).to_response()
+    except (InvalidHistoryQueryError, InvalidAnalyticsQueryError) as e:
+        return Result.error(str(e), 400).to_response()
+    except AnalyticsUnavailableError as e:
+        return Result.error(str(e), 501).to_response()
+    except Exception as e:
+        logger.error(f"计算服务器 {server_id} 在线人数曲线时出错: {e}")
+        logger.exception(e)
+        return Result.error("服务器内部错误", 500).to_response()
+
+@app.route('/api/servers/<server_id>/heatmap')
+@response_cache.cached(RESPONSE_CACHE_TTL['analytics'])
+def api_server_heatmap(server_id):
+    """API接口获取服务器每周各小时的在线人数热力图
+
+    参数: from和to(默认最近HEATMAP_DEFAULT_DAYS天)、tz(相对UTC的分钟数，默认为后端所在时区)、exclude_bots。
+    average和peak为7x24的数组，第一行为周一，第一列为0点。
+    """
+    try:
+        analytics.require_numpy()
+        if not is_valid_server_id(server_id):
+            return Result.error(f"无效的server_id: {server_id}", 400).to_response()
+        end = parse_history_time(request.args.get('to'), time.time())
+        start = parse_history_time(request.args.get('from'), end - HEATMAP_DEFAULT_DAYS * 86400)
+        if end <= start:
+            raise InvalidAnalyticsQueryError("to必须大于from")
+        if end - start > HEATMAP_MAX_DAYS * 86400:
+            raise InvalidAnalyticsQueryError(f"时间范围不能超过 {HEATMAP_MAX_DAYS} 天")
+        tz = request.args.get('tz')
+        try:
+            utc_offset = int(tz) * 60 if tz else analytics.local_utc_offset(end)
+        except ValueError:
+            raise InvalidAnalyticsQueryError("tz必须是整数分钟")
+        
+        sessions = load_server_sessions(server_id, start, end, parse_flag(request.args.get('exclude_bots', 'false')))
+        if sessions is None:
+            return Result.error("无法连接到数据库", 500).to_response()
+        average, peak = analytics.hour_of_week_heatmap(*sessions, start, end, utc_offset)
+        return Result.success({
+            "server_id": server_id,
+            "from": start,
+            "to": end,
+            "tz": utc_offset // 60,
+            "sessions": int(len(sessions[0])),
+            "average": [[round(float(value), 3) for value in row] for row in average],
+            "peak": peak.tolist()
+        }).to_response()
+    except (InvalidHistoryQueryError, InvalidAnalyticsQueryError) as e:
+        return Result.error(str(e), 400).to_response()
+    except AnalyticsUnavailableError as e:
+        return Result.error(str(e), 501).to_response()
+    except Exception as e:
+        logger.error(f"计算服务器 {server_id} 在线热力图时出错: {e}")
+        logger.exception(e)
+        return Result.error("服务器内部错误", 500).to_response()
+
+def export_response(name, build_query, columns):
+    """用非缓冲游标执行导出查询，返回边读边写的NDJSON或CSV流式响应
+
+    参数: format(ndjson/csv，默认ndjson)、server_id、player、from和to(Unix时间戳或ISO时间)。
+    """
+    fmt = request.args.get('format', 'ndjson').lower()
+    if fmt not in EXPORT_FORMATS:
+        raise InvalidExportQueryError(f"不支持的导出格式: {fmt}")
+    server_id = request.args.get('server_id') or None
+    if server_id is not None and not is_valid_server_id(server_id):
+        raise InvalidExportQueryError(f"无效的server_id: {server_id}")
+    start = parse_history_time(request.args.get('from'), None)
+    end = parse_history_time(request.args.get('to'), None)
+    sql, params = build_query(server_id, request.args.get('player') or None, start, end)
+
+    if not export_slots.acquire(blocking=False):
+        response = Result.error("同时进行的导出过多，请稍后重试", 503).to_response()
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    conn = get_mysql_connection()
+    if conn is None:
+        export_slots.release()
+        logger.error("无法连接到MySQL数据库")
+        return Result.error("无法连接到数据库", 500).to_response()
+    cursor = conn.cursor()
+    try:
+        # 客户端读取较慢时MySQL会在net_write_timeout后断开，导出时放宽，结束后恢复原值再归还连接池
+        cursor.execute('SELECT @@SESSION.net_write_timeout')
+        (net_write_timeout,), = cursor.fetchall()
+        cursor.execute('SET SESSION net_write_timeout = %s', (EXPORT_NET_WRITE_TIMEOUT,))
+        cursor.execute(sql, params)
+    except Exception:
+        cursor.close()
+        # 会话变量可能已被修改，不放回连接池
+        conn.discard()
+        export_slots.release()
+        raise
+    
+    logger.info(f"开始导出{name}: {dict(request.args)}")
+    stream = ExportStream(
+        conn, cursor, columns, fmt,
+        release=export_slots.release,
+        restore=('SET SESSION net_write_timeout = %s', (net_write_timeout,))
+    )
+    
+    def finish():
+        stream.close()
+        logger.info(f"导出{name}结束，共 {stream.rows} 行")
+    
+    content_type, extension = EXPORT_FORMATS[fmt]
+    response = Response(stream_with_context(iter(stream)), content_type=content_type)
+    response.call_on_close(finish)
+    filename = f"{name}-{datetime.now().strftime('%Y%m%d%H%M%S')}.{extension}"
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/export/sessions')
+def api_export_sessions():
+    """流式导出玩家会话记录，按加入时间排序，from/to筛选加入时间"""
+    try:
+        return export_response('sessions', sessions_export_query, SESSION_EXPORT_COLUMNS)
+    except (InvalidExportQueryError, InvalidHistoryQueryError) as e:
+        return Result.error(str(e), 400).to_response()
+    except Exception as e:
+        logger.error(f"导出会话记录时出错: {e}")
+        logger.exception(e)
+        return Result.error("服务器内部错误", 500).to_response()
+
+@app.route('/api/export/stats')
+def api_export_stats():
+    """流式导出玩家统计，from/to筛选最后游戏时间"""
+    try:
+        return export_response('stats', stats_export_query, STATS_EXPORT_COLUMNS)
+    except (InvalidExportQueryError, InvalidHistoryQueryError) as e:
+        return Result.error(str(e), 400).to_response()
+    except Exception as e:
+        logger.error(f"导出玩家统计时出错: {e}")
+        logger.exception(e)
+        return Result.error("服务器内部错误", 500).to_response()
+
 def format_duration(seconds):
     """格式化持续时间"""
     if seconds is None:
@@ -701,8 +1351,9 @@ def format_duration(seconds):
 
 # 添加获取玩家列表（包含距离上次游戏时间）的API端点
 @app.route('/api/players_with_last_played')
+@response_cache.cached(RESPONSE_CACHE_TTL['players'], tags=('presence',))
 def api_players_with_last_played():
-    """API接口获取所有玩家列表，包含距离上次游戏时间"""
+    """API接口分页获取玩家列表，包含距离上次游戏时间，参数见fetch_player_page"""
     try:
         logger.info("API玩家列表请求（包含距离上次游戏时间）")
         logger.info(f"请求方法: {request.method}")
@@ -718,57 +1369,12 @@ def api_players_with_last_played():
             
         cursor = conn.cursor(dictionary=True)
         
-        # 如果提供了server_id参数，则只返回该服务器的玩家数据
-        server_id = request.args.get('server_id')
-        
-        if server_id:
-            logger.info(f"查询特定服务器玩家数据: {server_id}")
-            cursor.execute('''
-                SELECT
-                    player_name,
-                    server_id,
-                    server_name,
-                    total_play_time,
-                    total_sessions,
-                    last_play_time,
-                    CASE
-                        WHEN EXISTS (
-                            SELECT 1 FROM player_sessions
-                            WHERE player_sessions.server_id = player_stats.server_id
-                            AND player_sessions.player_name = player_stats.player_name
-                            AND logout_time IS NULL
-                        ) THEN '在线'
-                        ELSE '离线'
-                    END as current_status
-                FROM player_stats
-                WHERE server_id = %s
-                ORDER BY total_play_time DESC
-            ''', (server_id,))
-        else:
-            # 返回所有服务器的玩家数据，按玩家名和服务器分组
-            logger.info("查询所有服务器玩家数据")
-            cursor.execute('''
-                SELECT
-                    player_name,
-                    server_id,
-                    server_name,
-                    total_play_time,
-                    total_sessions,
-                    last_play_time,
-                    CASE
-                        WHEN EXISTS (
-                            SELECT 1 FROM player_sessions
-                            WHERE player_sessions.server_id = player_stats.server_id
-                            AND player_sessions.player_name = player_stats.player_name
-                            AND logout_time IS NULL
-                        ) THEN '在线'
-                        ELSE '离线'
-                    END as current_status
-                FROM player_stats
-                ORDER BY total_play_time DESC
-            ''')
-        
-        rows = cursor.fetchall()
+        try:
+            rows, next_cursor = fetch_player_page(cursor, request.args)
+        finally:
+            # 关闭数据库连接
+            cursor.close()
+            conn.close()
         players_data = []
         
         # 获取当前时间
@@ -802,13 +1408,11 @@ def api_players_with_last_played():
             
             players_data.append(player_dict)
         
-        # 关闭数据库连接
-        cursor.close()
-        conn.close()
+        logger.info(f"返回 {len(players_data)} 条玩家数据")
         
-        logger.info(f"查询到的玩家数据: {players_data}")
-        
-        return Result.success(players_data).to_response()
+        return player_page_response(players_data, next_cursor)
+    except InvalidPlayerQueryError as e:
+        return Result.error(str(e), 400).to_response()
     except Exception as e:
         logger.error(f"获取玩家列表时出错: {e}")
         logger.exception(e)
@@ -816,6 +1420,7 @@ def api_players_with_last_played():
 
 # 添加获取距离上次游戏时间最长的前10位玩家的API端点
 @app.route('/api/players/leaderboard')
+@response_cache.cached(RESPONSE_CACHE_TTL['leaderboard'], tags=('presence',))
 def api_players_leaderboard():
     """API接口获取距离上次游戏时间最长的前10位玩家"""
     try:
@@ -846,16 +1451,7 @@ def api_players_leaderboard():
                     server_name,
                     total_play_time,
                     total_sessions,
-                    last_play_time,
-                    CASE
-                        WHEN EXISTS (
-                            SELECT 1 FROM player_sessions
-                            WHERE player_sessions.server_id = player_stats.server_id
-                            AND player_sessions.player_name = player_stats.player_name
-                            AND leave_time IS NULL
-                        ) THEN '在线'
-                        ELSE '离线'
-                    END as current_status
+                    last_play_time
                 FROM player_stats
                 WHERE server_id = %s AND last_play_time IS NOT NULL
             '''
@@ -879,15 +1475,7 @@ def api_players_leaderboard():
                         GROUP_CONCAT(DISTINCT server_name SEPARATOR ', ') as server_names,
                         SUM(total_play_time) as total_play_time,
                         SUM(total_sessions) as total_sessions,
-                        MAX(last_play_time) as last_play_time,
-                        CASE
-                            WHEN EXISTS (
-                                SELECT 1 FROM player_sessions
-                                WHERE player_sessions.player_name = ps_agg.player_name
-                                AND leave_time IS NULL
-                            ) THEN '在线'
-                            ELSE '离线'
-                        END as current_status
+                        MAX(last_play_time) as last_play_time
                     FROM (
                         SELECT 
                             player_name,
@@ -912,15 +1500,7 @@ def api_players_leaderboard():
                         GROUP_CONCAT(DISTINCT server_name SEPARATOR ', ') as server_names,
                         SUM(total_play_time) as total_play_time,
                         SUM(total_sessions) as total_sessions,
-                        MAX(last_play_time) as last_play_time,
-                        CASE
-                            WHEN EXISTS (
-                                SELECT 1 FROM player_sessions
-                                WHERE player_sessions.player_name = ps_agg.player_name
-                                AND leave_time IS NULL
-                            ) THEN '在线'
-                            ELSE '离线'
-                        END as current_status
+                        MAX(last_play_time) as last_play_time
                     FROM (
                         SELECT 
                             player_name,
@@ -936,7 +1516,7 @@ def api_players_leaderboard():
                     LIMIT 10
                 ''')
         
-        rows = cursor.fetchall()
+        rows = label_online_status(cursor.fetchall())
         players_data = []
         
         # 获取当前时间
@@ -992,6 +1572,7 @@ def api_players_leaderboard():
         return response
 # 添加获取游戏时长周榜的API端点
 @app.route('/api/players/leaderboard/weekly')
+@response_cache.cached(RESPONSE_CACHE_TTL['leaderboard_period'], tags=('presence',))
 def api_players_weekly_leaderboard():
     """API接口获取游戏时长周榜前10位玩家"""
     try:
@@ -1005,34 +1586,19 @@ def api_players_weekly_leaderboard():
             
         cursor = conn.cursor(dictionary=True)
         
-        # 计算一周前的时间
-        one_week_ago = datetime.now() - timedelta(days=7)
+        # 最近7个自然日（含今天）的时长从每日游戏时长汇总表读取
+        since_day = (datetime.now() - timedelta(days=6)).date()
+        filter_bots = request.args.get('filter_bots', 'false').lower() == 'true'
         
-        # 查询一周内游戏时长最多的玩家，按玩家名分组并汇总所有服务器的时长
-        logger.info("查询游戏时长周榜")
-        cursor.execute('''
-            SELECT
-                ps.player_name,
-                SUM(ps.play_duration) as weekly_play_time,
-                MAX(ps.join_time) as last_play_time,
-                CASE
-                    WHEN EXISTS (
-                        SELECT 1 FROM player_sessions
-                        WHERE player_sessions.player_name = ps.player_name
-                        AND leave_time IS NULL
-                    ) THEN '在线'
-                    ELSE '离线'
-                END as current_status,
-                COALESCE(SUM(stats.total_play_time), 0) as total_play_time
-            FROM player_sessions ps
-            JOIN player_stats stats ON ps.player_name = stats.player_name AND ps.server_id = stats.server_id
-            WHERE ps.join_time >= %s
-            GROUP BY ps.player_name
-            ORDER BY weekly_play_time DESC
-            LIMIT 10
-        ''', (one_week_ago,))
-        
-        rows = cursor.fetchall()
+        logger.info(f"查询游戏时长周榜，起始日期: {since_day}")
+        sql, params = period_leaderboard_query(
+            'weekly_play_time',
+            since_day,
+            exclude_prefixes=BOT_NAME_PREFIXES if filter_bots else ()
+        )
+        cursor.execute(sql, params)
+        
+        rows = label_online_status(cursor.fetchall())
         players_data = []
         
         for row in rows:
@@ -1055,6 +1621,7 @@ def api_players_weekly_leaderboard():
 
 # 添加获取游戏时长月榜的API端点
 @app.route('/api/players/leaderboard/monthly')
+@response_cache.cached(RESPONSE_CACHE_TTL['leaderboard_period'], tags=('presence',))
 def api_players_monthly_leaderboard():
     """API接口获取游戏时长月榜前10位玩家"""
     try:
@@ -1068,35 +1635,19 @@ def api_players_monthly_leaderboard():
             
         cursor = conn.cursor(dictionary=True)
         
-        # 计算一个月前的时间
-        one_month_ago = datetime.now() - timedelta(days=30)
+        # 最近30个自然日（含今天）的时长从每日游戏时长汇总表读取
+        since_day = (datetime.now() - timedelta(days=29)).date()
+        filter_bots = request.args.get('filter_bots', 'false').lower() == 'true'
         
-        # 查询一个月内游戏时长最多的玩家，按玩家名分组并汇总所有服务器的时长
-        logger.info("查询游戏时长月榜")
-        logger.info(f"一个月前的时间: {one_month_ago}")
-        cursor.execute('''
-            SELECT
-                ps.player_name,
-                SUM(ps.play_duration) as monthly_play_time,
-                MAX(ps.join_time) as last_play_time,
-                CASE
-                    WHEN EXISTS (
-                        SELECT 1 FROM player_sessions
-                        WHERE player_sessions.player_name = ps.player_name
-                        AND leave_time IS NULL
-                    ) THEN '在线'
-                    ELSE '离线'
-                END as current_status,
-                COALESCE(SUM(stats.total_play_time), 0) as total_play_time
-            FROM player_sessions ps
-            JOIN player_stats stats ON ps.player_name = stats.player_name AND ps.server_id = stats.server_id
-            WHERE ps.join_time >= %s
-            GROUP BY ps.player_name
-            ORDER BY monthly_play_time DESC
-            LIMIT 10
-        ''', (one_month_ago,))
-        
-        rows = cursor.fetchall()
+        logger.info(f"查询游戏时长月榜，起始日期: {since_day}")
+        sql, params = period_leaderboard_query(
+            'monthly_play_time',
+            since_day,
+            exclude_prefixes=BOT_NAME_PREFIXES if filter_bots else ()
+        )
+        cursor.execute(sql, params)
+        
+        rows = label_online_status(cursor.fetchall())
         logger.info(f"月榜查询结果原始数据: {rows}")
         players_data = []
         
@@ -1143,6 +1694,54 @@ def health_check():
     return Result.success({"status": "success", "message": "API正常工作"}).to_response()
 
 
+@app.route('/api/stream')
+def api_stream():
+    """服务器状态的事件流(SSE)
+
+    连接时先发送snapshot事件(与/api/servers的data相同)，之后推送status(单个服务器的新状态)
+    和roster(在线玩家的增减)事件。断线重连时浏览器携带Last-Event-ID，能续传时只补发错过的事件。
+    """
+    try:
+        stream = event_broker.stream(request.headers.get('Last-Event-ID'), servers_view)
+    except TooManyClientsError as e:
+        logger.warning(str(e))
+        response = Result.error("事件流连接数已达上限", 503).to_response()
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    response = Response(stream_with_context(stream), mimetype='text/event-stream')
+    # 响应在开始发送之前被丢弃时生成器不会执行，由close()归还连接名额
+    response.call_on_close(stream.close)
+    response.headers['Cache-Control'] = 'no-cache'
+    # 禁止Nginx缓冲事件流
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@app.route('/api/stats/db_pool', methods=['GET', 'OPTIONS'])
+def api_db_pool_stats():
+    """MySQL连接池使用情况"""
+    return Result.success(mysql_pool.stats()).to_response()
+
+
+@app.route('/api/stats/ingest_queue', methods=['GET', 'OPTIONS'])
+def api_ingest_queue_stats():
+    """状态接收队列的积压和合并情况"""
+    return Result.success(ingest_queue.stats()).to_response()
+
+
+@app.route('/api/stats/metric_history', methods=['GET', 'OPTIONS'])
+def api_metric_history_stats():
+    """指标历史尚未写入数据库的点数和因积压过多丢弃的点数"""
+    return Result.success(metric_history.stats()).to_response()
+
+
+@app.route('/api/stats/response_cache', methods=['GET', 'OPTIONS'])
+def api_response_cache_stats():
+    """响应缓存命中情况"""
+    return Result.success(response_cache.stats()).to_response()
+
+
 # 添加一个捕获所有未匹配路由的处理函数，用于调试
 @app.errorhandler(404)
 def not_found(error):
@@ -1151,16 +1750,37 @@ def not_found(error):
     logger.info(f"请求方法: {request.method}")
     return "页面未找到", 404
 
+def start_background_workers():
+    """启动状态写回、指标历史、在线索引和接收队列的后台线程"""
+    status_store.start()
+    metric_history.start()
+    presence.start()
+    ingest_queue.start()
+
+def is_serving_process():
+    """当前进程是否处理请求
+
+    调试模式下Werkzeug的重载器先启动一个只监视文件变化的父进程，再以WERKZEUG_RUN_MAIN=true启动处理请求的子进程，
+    后台线程只在子进程中运行，避免两个进程同时写数据文件和数据库。被WSGI服务器导入时总是处理请求。
+    """
+    if __name__ != '__main__' or not APP_DEBUG:
+        return True
+    return os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+
+if is_serving_process():
+    start_background_workers()
+
 if __name__ == '__main__':
     logger.info("启动服务器状态Web服务器...")
     logger.info(f"当前工作目录: {os.getcwd()}")
     logger.info(f"BASE_DIR: {BASE_DIR}")
     logger.info(f"DATA_FILE: {DATA_FILE}")
     
-    # 创建玩家相关数据表
-    if create_player_tables():
-        logger.info("玩家相关数据表已准备就绪")
-    else:
-        logger.error("创建玩家相关数据表失败")
+    # 创建玩家相关数据表，重载器的父进程不处理请求，也不重复建表和回填
+    if is_serving_process():
+        if create_player_tables():
+            logger.info("玩家相关数据表已准备就绪")
+        else:
+            logger.error("创建玩家相关数据表失败")
     
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app.run(host='0.0.0.0', port=5000, debug=APP_DEBUG)
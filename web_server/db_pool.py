@@ -0,0 +1,205 @@
+import logging
+import threading
+import time
+
+import mysql.connector
+
+logger = logging.getLogger(__name__)
+
+
+class PoolExhaustedError(Exception):
+    """在等待超时内没有可借出的连接"""
+
+
+class PooledConnection:
+    """从连接池借出的连接，close()时归还连接池而不是断开"""
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._returned = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def close(self):
+        """归还连接，重复调用无副作用"""
+        if not self._returned:
+            self._returned = True
+            self._pool._release(self._raw, self._created_at)
+
+    def discard(self):
+        """断开连接而不放回连接池，用于会话状态已被修改且无法恢复的连接"""
+        if not self._returned:
+            self._returned = True
+            self._pool._release(self._raw, self._created_at, reusable=False)
+
+    def __del__(self):
+        # 请求异常退出而未调用close()时，在对象回收时归还，避免占用的连接名额泄漏
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class MySQLConnectionPool:
+    """MySQL连接池
+
+    - size: 最多同时打开的物理连接数
+    - max_lifetime: 物理连接的最长存活时间（秒），超过后在借出或归还时重建
+    - wait_timeout: 连接全部借出时等待归还的最长时间（秒）
+    - health_check_after: 连接空闲超过该时间（秒）后，借出前先检查连接是否可用
+    """
+
+    def __init__(self, config, size=8, max_lifetime=1800, wait_timeout=5, health_check_after=5):
+        self._config = dict(config)
+        self._size = max(1, int(size))
+        self._max_lifetime = max_lifetime
+        self._wait_timeout = wait_timeout
+        self._health_check_after = health_check_after
+        self._cond = threading.Condition()
+        # 空闲连接栈: (连接, 创建时间, 最后归还时间)，后进先出以便让多余的连接自然过期
+        self._idle = []
+        self._open = 0
+        self._in_use = 0
+        self._stats = {
+            "checkouts": 0,
+            "created": 0,
+            "closed": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "health_check_failures": 0,
+            "wait_time_total": 0.0
+        }
+
+    def _expired(self, created_at, now):
+        return self._max_lifetime is not None and now - created_at >= self._max_lifetime
+
+    def _close_raw(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._stats["closed"] += 1
+
+    def _connect(self):
+        raw = mysql.connector.connect(**self._config)
+        with self._cond:
+            self._stats["created"] += 1
+            opened = self._open
+        logger.info(f"已建立新的MySQL连接: {self._config.get('host')}:{self._config.get('database')} (打开 {opened}/{self._size})")
+        return raw
+
+    def acquire(self):
+        """借出一个连接，超时未能借到时抛出PoolExhaustedError"""
+        started = time.monotonic()
+        deadline = started + self._wait_timeout
+        entry = None
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._open < self._size:
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolExhaustedError(f"等待 {self._wait_timeout} 秒后仍没有可用的MySQL连接")
+                if not waited:
+                    waited = True
+                    self._stats["waits"] += 1
+                self._cond.wait(remaining)
+            self._in_use += 1
+            self._stats["checkouts"] += 1
+            self._stats["wait_time_total"] += time.monotonic() - started
+
+        try:
+            if entry is not None:
+                raw, created_at, last_used = entry
+                now = time.time()
+                if self._expired(created_at, now):
+                    self._close_raw(raw)
+                    entry = None
+                elif now - last_used >= self._health_check_after and not self._is_healthy(raw):
+                    with self._cond:
+                        self._stats["health_check_failures"] += 1
+                    self._close_raw(raw)
+                    entry = None
+            if entry is None:
+                raw, created_at = self._connect(), time.time()
+            return PooledConnection(self, raw, created_at)
+        except Exception:
+            # 占用的连接名额需要释放，避免连接池永久缩小
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    @staticmethod
+    def _is_healthy(raw):
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _release(self, raw, created_at, reusable=True):
+        now = time.time()
+        reusable = reusable and not self._expired(created_at, now)
+        if reusable:
+            try:
+                if raw.unread_result:
+                    reusable = False
+                elif raw.in_transaction:
+                    raw.rollback()
+            except Exception:
+                reusable = False
+        if not reusable:
+            self._close_raw(raw)
+        with self._cond:
+            self._in_use -= 1
+            if reusable:
+                self._idle.append((raw, created_at, now))
+            else:
+                self._open -= 1
+            self._cond.notify()
+
+    def close_all(self):
+        """关闭所有空闲连接，已借出的连接归还后仍可正常回收"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for raw, _, _ in idle:
+            self._close_raw(raw)
+
+    def stats(self):
+        """获取连接池使用情况"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "size": self._size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._in_use
+            })
+        wait_time_total = stats.pop("wait_time_total")
+        stats["avg_wait_ms"] = round(wait_time_total * 1000 / stats["checkouts"], 3) if stats["checkouts"] else 0.0
+        return stats
+
+
+def iter_chunks(cursor, size):
+    """逐批读取已执行查询的结果，配合非缓冲游标时结果集不会一次性读入内存"""
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
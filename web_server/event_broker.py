@@ -0,0 +1,140 @@
+import json
+import threading
+import time
+from collections import deque
+
+
+class TooManyClientsError(Exception):
+    """同时连接的事件流客户端已达上限"""
+
+
+class EventBroker:
+    """Server-Sent Events的事件广播
+
+    最近的事件保存在定长环形缓冲区中，断线重连的客户端凭Last-Event-ID补发错过的事件；
+    ID不属于本进程或已被缓冲区淘汰时先发送完整快照。
+    等待中的客户端阻塞在条件变量上，没有事件时只定期发送心跳注释。
+    """
+
+    def __init__(self, history=512, heartbeat=15, max_clients=64):
+        # 事件ID形如"<进程纪元>-<序号>"，后端重启后旧的ID不会被误认为有效
+        self._epoch = format(int(time.time() * 1000), 'x')
+        self._events = deque(maxlen=history)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._heartbeat = heartbeat
+        self._max_clients = max_clients
+        self._clients = 0
+
+    @property
+    def clients(self):
+        return self._clients
+
+    def _event_id(self, seq):
+        return f"{self._epoch}-{seq}"
+
+    def publish(self, event, data):
+        """广播一个事件，返回事件序号"""
+        payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str)
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, event, payload))
+            self._cond.notify_all()
+            return self._seq
+
+    def _resume_seq(self, last_event_id):
+        """解析Last-Event-ID，无法从缓冲区续传时返回None"""
+        if not last_event_id:
+            return None
+        epoch, _, seq = last_event_id.partition('-')
+        if epoch != self._epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        with self._cond:
+            oldest = self._events[0][0] if self._events else self._seq + 1
+            # 缓冲区里最早的事件之前还有未发送的事件时无法续传
+            if seq > self._seq or seq + 1 < oldest:
+                return None
+        return seq
+
+    def _events_after(self, seq):
+        return [event for event in self._events if event[0] > seq]
+
+    def _format(self, seq, event, payload):
+        return f"id: {self._event_id(seq)}\nevent: {event}\ndata: {payload}\n\n"
+
+    def _snapshot(self, snapshot):
+        """返回(当前序号, 快照事件文本)
+
+        先取序号再取快照，快照之后发布的事件会再发送一次，客户端按最新数据覆盖即可。
+        """
+        with self._cond:
+            seq = self._seq
+        payload = json.dumps(snapshot(), ensure_ascii=False, separators=(',', ':'), default=str)
+        return seq, self._format(seq, 'snapshot', payload)
+
+    def stream(self, last_event_id, snapshot):
+        """返回生成SSE文本流的EventStream，snapshot()返回需要完整同步时发送的数据
+
+        连接名额在这里占用，客户端数已达上限时抛出TooManyClientsError。
+        """
+        with self._cond:
+            if self._clients >= self._max_clients:
+                raise TooManyClientsError(f"事件流客户端已达上限 {self._max_clients}")
+            self._clients += 1
+        return EventStream(self._generate(last_event_id, snapshot), self._release)
+
+    def _release(self):
+        with self._cond:
+            self._clients -= 1
+
+    def _generate(self, last_event_id, snapshot):
+        yield "retry: 3000\n\n"
+        seq = self._resume_seq(last_event_id)
+        if seq is None:
+            seq, text = self._snapshot(snapshot)
+            yield text
+        while True:
+            with self._cond:
+                pending = self._events_after(seq)
+                if not pending:
+                    self._cond.wait(self._heartbeat)
+                    pending = self._events_after(seq)
+            if not pending:
+                yield ": heartbeat\n\n"
+            elif pending[0][0] > seq + 1:
+                # 等待期间错过的事件已被淘汰，重新发送快照
+                seq, text = self._snapshot(snapshot)
+                yield text
+            else:
+                for event in pending:
+                    yield self._format(*event)
+                seq = pending[-1][0]
+
+
+class EventStream:
+    """一个客户端的事件流
+
+    迭代结束、出错或客户端断开(WSGI服务器调用close())时释放连接名额，
+    响应在开始迭代之前就被丢弃时也由close()释放，重复调用不会多次释放。
+    """
+
+    def __init__(self, events, release):
+        self._events = events
+        self._release = release
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def __iter__(self):
+        try:
+            yield from self._events
+        finally:
+            self.close()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._events.close()
+        self._release()
@@ -0,0 +1,155 @@
+import csv
+import io
+import json
+import threading
+from datetime import datetime
+
+from db_pool import iter_chunks
+
+# 每次从游标读取的行数，也是每次向客户端写出的行数
+EXPORT_FETCH_SIZE = 2000
+
+# 导出格式 -> (Content-Type, 文件扩展名)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson; charset=utf-8", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv")
+}
+
+SESSION_EXPORT_COLUMNS = (
+    "id", "server_id", "server_name", "player_name",
+    "join_time", "leave_time", "login_date", "logout_date", "play_duration"
+)
+
+STATS_EXPORT_COLUMNS = (
+    "id", "server_id", "server_name", "player_name",
+    "total_play_time", "total_sessions", "last_play_time"
+)
+
+
+class InvalidExportQueryError(ValueError):
+    """导出参数无效"""
+
+
+def sessions_export_query(server_id=None, player_name=None, start=None, end=None):
+    """按加入时间[start, end)导出会话，返回(sql, params)"""
+    conditions = []
+    params = []
+    if server_id:
+        conditions.append("server_id = %s")
+        params.append(server_id)
+    if player_name:
+        conditions.append("player_name = %s")
+        params.append(player_name)
+    if start is not None:
+        conditions.append("join_time >= %s")
+        params.append(start)
+    if end is not None:
+        conditions.append("join_time < %s")
+        params.append(end)
+    sql = f"SELECT {', '.join(SESSION_EXPORT_COLUMNS)} FROM player_sessions"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    # join_time上有索引，按它排序不需要对整个结果集排序
+    sql += " ORDER BY join_time, id"
+    return sql, params
+
+
+def stats_export_query(server_id=None, player_name=None, start=None, end=None):
+    """按最后游戏时间[start, end)导出玩家统计，start/end为Unix时间戳，返回(sql, params)"""
+    conditions = []
+    params = []
+    if server_id:
+        conditions.append("server_id = %s")
+        params.append(server_id)
+    if player_name:
+        conditions.append("player_name = %s")
+        params.append(player_name)
+    if start is not None:
+        conditions.append("last_play_time >= %s")
+        params.append(datetime.fromtimestamp(start))
+    if end is not None:
+        conditions.append("last_play_time < %s")
+        params.append(datetime.fromtimestamp(end))
+    sql = f"SELECT {', '.join(STATS_EXPORT_COLUMNS)} FROM player_stats"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY id"
+    return sql, params
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def encode_rows(rows, columns, fmt):
+    """把一批行编码为NDJSON或CSV文本"""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerows([_plain(value) for value in row] for row in rows)
+        return buffer.getvalue()
+    return "".join(
+        json.dumps(dict(zip(columns, map(_plain, row))), ensure_ascii=False, separators=(',', ':'), default=str) + "\n"
+        for row in rows
+    )
+
+
+def restore_session(conn, sql, params=()):
+    """在连接上执行一条恢复会话变量的语句，失败(如结果集没有读完)时返回False"""
+    try:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, params)
+        finally:
+            cursor.close()
+        return True
+    except Exception:
+        return False
+
+
+class ExportStream:
+    """把已执行查询的非缓冲游标逐批编码输出
+
+    内存占用只与EXPORT_FETCH_SIZE有关，与结果行数无关。
+    迭代结束、出错或客户端断开(WSGI服务器调用close())时关闭游标、归还连接并释放导出名额。
+    restore为(sql, params)时，归还连接前先执行它恢复导出时修改的会话变量，无法执行时断开该连接。
+    """
+
+    def __init__(self, conn, cursor, columns, fmt, release=None, chunk_size=EXPORT_FETCH_SIZE, restore=None):
+        self._conn = conn
+        self._cursor = cursor
+        self._columns = columns
+        self._fmt = fmt
+        self._release = release
+        self._chunk_size = chunk_size
+        self._restore = restore
+        self._lock = threading.Lock()
+        self._closed = False
+        self.rows = 0
+
+    def __iter__(self):
+        try:
+            if self._fmt == "csv":
+                yield encode_rows([self._columns], self._columns, "csv")
+            for rows in iter_chunks(self._cursor, self._chunk_size):
+                self.rows += len(rows)
+                yield encode_rows(rows, self._columns, self._fmt)
+        finally:
+            self.close()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        try:
+            self._cursor.close()
+        except Exception:
+            # 中途断开时结果集没有读完，连接池会丢弃这个连接
+            pass
+        if self._restore is not None and not restore_session(self._conn, *self._restore):
+            self._conn.discard()
+        else:
+            self._conn.close()
+        if self._release is not None:
+            self._release()
@@ -0,0 +1,149 @@
+import atexit
+import logging
+import threading
+
+from status_delta import SequenceGapError
+
+logger = logging.getLogger(__name__)
+
+_UNKNOWN = object()
+
+
+def _timestamp(data):
+    """状态的采样时间，增量的采样时间在changed中，缺失时返回None"""
+    timestamp = data.get('timestamp')
+    if timestamp is None and isinstance(data.get('changed'), dict):
+        timestamp = data['changed'].get('timestamp')
+    if isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+        return timestamp
+    return None
+
+
+class IngestQueueFullError(Exception):
+    """待应用的状态数已达上限"""
+
+
+class IngestQueue:
+    """状态上报的异步接收队列
+
+    接口只做轻量校验后把状态放入有界队列并立即应答，由写入线程按server_id合并后批量应用。
+    同一服务器的完整状态会替换队列中采样时间不晚于它的旧数据，增量和更早的完整状态(如积压重放)则按顺序保留，
+    由应用时的时间比较决定是否覆盖实时状态，历史采样仍会被记录。
+    增量的序号在入队时就与已接受的序号比对，序号不连续时同步返回409，插件据此立即补发完整状态。
+    """
+
+    def __init__(self, apply, current_seq, max_pending=1000):
+        # apply([(序号, 状态), ...])在写入线程中应用一批状态
+        self._apply = apply
+        # current_seq(server_id)返回存储中当前状态的序号
+        self._current_seq = current_seq
+        self._max_pending = max_pending
+        self._cond = threading.Condition()
+        # server_id -> 待应用的状态列表
+        self._pending = {}
+        self._count = 0
+        # server_id -> 最近一次接受(已应用或已入队)的序号
+        self._seqs = {}
+        self._next_index = 0
+        self._stopping = False
+        self._thread = None
+        self.accepted = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    def submit(self, server_id, data):
+        """放入一条已通过基本校验的状态
+
+        队列已满时抛出IngestQueueFullError，增量序号不连续时抛出SequenceGapError。
+        """
+        is_delta = data.get('type') == 'delta'
+        with self._cond:
+            if is_delta:
+                expected = self._seqs.get(server_id, _UNKNOWN)
+                if expected is _UNKNOWN:
+                    expected = self._current_seq(server_id)
+                if expected is None or expected != data.get('base_seq'):
+                    raise SequenceGapError(f"当前序号 {expected} 与增量基准序号 {data.get('base_seq')} 不一致")
+
+            items = self._pending.get(server_id)
+            replaced = len(items) if items and not is_delta and self._is_newest(data, items) else 0
+            if self._count - replaced >= self._max_pending:
+                self.rejected += 1
+                raise IngestQueueFullError(f"待应用的状态数已达上限 {self._max_pending}")
+
+            entry = (self._next_index, data)
+            self._next_index += 1
+            if items is None or replaced:
+                # 完整状态覆盖该服务器尚未应用的全部数据
+                self._pending[server_id] = [entry]
+            else:
+                items.append(entry)
+            self._count += 1 - replaced
+            self.coalesced += replaced
+            self.accepted += 1
+            if is_delta or data.get('seq') is not None:
+                self._seqs[server_id] = data.get('seq')
+            self._cond.notify()
+
+    @staticmethod
+    def _is_newest(data, items):
+        """完整状态data的采样时间不早于队列中的任何状态时返回True，采样时间未知时视为最新"""
+        timestamp = _timestamp(data)
+        if timestamp is None:
+            return True
+        for _, pending in items:
+            pending_ts = _timestamp(pending)
+            if pending_ts is not None and pending_ts > timestamp:
+                return False
+        return True
+
+    def forget_seq(self, server_id):
+        """应用失败后丢弃记录的序号，下一次增量改为与存储中的状态比对"""
+        with self._cond:
+            self._seqs.pop(server_id, None)
+
+    def _take(self):
+        with self._cond:
+            while not self._pending and not self._stopping:
+                self._cond.wait()
+            pending, self._pending = self._pending, {}
+            self._count = 0
+        return [entry for items in pending.values() for entry in items]
+
+    def _run(self):
+        while True:
+            entries = self._take()
+            if entries:
+                try:
+                    self._apply(entries)
+                except Exception as e:
+                    logger.error(f"应用接收队列中的状态时出错: {e}")
+                    logger.exception(e)
+            elif self._stopping:
+                return
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending": self._count,
+                "max_pending": self._max_pending,
+                "accepted": self.accepted,
+                "coalesced": self.coalesced,
+                "rejected": self.rejected
+            }
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="IngestQueue-Writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """停止写入线程，退出前应用队列中剩余的状态"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
@@ -0,0 +1,293 @@
+import atexit
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 记录历史的数值指标
+METRICS = ("memory_usage", "player_count", "uptime")
+
+# 存储层级: (分辨率秒数, 保留秒数)，分辨率为0表示原始采样点
+TIERS = (
+    (0, 24 * 3600),
+    (300, 30 * 24 * 3600),
+    (3600, 365 * 24 * 3600)
+)
+
+# 每次INSERT写入的最大行数
+INSERT_CHUNK_SIZE = 500
+
+
+class InvalidHistoryQueryError(ValueError):
+    """历史查询参数无效"""
+
+
+def bucket_start(timestamp, resolution):
+    if resolution == 0:
+        return timestamp
+    return math.floor(timestamp / resolution) * resolution
+
+
+def choose_resolution(start, step, now=None):
+    """选择满足step的最粗层级，层级的保留时间覆盖不到start时改用更粗的层级"""
+    now = time.time() if now is None else now
+    candidates = [resolution for resolution, _ in TIERS if resolution <= step] or [TIERS[0][0]]
+    resolution = candidates[-1]
+    for tier_resolution, retention in TIERS:
+        if tier_resolution < resolution:
+            continue
+        resolution = tier_resolution
+        if now - retention <= start:
+            break
+    return resolution
+
+
+def history_query(server_id, metric, start, end, step, resolution):
+    """按step把所选层级的数据重新分组，返回(sql, params)"""
+    sql = '''
+        SELECT
+            FLOOR(ts / %s) * %s as bucket,
+            SUM(count) as count,
+            SUM(sum) as sum,
+            MIN(min) as min,
+            MAX(max) as max
+        FROM server_metric_points
+        WHERE resolution = %s AND server_id = %s AND metric = %s AND ts >= %s AND ts < %s
+        GROUP BY bucket
+        ORDER BY bucket
+    '''
+    return sql, (step, step, resolution, server_id, metric, start, end)
+
+
+class MetricHistory:
+    """服务器指标的时间序列存储
+
+    接收的每个状态在内存中缓冲，后台线程定期写入server_metric_points表：原始点只保留24小时，
+    同时以UPSERT累加到5分钟和1小时的聚合桶(count/sum/min/max)中，分别保留30天和一年。
+    原始点以(server_id, 指标, 时间戳)去重，积压重放或批量上报中重复的状态不会被重复累加。
+    过期数据由同一线程定期删除。写入失败的点保留在缓冲区中重试，超过max_buffer时丢弃最旧的。
+    """
+
+    def __init__(self, connect, flush_interval=10, compact_interval=3600, max_buffer=20000):
+        self._connect = connect
+        self._flush_interval = flush_interval
+        self._compact_interval = compact_interval
+        self._max_buffer = max_buffer
+        self._lock = threading.Lock()
+        # [(server_id, 指标, 时间戳, 值), ...]
+        self._buffer = []
+        self._last_compact = 0.0
+        self._stopping = threading.Event()
+        self._thread = None
+        self._failing = False
+        self.dropped = 0
+
+    def record(self, server_id, status):
+        """记录一个状态中的指标，采样时间取状态的timestamp，缺失时取当前时间"""
+        timestamp = status.get('timestamp')
+        if not isinstance(timestamp, (int, float)) or isinstance(timestamp, bool):
+            timestamp = time.time()
+        points = []
+        for metric in METRICS:
+            value = status.get(metric)
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+                points.append((server_id, metric, float(timestamp), float(value)))
+        if not points:
+            return
+        with self._lock:
+            self._buffer.extend(points)
+            overflow = len(self._buffer) - self._max_buffer
+            if overflow > 0:
+                del self._buffer[:overflow]
+                self.dropped += overflow
+
+    @staticmethod
+    def _dedupe(points):
+        """去掉同一(server_id, 指标, 时间戳)的重复点，保留先记录的值"""
+        seen = set()
+        unique = []
+        for point in points:
+            key = point[:3]
+            if key not in seen:
+                seen.add(key)
+                unique.append(point)
+        return unique
+
+    def _unseen(self, cursor, points):
+        """过滤掉原始点已经写入过的点"""
+        stored = set()
+        for offset in range(0, len(points), INSERT_CHUNK_SIZE):
+            chunk = points[offset:offset + INSERT_CHUNK_SIZE]
+            params = []
+            for server_id, metric, timestamp, _ in chunk:
+                params.extend((server_id, metric, timestamp))
+            cursor.execute(f'''
+                SELECT server_id, metric, ts FROM server_metric_points
+                WHERE resolution = 0 AND (server_id, metric, ts) IN ({", ".join(["(%s, %s, %s)"] * len(chunk))})
+            ''', params)
+            stored.update((server_id, metric, float(ts)) for server_id, metric, ts in cursor.fetchall())
+        return [point for point in points if point[:3] not in stored]
+
+    def _aggregate(self, points):
+        """把原始点按层级合并为{(分辨率, server_id, 指标, 桶起点): [count, sum, min, max]}"""
+        rows = {}
+        for server_id, metric, timestamp, value in points:
+            for resolution, _ in TIERS:
+                key = (resolution, server_id, metric, bucket_start(timestamp, resolution))
+                row = rows.get(key)
+                if row is None:
+                    rows[key] = [1, value, value, value]
+                else:
+                    row[0] += 1
+                    row[1] += value
+                    row[2] = min(row[2], value)
+                    row[3] = max(row[3], value)
+        return rows
+
+    def flush(self):
+        """把缓冲的点写入数据库，失败时放回缓冲区"""
+        with self._lock:
+            points, self._buffer = self._buffer, []
+        if not points:
+            return True
+        conn = self._connect()
+        if conn is None:
+            self._requeue(points)
+            return False
+        cursor = None
+        try:
+            # 所有分块在一个事务中写入，失败时整体回滚，重新写入时不会重复累加
+            conn.start_transaction()
+            cursor = conn.cursor()
+            items = list(self._aggregate(self._unseen(cursor, self._dedupe(points))).items())
+            for offset in range(0, len(items), INSERT_CHUNK_SIZE):
+                chunk = items[offset:offset + INSERT_CHUNK_SIZE]
+                params = []
+                for key, row in chunk:
+                    params.extend(key)
+                    params.extend(row)
+                cursor.execute(f'''
+                    INSERT INTO server_metric_points (resolution, server_id, metric, ts, count, sum, min, max)
+                    VALUES {", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s)"] * len(chunk))}
+                    ON DUPLICATE KEY UPDATE
+                        count = count + VALUES(count),
+                        sum = sum + VALUES(sum),
+                        min = LEAST(min, VALUES(min)),
+                        max = GREATEST(max, VALUES(max))
+                ''', params)
+            conn.commit()
+            if self._failing:
+                self._failing = False
+                logger.info("指标历史已恢复写入")
+            return True
+        except Exception as e:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            self._requeue(points)
+            if not self._failing:
+                self._failing = True
+                logger.error(f"写入指标历史失败，将稍后重试: {e}")
+            return False
+        finally:
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+            conn.close()
+
+    def _requeue(self, points):
+        with self._lock:
+            self._buffer[:0] = points
+            overflow = len(self._buffer) - self._max_buffer
+            if overflow > 0:
+                del self._buffer[:overflow]
+                self.dropped += overflow
+
+    def compact(self, now=None):
+        """删除超过各层级保留时间的数据，返回删除的行数"""
+        now = time.time() if now is None else now
+        self._last_compact = now
+        conn = self._connect()
+        if conn is None:
+            return 0
+        deleted = 0
+        cursor = conn.cursor()
+        try:
+            for resolution, retention in TIERS:
+                cursor.execute(
+                    'DELETE FROM server_metric_points WHERE resolution = %s AND ts < %s',
+                    (resolution, now - retention)
+                )
+                deleted += cursor.rowcount or 0
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+        if deleted:
+            logger.info(f"清理了 {deleted} 条过期的指标历史")
+        return deleted
+
+    def query(self, cursor, server_id, metric, start, end, step, max_points=1000):
+        """查询[start, end)内按step分组的指标，返回(使用的分辨率, 实际的分组宽度, [点, ...])
+
+        分组数超过max_points时自动加大step。
+        """
+        if metric not in METRICS:
+            raise InvalidHistoryQueryError(f"不支持的指标: {metric}")
+        if end <= start:
+            raise InvalidHistoryQueryError("to必须大于from")
+        if step <= 0:
+            raise InvalidHistoryQueryError("step必须大于0")
+        step = max(step, (end - start) / max_points)
+        resolution = choose_resolution(start, step)
+        if resolution:
+            # 分组宽度取分辨率的整数倍，使每个聚合桶完整地落在一个分组内
+            step = math.ceil(step / resolution) * resolution
+        cursor.execute(*history_query(server_id, metric, start, end, step, resolution))
+        points = []
+        for bucket, count, total, low, high in cursor.fetchall():
+            count = int(count)
+            points.append({
+                "ts": float(bucket),
+                "avg": float(total) / count if count else None,
+                "min": float(low),
+                "max": float(high),
+                "count": count
+            })
+        return resolution, step, points
+
+    def stats(self):
+        with self._lock:
+            return {"buffered": len(self._buffer), "dropped": self.dropped}
+
+    def _run(self):
+        while not self._stopping.wait(self._flush_interval):
+            try:
+                self.flush()
+                if time.time() - self._last_compact >= self._compact_interval:
+                    self.compact()
+            except Exception as e:
+                logger.error(f"维护指标历史时出错: {e}")
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="MetricHistory-Writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """停止后台线程并写入剩余的点"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"写入指标历史时出错: {e}")
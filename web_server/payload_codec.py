@@ -0,0 +1,93 @@
+import json
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_CONTENT_TYPE = 'application/json'
+MSGPACK_CONTENT_TYPES = ('application/msgpack', 'application/x-msgpack')
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson')
+
+# 解压后的请求体上限，防止压缩炸弹
+MAX_DECOMPRESSED_SIZE = 16 * 1024 * 1024
+
+
+class UnsupportedPayloadError(Exception):
+    """请求体使用了不支持的编码或压缩方式"""
+
+
+def accepted_content_types():
+    """后端可以解析的上报数据类型"""
+    if msgpack is not None:
+        return [JSON_CONTENT_TYPE, MSGPACK_CONTENT_TYPES[0]]
+    return [JSON_CONTENT_TYPE]
+
+
+def _gunzip(body):
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    data = decompressor.decompress(body, MAX_DECOMPRESSED_SIZE)
+    if decompressor.unconsumed_tail:
+        raise UnsupportedPayloadError(f"解压后的数据超过 {MAX_DECOMPRESSED_SIZE} 字节")
+    if not decompressor.eof:
+        raise UnsupportedPayloadError("gzip数据不完整")
+    return data
+
+
+def _read_body(req):
+    """读取请求体并按Content-Encoding解压"""
+    body = req.get_data(cache=False)
+    encoding = (req.headers.get('Content-Encoding') or 'identity').strip().lower()
+    if encoding == 'gzip':
+        try:
+            body = _gunzip(body)
+        except zlib.error as e:
+            raise UnsupportedPayloadError(f"gzip数据损坏: {e}")
+    elif encoding != 'identity':
+        raise UnsupportedPayloadError(f"不支持的Content-Encoding: {encoding}")
+    return body
+
+
+def _parse(body, mimetype):
+    if mimetype in MSGPACK_CONTENT_TYPES:
+        if msgpack is None:
+            raise UnsupportedPayloadError("后端未安装msgpack，无法解析MessagePack数据")
+        try:
+            return msgpack.unpackb(body, raw=False)
+        except Exception:
+            return None
+    try:
+        return json.loads(body)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def decode_request_payload(req):
+    """按Content-Encoding和Content-Type解析请求体
+
+    支持gzip压缩的JSON和MessagePack，请求体为空或不是合法数据时返回None。
+    """
+    body = _read_body(req)
+    if not body:
+        return None
+    return _parse(body, req.mimetype)
+
+
+def decode_batch_payload(req):
+    """解析批量上报的请求体，返回各条数据的列表
+
+    支持JSON/MessagePack数组和每行一条的NDJSON，NDJSON中无法解析的行对应None。
+    请求体为空或不是数组时返回None。
+    """
+    body = _read_body(req)
+    if not body:
+        return None
+    if req.mimetype in NDJSON_CONTENT_TYPES:
+        items = []
+        for line in body.splitlines():
+            if line.strip():
+                items.append(_parse(line, JSON_CONTENT_TYPE))
+        return items
+    items = _parse(body, req.mimetype)
+    return items if isinstance(items, list) else None
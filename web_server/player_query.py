@@ -0,0 +1,103 @@
+import base64
+import json
+from datetime import datetime
+
+# 排序方式 -> 排序列，最后一列为主键，保证游标位置唯一
+PLAYER_SORT_KEYS = {
+    "play_time": ("total_play_time", "player_name", "id"),
+    "last_played": ("last_play_time", "player_name", "id")
+}
+
+PLAYER_COLUMNS = "id, player_name, server_id, server_name, total_play_time, total_sessions, last_play_time"
+
+
+class InvalidPlayerQueryError(ValueError):
+    """分页参数或游标无效"""
+
+
+def encode_cursor(sort, order, row):
+    """把一页最后一行的排序键编码为游标"""
+    values = []
+    for column in PLAYER_SORT_KEYS[sort]:
+        value = row[column]
+        values.append(value.isoformat() if isinstance(value, datetime) else value)
+    raw = json.dumps([sort, order, values], ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort, order):
+    """解析游标，返回排序键的值；游标与当前的排序方式不一致时视为无效"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, cursor_order, values = json.loads(raw.decode('utf-8'))
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise InvalidPlayerQueryError("无效的分页游标")
+    if cursor_sort != sort or cursor_order != order or len(values) != len(PLAYER_SORT_KEYS[sort]):
+        raise InvalidPlayerQueryError("分页游标与当前的排序方式不一致")
+    if sort == "last_played":
+        try:
+            values[0] = datetime.fromisoformat(values[0])
+        except (TypeError, ValueError):
+            raise InvalidPlayerQueryError("无效的分页游标")
+    return values
+
+
+def escape_like(value):
+    """转义LIKE中的通配符"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def keyset_condition(columns, values, order):
+    """生成(c1, c2, ...)严格位于游标之后的条件，展开成OR形式以便MySQL使用索引范围扫描"""
+    op = '<' if order == 'desc' else '>'
+    clauses = []
+    params = []
+    for i, column in enumerate(columns):
+        parts = [f"{previous} = %s" for previous in columns[:i]] + [f"{column} {op} %s"]
+        clauses.append("(" + " AND ".join(parts) + ")")
+        params.extend(values[:i + 1])
+    return "(" + " OR ".join(clauses) + ")", params
+
+
+def build_player_page_query(sort="play_time", order="desc", cursor=None, limit=50,
+                            server_id=None, online_pairs=None, exclude_prefixes=(), name_prefix=None):
+    """构造player_stats的分页查询，多取一行用于判断是否还有下一页
+
+    online_pairs不为None时只返回其中的(server_id, player_name)，调用方应在其为空时直接返回空页。
+    """
+    if sort not in PLAYER_SORT_KEYS:
+        raise InvalidPlayerQueryError(f"不支持的排序方式: {sort}")
+    if order not in ("asc", "desc"):
+        raise InvalidPlayerQueryError(f"不支持的排序方向: {order}")
+    columns = PLAYER_SORT_KEYS[sort]
+
+    conditions = []
+    params = []
+    if sort == "last_played":
+        conditions.append("last_play_time IS NOT NULL")
+    if server_id:
+        conditions.append("server_id = %s")
+        params.append(server_id)
+    if online_pairs is not None:
+        conditions.append("(server_id, player_name) IN (" + ", ".join(["(%s, %s)"] * len(online_pairs)) + ")")
+        for pair in online_pairs:
+            params.extend(pair)
+    for prefix in exclude_prefixes:
+        conditions.append("player_name NOT LIKE %s")
+        params.append(escape_like(prefix) + '%')
+    if name_prefix:
+        conditions.append("player_name LIKE %s")
+        params.append(escape_like(name_prefix) + '%')
+    if cursor:
+        condition, cursor_params = keyset_condition(columns, decode_cursor(cursor, sort, order), order)
+        conditions.append(condition)
+        params.extend(cursor_params)
+
+    direction = order.upper()
+    sql = f"SELECT {PLAYER_COLUMNS} FROM player_stats"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY " + ", ".join(f"{column} {direction}" for column in columns)
+    sql += " LIMIT %s"
+    params.append(limit + 1)
+    return sql, params
@@ -0,0 +1,118 @@
+import logging
+import time
+from datetime import datetime, timedelta
+
+from player_query import escape_like
+
+logger = logging.getLogger(__name__)
+
+# 回填时每次读取的会话数和每条INSERT写入的行数
+BACKFILL_FETCH_SIZE = 5000
+BACKFILL_INSERT_SIZE = 500
+
+
+def split_by_day(start, end):
+    """把[start, end)按本地时间的自然日切分，返回[(日期, 秒数), ...]，时长为0的会话记在开始的那一天
+
+    与插件session_writer中的实现保持一致。
+    """
+    if end <= start:
+        return [(datetime.fromtimestamp(start).date(), 0.0)]
+    segments = []
+    current = start
+    while current < end:
+        day = datetime.fromtimestamp(current).date()
+        next_midnight = datetime.combine(day + timedelta(days=1), datetime.min.time()).timestamp()
+        segment_end = min(end, next_midnight)
+        segments.append((day, segment_end - current))
+        current = segment_end
+    return segments
+
+
+def backfill_daily_playtime(conn):
+    """player_daily_playtime为空时，用已结束的历史会话回填，返回写入的行数
+
+    只回填开始回填之前结束的会话，之后结束的会话由插件在写入时累加。
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT 1 FROM player_daily_playtime LIMIT 1')
+        if cursor.fetchone() is not None:
+            return 0
+        cutoff = time.time()
+        cursor.execute('''
+            SELECT stats.server_id, stats.id, sessions.join_time, sessions.leave_time
+            FROM player_sessions sessions
+            JOIN player_stats stats
+                ON stats.server_id = sessions.server_id AND stats.player_name = sessions.player_name
+            WHERE sessions.leave_time IS NOT NULL AND sessions.leave_time < %s
+        ''', (cutoff,))
+        totals = {}
+        while True:
+            rows = cursor.fetchmany(BACKFILL_FETCH_SIZE)
+            if not rows:
+                break
+            for server_id, player_id, join_time, leave_time in rows:
+                for index, (day, seconds) in enumerate(split_by_day(join_time, leave_time)):
+                    total = totals.setdefault((server_id, player_id, day), [0.0, 0])
+                    total[0] += seconds
+                    if index == 0:
+                        total[1] += 1
+
+        items = list(totals.items())
+        # 在一个事务中写入，中途失败时回滚，表保持为空，下次启动时重新回填
+        conn.start_transaction()
+        try:
+            for offset in range(0, len(items), BACKFILL_INSERT_SIZE):
+                chunk = items[offset:offset + BACKFILL_INSERT_SIZE]
+                params = []
+                for (server_id, player_id, day), (seconds, sessions) in chunk:
+                    params.extend((server_id, player_id, day, seconds, sessions))
+                cursor.execute(f'''
+                    INSERT INTO player_daily_playtime (server_id, player_id, day, seconds, sessions)
+                    VALUES {", ".join(["(%s, %s, %s, %s, %s)"] * len(chunk))}
+                    ON DUPLICATE KEY UPDATE
+                        seconds = seconds + VALUES(seconds),
+                        sessions = sessions + VALUES(sessions)
+                ''', params)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if items:
+            logger.info(f"已用历史会话回填 {len(items)} 条每日游戏时长记录")
+        return len(items)
+    finally:
+        cursor.close()
+
+
+def period_leaderboard_query(column, since_day, exclude_prefixes=(), limit=10):
+    """从每日游戏时长汇总since_day(含)以来的排行榜，返回(sql, params)
+
+    先按player_id汇总时长，再与player_stats关联，避免多天的记录把总时长重复累加。
+    """
+    conditions = []
+    params = [since_day]
+    for prefix in exclude_prefixes:
+        conditions.append("stats.player_name NOT LIKE %s")
+        params.append(escape_like(prefix) + '%')
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    sql = f'''
+        SELECT
+            stats.player_name,
+            SUM(period.seconds) as {column},
+            MAX(stats.last_play_time) as last_play_time,
+            COALESCE(SUM(stats.total_play_time), 0) as total_play_time
+        FROM (
+            SELECT player_id, SUM(seconds) as seconds
+            FROM player_daily_playtime
+            WHERE day >= %s
+            GROUP BY player_id
+        ) as period
+        JOIN player_stats stats ON stats.id = period.player_id
+        {where}
+        GROUP BY stats.player_name
+        ORDER BY {column} DESC
+        LIMIT {int(limit)}
+    '''
+    return sql, params
@@ -0,0 +1,201 @@
+import atexit
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PresenceIndex:
+    """在线玩家索引
+
+    以(server_id, player_name)为键在内存中维护在线玩家，由状态上报在接收时更新，
+    查询时不再需要扫描player_sessions。超过timeout秒没有上报的服务器视为离线，
+    其玩家一律不在线。在线玩家发生变化(包括服务器超时离线)时调用on_change(server_id)。
+    后台线程把变化同步到online_players表，供需要在SQL中关联在线状态的查询使用。
+    """
+
+    def __init__(self, connect, timeout=180, sync_interval=30, on_change=None):
+        self._connect = connect
+        self._on_change = on_change
+        self._timeout = timeout
+        self._sync_interval = sync_interval
+        self._lock = threading.Lock()
+        # server_id -> 在线玩家的frozenset
+        self._online = {}
+        # server_id -> 最近一次上报的时间戳
+        self._last_seen = {}
+        # 玩家名 -> 所在的server_id集合，用于跨服务器汇总的查询
+        self._servers_by_player = {}
+        # server_id -> 已写入online_players表的玩家集合，None表示需要整体重写
+        self._persisted = {}
+        self._dirty = set()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._failing = False
+
+    def update(self, server_id, players, timestamp=None):
+        """用一次上报中的完整玩家列表更新索引，返回(新上线的玩家, 下线的玩家)"""
+        players = frozenset(players or ())
+        with self._lock:
+            self._last_seen[server_id] = timestamp if timestamp is not None else time.time()
+            previous = self._online.get(server_id, frozenset())
+            if players == previous:
+                return frozenset(), frozenset()
+            added = players - previous
+            removed = previous - players
+            self._online[server_id] = players
+            for player in added:
+                self._servers_by_player.setdefault(player, set()).add(server_id)
+            for player in removed:
+                servers = self._servers_by_player.get(player)
+                if servers is not None:
+                    servers.discard(server_id)
+                    if not servers:
+                        del self._servers_by_player[player]
+            self._dirty.add(server_id)
+        self._wakeup.set()
+        if self._on_change is not None:
+            self._on_change(server_id)
+        return added, removed
+
+    def seed(self, statuses):
+        """启动时用状态存储中的快照恢复索引，statuses为server_id -> (玩家列表, 最近上报时间戳)"""
+        for server_id, (players, timestamp) in statuses.items():
+            self.update(server_id, players, timestamp)
+
+    def _is_fresh(self, server_id, now):
+        last_seen = self._last_seen.get(server_id)
+        return last_seen is not None and now - last_seen <= self._timeout
+
+    def is_online(self, server_id, player_name) -> bool:
+        now = time.time()
+        with self._lock:
+            return player_name in self._online.get(server_id, ()) and self._is_fresh(server_id, now)
+
+    def is_online_anywhere(self, player_name) -> bool:
+        now = time.time()
+        with self._lock:
+            return any(self._is_fresh(server_id, now) for server_id in self._servers_by_player.get(player_name, ()))
+
+    def online_players(self, server_id) -> frozenset:
+        now = time.time()
+        with self._lock:
+            if not self._is_fresh(server_id, now):
+                return frozenset()
+            return self._online.get(server_id, frozenset())
+
+    def online_pairs(self, server_id=None) -> list:
+        """所有在线服务器上的(server_id, player_name)，指定server_id时只返回该服务器的"""
+        now = time.time()
+        with self._lock:
+            server_ids = [server_id] if server_id else list(self._online)
+            return [
+                (sid, player) for sid in server_ids if self._is_fresh(sid, now)
+                for player in self._online.get(sid, ())
+            ]
+
+    def status_label(self, server_id, player_name) -> str:
+        return '在线' if self.is_online(server_id, player_name) else '离线'
+
+    def status_label_anywhere(self, player_name) -> str:
+        return '在线' if self.is_online_anywhere(player_name) else '离线'
+
+    def _expire(self):
+        """清空已离线服务器的玩家，使online_players表与超时判定保持一致"""
+        now = time.time()
+        with self._lock:
+            stale = [
+                server_id for server_id, players in self._online.items()
+                if players and not self._is_fresh(server_id, now)
+            ]
+        for server_id in stale:
+            with self._lock:
+                last_seen = self._last_seen[server_id]
+            self.update(server_id, (), last_seen)
+
+    def sync(self):
+        """把有变化的服务器写入online_players表，失败的服务器留到下次重试"""
+        self._expire()
+        with self._lock:
+            pending = {server_id: self._online.get(server_id, frozenset()) for server_id in self._dirty}
+            self._dirty.clear()
+        if not pending:
+            return True
+
+        conn = self._connect()
+        if conn is None:
+            self._retry(pending)
+            return False
+        cursor = None
+        try:
+            cursor = conn.cursor()
+            now = time.time()
+            for server_id, players in pending.items():
+                persisted = self._persisted.get(server_id)
+                if persisted is None:
+                    cursor.execute('DELETE FROM online_players WHERE server_id = %s', (server_id,))
+                    persisted = frozenset()
+                removed = persisted - players
+                added = players - persisted
+                if removed:
+                    placeholders = ", ".join(["%s"] * len(removed))
+                    cursor.execute(
+                        f'DELETE FROM online_players WHERE server_id = %s AND player_name IN ({placeholders})',
+                        (server_id, *removed)
+                    )
+                if added:
+                    cursor.executemany(
+                        'INSERT IGNORE INTO online_players (server_id, player_name, since) VALUES (%s, %s, %s)',
+                        [(server_id, player, now) for player in added]
+                    )
+                self._persisted[server_id] = players
+            conn.commit()
+            if self._failing:
+                self._failing = False
+                logger.info("在线玩家表已恢复同步")
+            return True
+        except Exception as e:
+            # 写入中途失败时无法确定表中的内容，下次整体重写
+            for server_id in pending:
+                self._persisted[server_id] = None
+            self._retry(pending)
+            if not self._failing:
+                self._failing = True
+                logger.error(f"同步在线玩家表失败，将稍后重试: {e}")
+            return False
+        finally:
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+            conn.close()
+
+    def _retry(self, pending):
+        with self._lock:
+            self._dirty.update(pending)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self._sync_interval)
+            self._wakeup.clear()
+            try:
+                self.sync()
+            except Exception as e:
+                logger.error(f"同步在线玩家表时出错: {e}")
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="PresenceIndex-Writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
@@ -0,0 +1,136 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, request
+
+# 缓存响应时不保存的响应头，其余的响应头随缓存的响应一起返回
+SKIPPED_HEADERS = {'content-length', 'etag', 'date'}
+
+
+class ResponseCache:
+    """读接口的响应缓存
+
+    以路由路径和查询参数为键缓存成功的响应，每个路由有自己的有效期，
+    数据变化时按标签提前失效。所有经过缓存的响应都带有强ETag，
+    客户端携带匹配的If-None-Match时返回不含响应体的304。
+    """
+
+    def __init__(self, max_entries=256):
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        # 键 -> (过期时间, 标签, 响应体, 响应头, ETag)
+        self._entries = OrderedDict()
+        # 标签 -> 失效次数，计算期间所依赖的标签发生过失效的响应不写入缓存
+        self._generations = {}
+        # clear()的次数，使所有正在计算的响应都不写入缓存
+        self._cleared = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key():
+        return request.path, tuple(sorted(request.args.items(multi=True)))
+
+    def _get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _versions_locked(self, tags):
+        return self._cleared, tuple(self._generations.get(tag, 0) for tag in sorted(tags))
+
+    def _versions(self, tags):
+        """记录标签当前的失效次数，写入缓存时据此判断计算期间数据是否发生过变化"""
+        with self._lock:
+            return self._versions_locked(tags)
+
+    def _put(self, key, entry, versions):
+        with self._lock:
+            # 只比较该响应所依赖的标签，其他标签的失效不影响写入
+            if versions != self._versions_locked(entry[1]):
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *tags):
+        """使带有任一标签的缓存失效"""
+        tags = set(tags)
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+            stale = [key for key, entry in self._entries.items() if entry[1] & tags]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._cleared += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._entries)
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+    def cached(self, ttl, tags=()):
+        """缓存视图函数的响应，只缓存HTTP 200且结果码为200的响应"""
+        tags = frozenset(tags)
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method != 'GET':
+                    return view(*args, **kwargs)
+                key = self._key()
+                entry = self._get(key)
+                if entry is not None:
+                    self.hits += 1
+                    _, _, body, headers, etag = entry
+                    return make_cached_response(body, headers, etag)
+
+                self.misses += 1
+                versions = self._versions(tags)
+                response = view(*args, **kwargs)
+                if not isinstance(response, Response) or response.status_code != 200 or response.direct_passthrough:
+                    return response
+                payload = response.get_json(silent=True)
+                if not isinstance(payload, dict) or payload.get('code') != 200:
+                    return response
+                body = response.get_data()
+                headers = [(name, value) for name, value in response.headers.items()
+                           if name.lower() not in SKIPPED_HEADERS]
+                etag = strong_etag(body)
+                self._put(key, (time.monotonic() + ttl, tags, body, headers, etag), versions)
+                return make_cached_response(body, headers, etag)
+            return wrapper
+        return decorator
+
+
+def strong_etag(body):
+    return hashlib.sha1(body).hexdigest()
+
+
+def make_cached_response(body, headers, etag):
+    """构造带ETag的响应，If-None-Match匹配时返回304"""
+    # no-cache让浏览器保留响应但每次都携带If-None-Match重新验证
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, status=200)
+    for name, value in headers:
+        response.headers[name] = value
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
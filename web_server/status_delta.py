@@ -0,0 +1,35 @@
+# 以增减项方式编码的列表字段，需要与插件端保持一致
+LIST_FIELDS = ("players", "bots")
+
+
+class SequenceGapError(Exception):
+    """增量的基准序号与当前状态不一致，需要插件重新发送完整状态"""
+
+
+def apply_status_delta(current, delta):
+    """把增量上报应用到当前状态上，返回新的状态字典
+
+    当前状态不存在或序号与增量的base_seq不一致时抛出SequenceGapError。
+    """
+    if current is None or current.get('seq') is None or current.get('seq') != delta.get('base_seq'):
+        raise SequenceGapError(
+            f"当前序号 {current.get('seq') if current else None} 与增量基准序号 {delta.get('base_seq')} 不一致"
+        )
+
+    status = dict(current)
+    for field in LIST_FIELDS:
+        added = delta.get(f"{field}_added") or []
+        removed = delta.get(f"{field}_removed") or []
+        if not added and not removed:
+            continue
+        removed_set = set(removed)
+        items = [item for item in status.get(field) or [] if item not in removed_set]
+        existing = set(items)
+        items.extend(item for item in added if item not in existing)
+        status[field] = items
+
+    changed = delta.get('changed')
+    if isinstance(changed, dict):
+        status.update(changed)
+    status['seq'] = delta.get('seq')
+    return status
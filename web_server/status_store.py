@@ -0,0 +1,157 @@
+import atexit
+import logging
+import threading
+from zlib import crc32
+
+logger = logging.getLogger(__name__)
+
+
+class StatusStore:
+    """进程内服务器状态存储
+
+    按server_id分段加锁，读写都在内存中完成；后台线程按时间间隔或脏写次数
+    将快照写回磁盘，启动时从磁盘快照恢复。
+    存储中的状态字典一经写入不再原地修改，更新时总是整体替换。
+    """
+
+    def __init__(self, loader, saver, stripes=16, snapshot_interval=30, dirty_threshold=20):
+        self._loader = loader
+        self._saver = saver
+        self._stripe_count = max(1, int(stripes))
+        self._locks = [threading.Lock() for _ in range(self._stripe_count)]
+        self._shards = [{} for _ in range(self._stripe_count)]
+        self._snapshot_interval = snapshot_interval
+        self._dirty_threshold = dirty_threshold
+        self._dirty = 0
+        self._dirty_lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def _index(self, server_id):
+        return crc32(server_id.encode('utf-8')) % self._stripe_count
+
+    def _mark_dirty(self, count=1):
+        with self._dirty_lock:
+            self._dirty += count
+            reached = self._dirty >= self._dirty_threshold
+        if reached:
+            self._wakeup.set()
+
+    def load(self):
+        """从磁盘快照加载状态，返回加载的服务器数量"""
+        data = self._loader() or {}
+        count = 0
+        for server_id, status in data.items():
+            if not isinstance(server_id, str) or not isinstance(status, dict):
+                continue
+            index = self._index(server_id)
+            with self._locks[index]:
+                self._shards[index][server_id] = status
+            count += 1
+        logger.info(f"从快照恢复了 {count} 个服务器的状态")
+        return count
+
+    def get(self, server_id):
+        """获取单个服务器状态的浅拷贝，不存在时返回None"""
+        index = self._index(server_id)
+        with self._locks[index]:
+            status = self._shards[index].get(server_id)
+        return dict(status) if status is not None else None
+
+    def put(self, server_id, status):
+        """整体替换单个服务器的状态"""
+        index = self._index(server_id)
+        with self._locks[index]:
+            self._shards[index][server_id] = status
+        self._mark_dirty()
+
+    def update(self, server_id, func):
+        """在分段锁内对单个服务器状态执行读-改-写
+
+        func接收当前状态（可能为None），返回新的状态字典；返回None表示不修改。
+        返回值为func的返回值。
+        """
+        index = self._index(server_id)
+        with self._locks[index]:
+            current = self._shards[index].get(server_id)
+            new_status = func(current)
+            if new_status is not None:
+                self._shards[index][server_id] = new_status
+        if new_status is not None:
+            self._mark_dirty()
+        return new_status
+
+    def update_many(self, funcs):
+        """在一次加锁中对多个服务器状态执行读-改-写
+
+        funcs为server_id -> func，func的约定与update()相同，返回server_id -> func的返回值。
+        按分段序号从小到大加锁，与其他更新同时进行时不会死锁。
+        """
+        indexes = sorted({self._index(server_id) for server_id in funcs})
+        results = {}
+        for index in indexes:
+            self._locks[index].acquire()
+        try:
+            for server_id, func in funcs.items():
+                shard = self._shards[self._index(server_id)]
+                new_status = func(shard.get(server_id))
+                if new_status is not None:
+                    shard[server_id] = new_status
+                results[server_id] = new_status
+        finally:
+            for index in reversed(indexes):
+                self._locks[index].release()
+        changed = sum(1 for status in results.values() if status is not None)
+        if changed:
+            self._mark_dirty(changed)
+        return results
+
+    def snapshot(self):
+        """获取所有服务器状态的快照"""
+        result = {}
+        for index in range(self._stripe_count):
+            with self._locks[index]:
+                result.update(self._shards[index])
+        return result
+
+    def flush(self):
+        """将当前状态写回磁盘，没有未保存的修改时直接返回"""
+        with self._save_lock:
+            with self._dirty_lock:
+                dirty, self._dirty = self._dirty, 0
+            if dirty == 0:
+                return True
+            if self._saver(self.snapshot()):
+                return True
+            with self._dirty_lock:
+                self._dirty += dirty
+            return False
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self._snapshot_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"写回服务器状态快照时出错: {e}")
+                logger.exception(e)
+
+    def start(self):
+        """启动后台写回线程"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="StatusStore-Writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """停止后台写回线程并保存最后一次快照"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()